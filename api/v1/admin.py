@@ -3,18 +3,18 @@
 管理员相关API路由
 """
 
-from fastapi import APIRouter, Depends, HTTPException, status, Query, UploadFile, File
+import asyncio
+import time
+import uuid
+from fastapi import APIRouter, Depends, HTTPException, status, Query, UploadFile, File, Request, Response
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, Field
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Tuple, Callable
 from datetime import datetime, date
 
 from core.dependencies import (
-    get_admin_service,
-    get_user_service,
-    get_order_service,
-    get_divination_service,
-    get_current_user,
-    check_admin_permission,
+    AdminContext,
+    invalidate_admin_permission_cache,
     get_pagination_params
 )
 from models.user import User
@@ -27,10 +27,111 @@ from utils.exceptions import (
     ResourceNotFoundError,
     InsufficientPermissionError
 )
-from utils.helpers import format_datetime
+from utils.helpers import encode_cursor, decode_cursor, parse_date_range
+from core.responses import ORJSONResponse, orjson_dumps, etag_response
 
 router = APIRouter()
 
+# 仪表盘统计的进程内缓存，数据允许几十秒的延迟
+DASHBOARD_CACHE_TTL = 30
+_dashboard_cache: Dict[str, Tuple[float, bytes]] = {}
+_dashboard_lock = asyncio.Lock()
+
+async def _get_cached_dashboard(admin_service: AdminService) -> bytes:
+    """获取仪表盘统计，缓存的是序列化好的JSON字节，命中时连序列化都省了"""
+    cached = _dashboard_cache.get("dashboard")
+    if cached and cached[0] > time.monotonic():
+        return cached[1]
+    
+    async with _dashboard_lock:
+        # 拿到锁后再看一次，别让并发请求重复查库
+        cached = _dashboard_cache.get("dashboard")
+        if cached and cached[0] > time.monotonic():
+            return cached[1]
+        
+        stats = await admin_service.get_dashboard_stats()
+        body = orjson_dumps(stats)
+        _dashboard_cache["dashboard"] = (time.monotonic() + DASHBOARD_CACHE_TTL, body)
+        return body
+
+def _invalidate_dashboard_cache():
+    """统计或维护状态变化后清掉仪表盘缓存"""
+    _dashboard_cache.pop("dashboard", None)
+
+def _parse_cursor(cursor: Optional[str], id_type: Callable[[str], Any]) -> Optional[Tuple[datetime, Any]]:
+    """解析分页游标，ID按对应模型的主键类型转换"""
+    if not cursor:
+        return None
+    try:
+        created_at, record_id = decode_cursor(cursor)
+        return created_at, id_type(record_id)
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="分页游标格式错误"
+        )
+
+def _parse_date_range(
+    start_date: Optional[str],
+    end_date: Optional[str]
+) -> Tuple[Optional[datetime], Optional[datetime]]:
+    """解析查询参数里的日期范围，格式错误统一返回400"""
+    try:
+        return parse_date_range(start_date, end_date)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"日期格式错误: {str(e)}"
+        )
+
+def _next_cursor_headers(last_row: Any, page_size: int, row_count: int) -> Dict[str, str]:
+    """本页取满时通过响应头返回下一页游标"""
+    if row_count < page_size or last_row is None:
+        return {}
+    return {"X-Next-Cursor": encode_cursor(last_row.created_at, last_row.id)}
+
+# 出参序列化：数据来自数据库，不再经过pydantic校验，直接转成字典交给orjson
+# 响应模型只用于生成OpenAPI文档
+def _admin_to_dict(admin) -> Dict[str, Any]:
+    """管理员转响应字典"""
+    return {
+        "id": admin.id,
+        "username": admin.username,
+        "email": admin.email,
+        "role": admin.role,
+        "permissions": admin.permissions or [],
+        "is_active": admin.is_active,
+        "last_login": admin.last_login,
+        "created_at": admin.created_at,
+        "updated_at": admin.updated_at
+    }
+
+def _config_to_dict(config) -> Dict[str, Any]:
+    """系统配置转响应字典"""
+    return {
+        "id": config.id,
+        "key": config.key,
+        "value": config.value,
+        "description": config.description,
+        "created_at": config.created_at,
+        "updated_at": config.updated_at
+    }
+
+def _feedback_to_dict(feedback, user_name: Optional[str] = None) -> Dict[str, Any]:
+    """用户反馈转响应字典"""
+    return {
+        "id": feedback.id,
+        "user_id": feedback.user_id,
+        "user_name": user_name,
+        "type": feedback.feedback_type,
+        "content": feedback.feedback_text,
+        "rating": feedback.rating,
+        "status": feedback.status,
+        "admin_response": feedback.admin_response,
+        "created_at": feedback.created_at,
+        "updated_at": feedback.updated_at
+    }
+
 # 请求模型
 class CreateAdminRequest(BaseModel):
     """创建管理员请求"""
@@ -102,8 +203,9 @@ class AuditLogResponse(BaseModel):
     admin_username: str
     action: str
     resource_type: str
-    resource_id: Optional[int]
+    resource_id: Optional[str]
     details: Optional[Dict[str, Any]]
+    old_values: Optional[Dict[str, Any]]
     ip_address: Optional[str]
     user_agent: Optional[str]
     created_at: str
@@ -117,46 +219,49 @@ class DashboardStatsResponse(BaseModel):
     system: Dict[str, Any]
 
 # 管理员管理
-@router.get("/admins", response_model=List[AdminResponse], summary="获取管理员列表")
+@router.get(
+    "/admins",
+    response_class=ORJSONResponse,
+    responses={200: {"model": List[AdminResponse]}},
+    summary="获取管理员列表"
+)
 async def get_admins(
+    ctx: AdminContext,
     is_active: Optional[bool] = Query(None, description="是否激活"),
     role: Optional[str] = Query(None, description="角色"),
-    pagination: Dict[str, int] = Depends(get_pagination_params),
-    current_user: User = Depends(get_current_user),
-    admin_service: AdminService = Depends(get_admin_service),
-    _: None = Depends(check_admin_permission)
+    cursor: Optional[str] = Query(None, description="分页游标，传了就忽略页码"),
+    pagination: Dict[str, int] = Depends(get_pagination_params)
 ):
     """获取管理员列表"""
+    current_user, admin_service = ctx
+    
     admins = await admin_service.get_admins(
         is_active=is_active,
         role=role,
         limit=pagination["size"],
-        offset=pagination["offset"]
+        offset=pagination["offset"],
+        cursor=_parse_cursor(cursor, int)
     )
     
-    return [
-        AdminResponse(
-            id=admin.id,
-            username=admin.username,
-            email=admin.email,
-            role=admin.role,
-            permissions=admin.permissions or [],
-            is_active=admin.is_active,
-            last_login=format_datetime(admin.last_login) if admin.last_login else None,
-            created_at=format_datetime(admin.created_at),
-            updated_at=format_datetime(admin.updated_at) if admin.updated_at else None
-        )
-        for admin in admins
-    ]
+    # 列表接口直接返回字典，不再逐行构造响应模型
+    # 时间字段交给orjson原生序列化，省掉每行的格式化调用
+    return ORJSONResponse(content=[
+        _admin_to_dict(admin) for admin in admins
+    ], headers=_next_cursor_headers(admins[-1] if admins else None, pagination["size"], len(admins)))
 
-@router.post("/admins", response_model=AdminResponse, summary="创建管理员")
+@router.post(
+    "/admins",
+    response_class=ORJSONResponse,
+    responses={200: {"model": AdminResponse}},
+    summary="创建管理员"
+)
 async def create_admin(
-    request: CreateAdminRequest,
-    current_user: User = Depends(get_current_user),
-    admin_service: AdminService = Depends(get_admin_service),
-    _: None = Depends(check_admin_permission)
+    ctx: AdminContext,
+    request: CreateAdminRequest
 ):
     """创建新管理员"""
+    current_user, admin_service = ctx
+    
     try:
         admin = await admin_service.create_admin(
             username=request.username,
@@ -168,7 +273,7 @@ async def create_admin(
         )
         
         # 记录审计日志
-        await admin_service.create_audit_log(
+        admin_service.enqueue_audit_log(
             admin_id=current_user.id,
             action="create_admin",
             resource_type="admin",
@@ -176,17 +281,7 @@ async def create_admin(
             details={"username": admin.username, "role": admin.role}
         )
         
-        return AdminResponse(
-            id=admin.id,
-            username=admin.username,
-            email=admin.email,
-            role=admin.role,
-            permissions=admin.permissions or [],
-            is_active=admin.is_active,
-            last_login=None,
-            created_at=format_datetime(admin.created_at),
-            updated_at=None
-        )
+        return ORJSONResponse(content=_admin_to_dict(admin))
     
     except ValidationError as e:
         raise HTTPException(
@@ -194,14 +289,20 @@ async def create_admin(
             detail=str(e)
         )
 
-@router.get("/admins/{admin_id}", response_model=AdminResponse, summary="获取管理员详情")
+@router.get(
+    "/admins/{admin_id}",
+    response_class=ORJSONResponse,
+    responses={200: {"model": AdminResponse}},
+    summary="获取管理员详情"
+)
 async def get_admin(
+    ctx: AdminContext,
     admin_id: int,
-    current_user: User = Depends(get_current_user),
-    admin_service: AdminService = Depends(get_admin_service),
-    _: None = Depends(check_admin_permission)
+    request: Request
 ):
     """获取指定管理员详情"""
+    current_user, admin_service = ctx
+    
     admin = await admin_service.get_admin_by_id(admin_id)
     
     if not admin:
@@ -210,30 +311,25 @@ async def get_admin(
             detail="管理员不存在"
         )
     
-    return AdminResponse(
-        id=admin.id,
-        username=admin.username,
-        email=admin.email,
-        role=admin.role,
-        permissions=admin.permissions or [],
-        is_active=admin.is_active,
-        last_login=format_datetime(admin.last_login) if admin.last_login else None,
-        created_at=format_datetime(admin.created_at),
-        updated_at=format_datetime(admin.updated_at) if admin.updated_at else None
-    )
+    return etag_response(request, _admin_to_dict(admin))
 
-@router.put("/admins/{admin_id}", response_model=AdminResponse, summary="更新管理员")
+@router.put(
+    "/admins/{admin_id}",
+    response_class=ORJSONResponse,
+    responses={200: {"model": AdminResponse}},
+    summary="更新管理员"
+)
 async def update_admin(
+    ctx: AdminContext,
     admin_id: int,
-    request: UpdateAdminRequest,
-    current_user: User = Depends(get_current_user),
-    admin_service: AdminService = Depends(get_admin_service),
-    _: None = Depends(check_admin_permission)
+    request: UpdateAdminRequest
 ):
     """更新管理员信息"""
+    current_user, admin_service = ctx
+    
     try:
-        # 过滤非空字段
-        update_data = {k: v for k, v in request.dict().items() if v is not None}
+        # 只取客户端实际传了的字段，显式传null的也不更新
+        update_data = request.model_dump(exclude_unset=True, exclude_none=True)
         
         if not update_data:
             raise HTTPException(
@@ -245,9 +341,10 @@ async def update_admin(
             admin_id=admin_id,
             **update_data
         )
+        invalidate_admin_permission_cache(admin_id)
         
         # 记录审计日志
-        await admin_service.create_audit_log(
+        admin_service.enqueue_audit_log(
             admin_id=current_user.id,
             action="update_admin",
             resource_type="admin",
@@ -255,17 +352,7 @@ async def update_admin(
             details=update_data
         )
         
-        return AdminResponse(
-            id=admin.id,
-            username=admin.username,
-            email=admin.email,
-            role=admin.role,
-            permissions=admin.permissions or [],
-            is_active=admin.is_active,
-            last_login=format_datetime(admin.last_login) if admin.last_login else None,
-            created_at=format_datetime(admin.created_at),
-            updated_at=format_datetime(admin.updated_at) if admin.updated_at else None
-        )
+        return ORJSONResponse(content=_admin_to_dict(admin))
     
     except (ValidationError, ResourceNotFoundError) as e:
         raise HTTPException(
@@ -274,46 +361,40 @@ async def update_admin(
         )
 
 # 系统配置管理
-@router.get("/config", response_model=List[SystemConfigResponse], summary="获取系统配置")
+@router.get(
+    "/config",
+    response_class=ORJSONResponse,
+    responses={200: {"model": List[SystemConfigResponse]}},
+    summary="获取系统配置"
+)
 async def get_system_config(
-    key: Optional[str] = Query(None, description="配置键"),
-    current_user: User = Depends(get_current_user),
-    admin_service: AdminService = Depends(get_admin_service),
-    _: None = Depends(check_admin_permission)
+    ctx: AdminContext,
+    request: Request,
+    key: Optional[str] = Query(None, description="配置键")
 ):
     """获取系统配置"""
+    current_user, admin_service = ctx
+    
     if key:
         config = await admin_service.get_system_config(key)
-        return [SystemConfigResponse(
-            id=config.id,
-            key=config.key,
-            value=config.value,
-            description=config.description,
-            created_at=format_datetime(config.created_at),
-            updated_at=format_datetime(config.updated_at) if config.updated_at else None
-        )] if config else []
+        return etag_response(request, [_config_to_dict(config)] if config else [])
     else:
         configs = await admin_service.get_all_system_configs()
-        return [
-            SystemConfigResponse(
-                id=config.id,
-                key=config.key,
-                value=config.value,
-                description=config.description,
-                created_at=format_datetime(config.created_at),
-                updated_at=format_datetime(config.updated_at) if config.updated_at else None
-            )
-            for config in configs
-        ]
+        return ORJSONResponse(content=[_config_to_dict(config) for config in configs])
 
-@router.put("/config", response_model=SystemConfigResponse, summary="更新系统配置")
+@router.put(
+    "/config",
+    response_class=ORJSONResponse,
+    responses={200: {"model": SystemConfigResponse}},
+    summary="更新系统配置"
+)
 async def update_system_config(
-    request: UpdateSystemConfigRequest,
-    current_user: User = Depends(get_current_user),
-    admin_service: AdminService = Depends(get_admin_service),
-    _: None = Depends(check_admin_permission)
+    ctx: AdminContext,
+    request: UpdateSystemConfigRequest
 ):
     """更新系统配置"""
+    current_user, admin_service = ctx
+    
     try:
         config = await admin_service.set_system_config(
             key=request.key,
@@ -322,21 +403,14 @@ async def update_system_config(
         )
         
         # 记录审计日志
-        await admin_service.create_audit_log(
+        admin_service.enqueue_audit_log(
             admin_id=current_user.id,
             action="update_config",
             resource_type="system_config",
             details={"key": request.key, "value": request.value}
         )
         
-        return SystemConfigResponse(
-            id=config.id,
-            key=config.key,
-            value=config.value,
-            description=config.description,
-            created_at=format_datetime(config.created_at),
-            updated_at=format_datetime(config.updated_at) if config.updated_at else None
-        )
+        return ORJSONResponse(content=_config_to_dict(config))
     
     except ValidationError as e:
         raise HTTPException(
@@ -345,50 +419,51 @@ async def update_system_config(
         )
 
 # 用户反馈管理
-@router.get("/feedback", response_model=List[FeedbackResponse], summary="获取用户反馈")
+@router.get(
+    "/feedback",
+    response_class=ORJSONResponse,
+    responses={200: {"model": List[FeedbackResponse]}},
+    summary="获取用户反馈"
+)
 async def get_user_feedback(
+    ctx: AdminContext,
     feedback_type: Optional[str] = Query(None, description="反馈类型"),
     status_filter: Optional[str] = Query(None, description="状态过滤"),
     user_id: Optional[int] = Query(None, description="用户ID"),
-    pagination: Dict[str, int] = Depends(get_pagination_params),
-    current_user: User = Depends(get_current_user),
-    admin_service: AdminService = Depends(get_admin_service),
-    _: None = Depends(check_admin_permission)
+    cursor: Optional[str] = Query(None, description="分页游标，传了就忽略页码"),
+    pagination: Dict[str, int] = Depends(get_pagination_params)
 ):
     """获取用户反馈列表"""
+    current_user, admin_service = ctx
+    
+    # 用户姓名由SQL拼接好一起返回
     feedbacks = await admin_service.get_user_feedback(
         feedback_type=feedback_type,
         status=status_filter,
         user_id=user_id,
         limit=pagination["size"],
-        offset=pagination["offset"]
+        offset=pagination["offset"],
+        cursor=_parse_cursor(cursor, uuid.UUID)
     )
     
-    return [
-        FeedbackResponse(
-            id=feedback.id,
-            user_id=feedback.user_id,
-            user_name=f"{feedback.user.first_name} {feedback.user.last_name}".strip() if feedback.user else None,
-            type=feedback.type,
-            content=feedback.content,
-            rating=feedback.rating,
-            status=feedback.status,
-            admin_response=feedback.admin_response,
-            created_at=format_datetime(feedback.created_at),
-            updated_at=format_datetime(feedback.updated_at) if feedback.updated_at else None
-        )
-        for feedback in feedbacks
-    ]
+    return ORJSONResponse(content=[
+        _feedback_to_dict(feedback, user_name) for feedback, user_name in feedbacks
+    ], headers=_next_cursor_headers(feedbacks[-1][0] if feedbacks else None, pagination["size"], len(feedbacks)))
 
-@router.put("/feedback/{feedback_id}", response_model=FeedbackResponse, summary="更新反馈状态")
+@router.put(
+    "/feedback/{feedback_id}",
+    response_class=ORJSONResponse,
+    responses={200: {"model": FeedbackResponse}},
+    summary="更新反馈状态"
+)
 async def update_feedback_status(
+    ctx: AdminContext,
     feedback_id: int,
-    request: UpdateFeedbackStatusRequest,
-    current_user: User = Depends(get_current_user),
-    admin_service: AdminService = Depends(get_admin_service),
-    _: None = Depends(check_admin_permission)
+    request: UpdateFeedbackStatusRequest
 ):
     """更新用户反馈状态"""
+    current_user, admin_service = ctx
+    
     try:
         feedback = await admin_service.update_feedback_status(
             feedback_id=feedback_id,
@@ -397,7 +472,7 @@ async def update_feedback_status(
         )
         
         # 记录审计日志
-        await admin_service.create_audit_log(
+        admin_service.enqueue_audit_log(
             admin_id=current_user.id,
             action="update_feedback",
             resource_type="user_feedback",
@@ -405,18 +480,8 @@ async def update_feedback_status(
             details={"status": request.status, "has_response": bool(request.admin_response)}
         )
         
-        return FeedbackResponse(
-            id=feedback.id,
-            user_id=feedback.user_id,
-            user_name=f"{feedback.user.first_name} {feedback.user.last_name}".strip() if feedback.user else None,
-            type=feedback.type,
-            content=feedback.content,
-            rating=feedback.rating,
-            status=feedback.status,
-            admin_response=feedback.admin_response,
-            created_at=format_datetime(feedback.created_at),
-            updated_at=format_datetime(feedback.updated_at) if feedback.updated_at else None
-        )
+        # 更新接口不回查用户姓名
+        return ORJSONResponse(content=_feedback_to_dict(feedback))
     
     except (ValidationError, ResourceNotFoundError) as e:
         raise HTTPException(
@@ -425,93 +490,103 @@ async def update_feedback_status(
         )
 
 # 审计日志
-@router.get("/audit-logs", response_model=List[AuditLogResponse], summary="获取审计日志")
+@router.get(
+    "/audit-logs",
+    response_class=ORJSONResponse,
+    responses={200: {"model": List[AuditLogResponse]}},
+    summary="获取审计日志"
+)
 async def get_audit_logs(
+    ctx: AdminContext,
     admin_id: Optional[int] = Query(None, description="管理员ID"),
     action: Optional[str] = Query(None, description="操作类型"),
     resource_type: Optional[str] = Query(None, description="资源类型"),
     start_date: Optional[str] = Query(None, description="开始日期"),
     end_date: Optional[str] = Query(None, description="结束日期"),
-    pagination: Dict[str, int] = Depends(get_pagination_params),
-    current_user: User = Depends(get_current_user),
-    admin_service: AdminService = Depends(get_admin_service),
-    _: None = Depends(check_admin_permission)
+    cursor: Optional[str] = Query(None, description="分页游标，传了就忽略页码"),
+    pagination: Dict[str, int] = Depends(get_pagination_params)
 ):
     """获取审计日志"""
-    try:
-        start_dt = None
-        end_dt = None
-        
-        if start_date:
-            start_dt = datetime.fromisoformat(start_date)
-        if end_date:
-            end_dt = datetime.fromisoformat(end_date)
-        
-        logs = await admin_service.get_audit_logs(
-            admin_id=admin_id,
-            action=action,
-            resource_type=resource_type,
-            start_date=start_dt,
-            end_date=end_dt,
-            limit=pagination["size"],
-            offset=pagination["offset"]
-        )
-        
-        return [
-            AuditLogResponse(
-                id=log.id,
-                admin_id=log.admin_id,
-                admin_username=log.admin.username,
-                action=log.action,
-                resource_type=log.resource_type,
-                resource_id=log.resource_id,
-                details=log.details,
-                ip_address=log.ip_address,
-                user_agent=log.user_agent,
-                created_at=format_datetime(log.created_at)
-            )
-            for log in logs
-        ]
+    current_user, admin_service = ctx
     
-    except ValueError as e:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail=f"日期格式错误: {str(e)}"
-        )
+    keyset = _parse_cursor(cursor, uuid.UUID)
+    start_dt, end_dt = _parse_date_range(start_date, end_date)
+    
+    logs = await admin_service.get_audit_logs(
+        admin_id=admin_id,
+        action=action,
+        resource_type=resource_type,
+        start_date=start_dt,
+        end_date=end_dt,
+        limit=pagination["size"],
+        offset=pagination["offset"],
+        cursor=keyset
+    )
+    
+    return ORJSONResponse(content=[
+        {
+            "id": log.id,
+            "admin_id": log.admin_id,
+            "admin_username": log.admin.username,
+            "action": log.action,
+            "resource_type": log.resource_type,
+            "resource_id": log.resource_id,
+            "details": log.new_values,
+            "old_values": log.old_values,
+            "ip_address": log.ip_address,
+            "user_agent": log.user_agent,
+            "created_at": log.created_at
+        }
+        for log in logs
+    ], headers=_next_cursor_headers(logs[-1] if logs else None, pagination["size"], len(logs)))
 
 # 仪表盘统计
-@router.get("/dashboard", response_model=DashboardStatsResponse, summary="获取仪表盘统计")
+@router.get(
+    "/dashboard",
+    responses={200: {"model": DashboardStatsResponse}},
+    summary="获取仪表盘统计"
+)
 async def get_dashboard_stats(
-    current_user: User = Depends(get_current_user),
-    admin_service: AdminService = Depends(get_admin_service),
-    _: None = Depends(check_admin_permission)
+    ctx: AdminContext,
+    request: Request
 ):
     """获取仪表盘统计数据"""
-    stats = await admin_service.get_dashboard_stats()
+    current_user, admin_service = ctx
+    
+    body = await _get_cached_dashboard(admin_service)
     
-    return DashboardStatsResponse(**stats)
+    # 缓存期内内容不变，前端轮询时大多直接拿到304
+    return etag_response(request, body)
 
 # 数据导出
 @router.get("/export/users", summary="导出用户数据")
 async def export_users(
+    ctx: AdminContext,
     format_type: str = Query("csv", description="导出格式 (csv, excel)"),
     start_date: Optional[str] = Query(None, description="开始日期"),
-    end_date: Optional[str] = Query(None, description="结束日期"),
-    current_user: User = Depends(get_current_user),
-    admin_service: AdminService = Depends(get_admin_service),
-    _: None = Depends(check_admin_permission)
+    end_date: Optional[str] = Query(None, description="结束日期")
 ):
     """导出用户数据"""
+    current_user, admin_service = ctx
+    
+    start_dt, end_dt = _parse_date_range(start_date, end_date)
+    
     try:
-        from datetime import datetime
-        
-        start_dt = None
-        end_dt = None
-        
-        if start_date:
-            start_dt = datetime.fromisoformat(start_date)
-        if end_date:
-            end_dt = datetime.fromisoformat(end_date)
+        # CSV直接流式返回，边查边传，不在内存里攒整个文件
+        if format_type == "csv":
+            admin_service.enqueue_audit_log(
+                admin_id=current_user.id,
+                action="export_users",
+                resource_type="user",
+                details={"format": format_type, "date_range": f"{start_date} to {end_date}"}
+            )
+            
+            filename = f"users_{int(time.time())}.csv"
+            return StreamingResponse(
+                admin_service.export_user_data_stream(start_date=start_dt, end_date=end_dt),
+                media_type="text/csv",
+                headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+            )
         
         export_data = await admin_service.export_user_data(
             format_type=format_type,
@@ -520,7 +595,7 @@ async def export_users(
         )
         
         # 记录审计日志
-        await admin_service.create_audit_log(
+        admin_service.enqueue_audit_log(
             admin_id=current_user.id,
             action="export_users",
             resource_type="user",
@@ -534,11 +609,6 @@ async def export_users(
             "record_count": export_data["record_count"]
         }
     
-    except ValueError as e:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail=f"日期格式错误: {str(e)}"
-        )
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -547,24 +617,32 @@ async def export_users(
 
 @router.get("/export/orders", summary="导出订单数据")
 async def export_orders(
+    ctx: AdminContext,
     format_type: str = Query("csv", description="导出格式 (csv, excel)"),
     start_date: Optional[str] = Query(None, description="开始日期"),
-    end_date: Optional[str] = Query(None, description="结束日期"),
-    current_user: User = Depends(get_current_user),
-    admin_service: AdminService = Depends(get_admin_service),
-    _: None = Depends(check_admin_permission)
+    end_date: Optional[str] = Query(None, description="结束日期")
 ):
     """导出订单数据"""
+    current_user, admin_service = ctx
+    
+    start_dt, end_dt = _parse_date_range(start_date, end_date)
+    
     try:
-        from datetime import datetime
-        
-        start_dt = None
-        end_dt = None
-        
-        if start_date:
-            start_dt = datetime.fromisoformat(start_date)
-        if end_date:
-            end_dt = datetime.fromisoformat(end_date)
+        # CSV直接流式返回，边查边传，不在内存里攒整个文件
+        if format_type == "csv":
+            admin_service.enqueue_audit_log(
+                admin_id=current_user.id,
+                action="export_orders",
+                resource_type="order",
+                details={"format": format_type, "date_range": f"{start_date} to {end_date}"}
+            )
+            
+            filename = f"orders_{int(time.time())}.csv"
+            return StreamingResponse(
+                admin_service.export_order_data_stream(start_date=start_dt, end_date=end_dt),
+                media_type="text/csv",
+                headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+            )
         
         export_data = await admin_service.export_order_data(
             format_type=format_type,
@@ -573,7 +651,7 @@ async def export_orders(
         )
         
         # 记录审计日志
-        await admin_service.create_audit_log(
+        admin_service.enqueue_audit_log(
             admin_id=current_user.id,
             action="export_orders",
             resource_type="order",
@@ -587,11 +665,6 @@ async def export_orders(
             "record_count": export_data["record_count"]
         }
     
-    except ValueError as e:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail=f"日期格式错误: {str(e)}"
-        )
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -601,12 +674,12 @@ async def export_orders(
 # 系统维护
 @router.post("/maintenance/enable", summary="启用维护模式")
 async def enable_maintenance_mode(
-    message: Optional[str] = Query(None, description="维护消息"),
-    current_user: User = Depends(get_current_user),
-    admin_service: AdminService = Depends(get_admin_service),
-    _: None = Depends(check_admin_permission)
+    ctx: AdminContext,
+    message: Optional[str] = Query(None, description="维护消息")
 ):
     """启用系统维护模式"""
+    current_user, admin_service = ctx
+    
     await admin_service.set_system_config(
         key="maintenance_mode",
         value=True,
@@ -621,22 +694,24 @@ async def enable_maintenance_mode(
         )
     
     # 记录审计日志
-    await admin_service.create_audit_log(
+    admin_service.enqueue_audit_log(
         admin_id=current_user.id,
         action="enable_maintenance",
         resource_type="system",
         details={"message": message}
     )
     
+    _invalidate_dashboard_cache()
+    
     return {"message": "维护模式已启用"}
 
 @router.post("/maintenance/disable", summary="禁用维护模式")
 async def disable_maintenance_mode(
-    current_user: User = Depends(get_current_user),
-    admin_service: AdminService = Depends(get_admin_service),
-    _: None = Depends(check_admin_permission)
+    ctx: AdminContext
 ):
     """禁用系统维护模式"""
+    current_user, admin_service = ctx
+    
     await admin_service.set_system_config(
         key="maintenance_mode",
         value=False,
@@ -644,27 +719,30 @@ async def disable_maintenance_mode(
     )
     
     # 记录审计日志
-    await admin_service.create_audit_log(
+    admin_service.enqueue_audit_log(
         admin_id=current_user.id,
         action="disable_maintenance",
         resource_type="system"
     )
     
+    _invalidate_dashboard_cache()
+    
     return {"message": "维护模式已禁用"}
 
 # 系统统计更新
 @router.post("/stats/update", summary="更新系统统计")
 async def update_system_stats(
-    current_user: User = Depends(get_current_user),
-    admin_service: AdminService = Depends(get_admin_service),
-    _: None = Depends(check_admin_permission)
+    ctx: AdminContext
 ):
     """手动更新系统统计数据"""
+    current_user, admin_service = ctx
+    
     try:
         await admin_service.update_system_stats()
+        _invalidate_dashboard_cache()
         
         # 记录审计日志
-        await admin_service.create_audit_log(
+        admin_service.enqueue_audit_log(
             admin_id=current_user.id,
             action="update_stats",
             resource_type="system"
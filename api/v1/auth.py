@@ -3,38 +3,105 @@
 认证相关API路由
 """
 
-from fastapi import APIRouter, Depends, HTTPException, status
+import hashlib
+import time
+from collections import OrderedDict
+from fastapi import APIRouter, Depends, HTTPException, status, Request, Response
+from fastapi.routing import APIRoute
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from pydantic import BaseModel, Field
-from typing import Optional
+from pydantic import BaseModel, Field, ConfigDict
+from typing import Optional, Literal, Callable, Tuple
+from datetime import datetime
 
 from core.dependencies import (
-    get_user_service,
+    UserServiceDep,
     get_current_user,
-    rate_limit_check
+    get_redis,
+    publish_current_user_invalidate
 )
+from config.redis_config import RedisManager
 from models.user import User
-from services.user_service import UserService
-from utils.exceptions import (
-    UserNotFoundError,
-    InvalidCredentialsError,
-    ValidationError,
-    DuplicateResourceError
-)
 from utils.validators import validate_email, validate_phone
+from core.responses import ORJSONResponse
 
-router = APIRouter()
+router = APIRouter(default_response_class=ORJSONResponse)
 security = HTTPBearer()
 
+# /me 响应缓存：按令牌哈希缓存序列化好的响应字节，客户端轮询时不用再走认证和查库
+ME_CACHE_TTL = 5
+ME_CACHE_SIZE = 50_000
+ME_CACHE_CONTROL = f"private, max-age={ME_CACHE_TTL}, stale-while-revalidate=30"
+_me_cache: "OrderedDict[bytes, Tuple[float, bytes]]" = OrderedDict()
+
+def _me_cache_key(request: Request) -> Optional[bytes]:
+    """从Authorization头算缓存键，没带令牌或带了调试用user_id参数的请求不缓存"""
+    auth_header = request.headers.get("authorization")
+    if not auth_header or not auth_header.startswith("Bearer "):
+        return None
+    # DEBUG下?user_id会覆盖令牌里的用户，这种响应不能按令牌缓存
+    if "user_id" in request.query_params:
+        return None
+    return hashlib.blake2b(auth_header[7:].encode(), digest_size=16).digest()
+
+class MeCacheRoute(APIRoute):
+    """
+    /me 专用路由
+    在依赖解析之前先查缓存，命中时令牌校验、查库、构造响应全都跳过
+    """
+    
+    def get_route_handler(self) -> Callable:
+        handler = super().get_route_handler()
+        
+        async def cached_handler(request: Request) -> Response:
+            key = _me_cache_key(request)
+            if key is not None:
+                cached = _me_cache.get(key)
+                if cached and cached[0] > time.monotonic():
+                    return Response(
+                        content=cached[1],
+                        media_type="application/json",
+                        headers={"Cache-Control": ME_CACHE_CONTROL}
+                    )
+            
+            response = await handler(request)
+            
+            if response.status_code == 200:
+                response.headers["Cache-Control"] = ME_CACHE_CONTROL
+                if key is not None:
+                    _me_cache[key] = (time.monotonic() + ME_CACHE_TTL, response.body)
+                    _me_cache.move_to_end(key)
+                    if len(_me_cache) > ME_CACHE_SIZE:
+                        _me_cache.popitem(last=False)
+            
+            return response
+        
+        return cached_handler
+
+def _auth_response(token: str, user: User) -> ORJSONResponse:
+    """认证接口的响应，直接从字典序列化，不再经过pydantic构造和校验"""
+    return ORJSONResponse(content={
+        "access_token": token,
+        "token_type": "bearer",
+        "user": user.to_public_dict()
+    })
+
+# 请求模型配置：多余字段直接拒绝；带密码的模型不去空格，免得改动用户的密码
+REQUEST_CONFIG = ConfigDict(extra="forbid", frozen=True)
+STRIPPED_REQUEST_CONFIG = ConfigDict(extra="forbid", frozen=True, str_strip_whitespace=True)
+
 # 请求模型
 class LoginRequest(BaseModel):
     """登录请求"""
+    model_config = REQUEST_CONFIG
+    
     identifier: str = Field(..., description="邮箱、手机号或用户名")
     password: str = Field(..., min_length=6, description="密码")
-    identifier_type: str = Field("email", description="标识符类型: email, phone, username")
+    identifier_type: Literal["email", "phone", "username"] = Field("email", description="标识符类型")
 
 class RegisterRequest(BaseModel):
     """注册请求"""
+    model_config = REQUEST_CONFIG
+    
     telegram_id: int = Field(..., description="Telegram用户ID")
     username: Optional[str] = Field(None, description="用户名")
     first_name: Optional[str] = Field(None, description="名字")
@@ -46,6 +113,8 @@ class RegisterRequest(BaseModel):
 
 class TelegramAuthRequest(BaseModel):
     """Telegram认证请求"""
+    model_config = STRIPPED_REQUEST_CONFIG
+    
     telegram_id: int = Field(..., description="Telegram用户ID")
     username: Optional[str] = Field(None, description="用户名")
     first_name: Optional[str] = Field(None, description="名字")
@@ -54,16 +123,22 @@ class TelegramAuthRequest(BaseModel):
 
 class ChangePasswordRequest(BaseModel):
     """修改密码请求"""
+    model_config = REQUEST_CONFIG
+    
     old_password: str = Field(..., description="原密码")
     new_password: str = Field(..., min_length=6, description="新密码")
 
 class ResetPasswordRequest(BaseModel):
     """重置密码请求"""
+    model_config = STRIPPED_REQUEST_CONFIG
+    
     identifier: str = Field(..., description="邮箱或手机号")
-    identifier_type: str = Field("email", description="标识符类型: email, phone")
+    identifier_type: Literal["email", "phone"] = Field("email", description="标识符类型")
 
 class ConfirmResetPasswordRequest(BaseModel):
     """确认重置密码请求"""
+    model_config = REQUEST_CONFIG
+    
     user_id: int = Field(..., description="用户ID")
     reset_token: str = Field(..., description="重置令牌")
     new_password: str = Field(..., min_length=6, description="新密码")
@@ -87,255 +162,132 @@ class UserResponse(BaseModel):
     language_code: str
     is_premium: bool
     is_active: bool
-    registration_date: Optional[str]
-    last_login: Optional[str]
+    registration_date: Optional[datetime]
+    last_login: Optional[datetime]
 
-@router.post("/register", response_model=AuthResponse, summary="用户注册")
+# 业务异常（DuplicateResourceError、InvalidCredentialsError、UserNotFoundError等）
+# 本身带着状态码，由app里注册的BaseAPIException处理器统一转换成错误响应，接口里不再逐个捕获
+
+@router.post("/register", responses={200: {"model": AuthResponse}}, summary="用户注册")
 async def register(
     request: RegisterRequest,
-    user_service: UserService = Depends(get_user_service),
-    _: None = Depends(rate_limit_check)
+    user_service: UserServiceDep
 ):
     """用户注册"""
-    try:
-        # 注册用户
-        user = await user_service.register_user(
-            telegram_id=request.telegram_id,
-            username=request.username,
-            first_name=request.first_name,
-            last_name=request.last_name,
-            language_code=request.language_code,
-            email=request.email,
-            phone=request.phone,
-            password=request.password
-        )
-        
-        # 生成认证令牌
-        _, token = await user_service.authenticate_telegram_user(user.telegram_id)
-        
-        return AuthResponse(
-            access_token=token,
-            user={
-                "id": user.id,
-                "telegram_id": user.telegram_id,
-                "username": user.username,
-                "first_name": user.first_name,
-                "last_name": user.last_name,
-                "email": user.email,
-                "phone": user.phone,
-                "language_code": user.language_code,
-                "is_premium": user.is_premium,
-                "is_active": user.is_active
-            }
-        )
+    # 注册用户，令牌随注册一起返回
+    user, token = await user_service.register_user(
+        telegram_id=request.telegram_id,
+        username=request.username,
+        first_name=request.first_name,
+        last_name=request.last_name,
+        language_code=request.language_code,
+        email=request.email,
+        phone=request.phone,
+        password=request.password
+    )
     
-    except DuplicateResourceError as e:
-        raise HTTPException(
-            status_code=status.HTTP_409_CONFLICT,
-            detail=str(e)
-        )
-    except ValidationError as e:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail=str(e)
-        )
+    return _auth_response(token, user)
 
-@router.post("/login", response_model=AuthResponse, summary="用户登录")
+@router.post("/login", responses={200: {"model": AuthResponse}}, summary="用户登录")
 async def login(
     request: LoginRequest,
-    user_service: UserService = Depends(get_user_service),
-    _: None = Depends(rate_limit_check)
+    user_service: UserServiceDep
 ):
     """用户登录"""
-    try:
-        # 用户认证
-        user, token = await user_service.authenticate_user(
-            identifier=request.identifier,
-            password=request.password,
-            identifier_type=request.identifier_type
-        )
-        
-        return AuthResponse(
-            access_token=token,
-            user={
-                "id": user.id,
-                "telegram_id": user.telegram_id,
-                "username": user.username,
-                "first_name": user.first_name,
-                "last_name": user.last_name,
-                "email": user.email,
-                "phone": user.phone,
-                "language_code": user.language_code,
-                "is_premium": user.is_premium,
-                "is_active": user.is_active
-            }
-        )
+    user, token = await user_service.authenticate_user(
+        identifier=request.identifier,
+        password=request.password,
+        identifier_type=request.identifier_type
+    )
     
-    except (UserNotFoundError, InvalidCredentialsError) as e:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail=str(e)
-        )
+    return _auth_response(token, user)
 
-@router.post("/telegram", response_model=AuthResponse, summary="Telegram认证")
+@router.post("/telegram", responses={200: {"model": AuthResponse}}, summary="Telegram认证")
 async def telegram_auth(
     request: TelegramAuthRequest,
-    user_service: UserService = Depends(get_user_service),
-    _: None = Depends(rate_limit_check)
+    user_service: UserServiceDep
 ):
     """Telegram用户认证"""
-    try:
-        # 尝试认证现有用户
-        try:
-            user, token = await user_service.authenticate_telegram_user(request.telegram_id)
-        except UserNotFoundError:
-            # 用户不存在，自动注册
-            user = await user_service.register_user(
-                telegram_id=request.telegram_id,
-                username=request.username,
-                first_name=request.first_name,
-                last_name=request.last_name,
-                language_code=request.language_code
-            )
-            _, token = await user_service.authenticate_telegram_user(user.telegram_id)
-        
-        return AuthResponse(
-            access_token=token,
-            user={
-                "id": user.id,
-                "telegram_id": user.telegram_id,
-                "username": user.username,
-                "first_name": user.first_name,
-                "last_name": user.last_name,
-                "email": user.email,
-                "phone": user.phone,
-                "language_code": user.language_code,
-                "is_premium": user.is_premium,
-                "is_active": user.is_active
-            }
-        )
+    # 老用户更新登录时间，新用户直接注册，一次往返
+    user, token = await user_service.upsert_and_authenticate_telegram_user(
+        telegram_id=request.telegram_id,
+        username=request.username,
+        first_name=request.first_name,
+        last_name=request.last_name,
+        language_code=request.language_code
+    )
     
-    except InvalidCredentialsError as e:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail=str(e)
-        )
-    except ValidationError as e:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail=str(e)
-        )
+    return _auth_response(token, user)
 
-@router.get("/me", response_model=UserResponse, summary="获取当前用户信息")
 async def get_current_user_info(
     current_user: User = Depends(get_current_user)
 ):
     """获取当前用户信息"""
-    return UserResponse(
-        id=current_user.id,
-        telegram_id=current_user.telegram_id,
-        username=current_user.username,
-        first_name=current_user.first_name,
-        last_name=current_user.last_name,
-        email=current_user.email,
-        phone=current_user.phone,
-        language_code=current_user.language_code,
-        is_premium=current_user.is_premium,
-        is_active=current_user.is_active,
-        registration_date=current_user.registration_date.isoformat() if current_user.registration_date else None,
-        last_login=current_user.last_login.isoformat() if current_user.last_login else None
-    )
+    return ORJSONResponse(content=current_user.to_profile_dict())
+
+router.add_api_route(
+    "/me",
+    get_current_user_info,
+    methods=["GET"],
+    responses={200: {"model": UserResponse}},
+    summary="获取当前用户信息",
+    route_class_override=MeCacheRoute
+)
 
 @router.post("/change-password", summary="修改密码")
 async def change_password(
     request: ChangePasswordRequest,
+    user_service: UserServiceDep,
     current_user: User = Depends(get_current_user),
-    user_service: UserService = Depends(get_user_service)
+    redis: RedisManager = Depends(get_redis)
 ):
     """修改密码"""
-    try:
-        await user_service.change_password(
-            user_id=current_user.id,
-            old_password=request.old_password,
-            new_password=request.new_password
-        )
-        
-        return {"message": "密码修改成功"}
+    await user_service.change_password(
+        user_id=current_user.id,
+        old_password=request.old_password,
+        new_password=request.new_password
+    )
+    await publish_current_user_invalidate(redis, current_user.id)
     
-    except InvalidCredentialsError as e:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail=str(e)
-        )
-    except ValidationError as e:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail=str(e)
-        )
+    return {"message": "密码修改成功"}
 
 @router.post("/reset-password", summary="重置密码")
 async def reset_password(
     request: ResetPasswordRequest,
-    user_service: UserService = Depends(get_user_service),
-    _: None = Depends(rate_limit_check)
+    user_service: UserServiceDep
 ):
     """重置密码"""
-    try:
-        # 验证标识符格式
-        if request.identifier_type == "email" and not validate_email(request.identifier):
-            raise ValidationError("邮箱格式无效")
-        elif request.identifier_type == "phone" and not validate_phone(request.identifier):
-            raise ValidationError("手机号格式无效")
-        
-        reset_token = await user_service.reset_password(
-            identifier=request.identifier,
-            identifier_type=request.identifier_type
-        )
-        
-        # 在实际应用中，这里应该发送邮件或短信
-        # 为了演示，直接返回令牌（生产环境中不应该这样做）
-        return {
-            "message": "重置令牌已生成",
-            "reset_token": reset_token  # 仅用于演示
-        }
+    # 验证标识符格式
+    if request.identifier_type == "email":
+        if not validate_email(request.identifier):
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="邮箱格式无效")
+    elif not validate_phone(request.identifier):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="手机号格式无效")
     
-    except UserNotFoundError as e:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail=str(e)
-        )
-    except ValidationError as e:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail=str(e)
-        )
+    # 令牌应通过邮件或短信发给账号本人，不放进响应；
+    # 账号存在与否都返回同样的结果，不能用这个接口探测账号
+    await user_service.reset_password(
+        identifier=request.identifier,
+        identifier_type=request.identifier_type
+    )
+    
+    return {"message": "如果该账号存在，重置说明已发送"}
 
 @router.post("/confirm-reset-password", summary="确认重置密码")
 async def confirm_reset_password(
     request: ConfirmResetPasswordRequest,
-    user_service: UserService = Depends(get_user_service),
-    _: None = Depends(rate_limit_check)
+    user_service: UserServiceDep,
+    redis: RedisManager = Depends(get_redis)
 ):
     """确认重置密码"""
-    try:
-        await user_service.confirm_password_reset(
-            user_id=request.user_id,
-            reset_token=request.reset_token,
-            new_password=request.new_password
-        )
-        
-        return {"message": "密码重置成功"}
+    await user_service.confirm_password_reset(
+        user_id=request.user_id,
+        reset_token=request.reset_token,
+        new_password=request.new_password
+    )
+    await publish_current_user_invalidate(redis, request.user_id)
     
-    except (UserNotFoundError, InvalidCredentialsError) as e:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail=str(e)
-        )
-    except ValidationError as e:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail=str(e)
-        )
+    return {"message": "密码重置成功"}
 
 @router.post("/logout", summary="用户登出")
 async def logout(
@@ -346,34 +298,25 @@ async def logout(
     # 或者清除相关的会话信息
     return {"message": "登出成功"}
 
-@router.post("/refresh", response_model=AuthResponse, summary="刷新令牌")
+# 剩余有效期超过这个比例时，刷新接口直接返回原令牌
+TOKEN_REUSE_RATIO = 0.5
+
+@router.post("/refresh", responses={200: {"model": AuthResponse}}, summary="刷新令牌")
 async def refresh_token(
-    current_user: User = Depends(get_current_user),
-    user_service: UserService = Depends(get_user_service)
+    request: Request,
+    user_service: UserServiceDep,
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    current_user: User = Depends(get_current_user)
 ):
     """刷新访问令牌"""
-    try:
-        # 生成新的访问令牌
-        _, token = await user_service.authenticate_telegram_user(current_user.telegram_id)
-        
-        return AuthResponse(
-            access_token=token,
-            user={
-                "id": current_user.id,
-                "telegram_id": current_user.telegram_id,
-                "username": current_user.username,
-                "first_name": current_user.first_name,
-                "last_name": current_user.last_name,
-                "email": current_user.email,
-                "phone": current_user.phone,
-                "language_code": current_user.language_code,
-                "is_premium": current_user.is_premium,
-                "is_active": current_user.is_active
-            }
-        )
+    # 原令牌还很新就不重新签发，前端定时刷新时大多走这里，不用签名也不用查库
+    claims = getattr(request.state, "claims", None)
+    if claims:
+        lifetime = claims["exp"] - claims.get("iat", claims["exp"])
+        if claims["exp"] - time.time() > lifetime * TOKEN_REUSE_RATIO:
+            return _auth_response(credentials.credentials, current_user)
+    
+    # 生成新的访问令牌
+    _, token = await user_service.authenticate_telegram_user(current_user.telegram_id)
     
-    except InvalidCredentialsError as e:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail=str(e)
-        )
\ No newline at end of file
+    return _auth_response(token, current_user)
\ No newline at end of file
@@ -4,22 +4,21 @@
 """
 
 from fastapi import APIRouter, Depends, HTTPException, status, Request, Response
-from pydantic import BaseModel, Field
+from pydantic import BaseModel
 from typing import Optional, Dict, Any
-import json
+import orjson
 import hmac
 import hashlib
-from datetime import datetime
+import re
+import time
+from decimal import Decimal
+from urllib.parse import parse_qsl
 
 from core.dependencies import (
     get_payment_service,
-    get_order_service,
-    get_user_service,
     rate_limit_check
 )
-from services.payment_service import PaymentService
-from services.order_service import OrderService
-from services.user_service import UserService
+from services.payment_service import PaymentService, payment_callback_queue
 from utils.exceptions import (
     ValidationError,
     ResourceNotFoundError,
@@ -27,62 +26,50 @@ from utils.exceptions import (
 )
 from utils.logger import get_logger
 from core.config import settings
+from core.responses import ORJSONResponse
 
-router = APIRouter()
+router = APIRouter(default_response_class=ORJSONResponse)
 logger = get_logger(__name__)
 
-# 请求模型
-class StripeWebhookRequest(BaseModel):
-    """Stripe Webhook请求"""
-    id: str
-    object: str
-    type: str
-    data: Dict[str, Any]
-    created: int
-    livemode: bool
-    pending_webhooks: int
-    request: Optional[Dict[str, Any]] = None
+# Stripe签名密钥在启动时编码一次
+_STRIPE_SECRET_BYTES = (
+    settings.STRIPE_WEBHOOK_SECRET.encode('utf-8')
+    if settings.STRIPE_WEBHOOK_SECRET else None
+)
+
+# Stripe签名用的HMAC：密钥填充只在启动时做一次，每个请求copy一份再喂payload
+_STRIPE_HMAC_TEMPLATE = (
+    hmac.new(_STRIPE_SECRET_BYTES, digestmod=hashlib.sha256)
+    if _STRIPE_SECRET_BYTES else None
+)
+
+_STRIPE_SIG_HEADER = b'stripe-signature'
 
-class PayPalWebhookRequest(BaseModel):
-    """PayPal Webhook请求"""
-    id: str
-    event_type: str
-    resource_type: str
-    summary: str
-    resource: Dict[str, Any]
-    create_time: str
-    event_version: str
-    links: Optional[list] = None
+def _stripe_signature_fields(sig_header: bytes) -> Dict[bytes, bytes]:
+    """
+    Stripe-Signature头格式固定：t=<时间戳>,v1=<签名>[,v0=...]
+    头部只有ASCII，直接在原始字节上切分，省掉解码
+    """
+    fields = {}
+    for part in sig_header.split(b','):
+        key, sep, value = part.partition(b'=')
+        if sep:
+            fields[key] = value
+    return fields
 
-class AlipayNotifyRequest(BaseModel):
-    """支付宝异步通知请求"""
-    notify_time: str
-    notify_type: str
-    notify_id: str
-    app_id: str
-    charset: str
-    version: str
-    sign_type: str
-    sign: str
-    trade_no: str
-    out_trade_no: str
-    trade_status: str
-    total_amount: str
-    receipt_amount: Optional[str] = None
-    buyer_id: Optional[str] = None
-    seller_id: Optional[str] = None
-    gmt_create: Optional[str] = None
-    gmt_payment: Optional[str] = None
-    gmt_close: Optional[str] = None
+# 需要处理的Stripe事件类型，其他事件在原始字节上扫一遍就能排除，不用完整解析JSON
+_STRIPE_HANDLED_EVENT_RE = re.compile(rb'"type"\s*:\s*"(?:payment_intent\.|charge\.dispute\.created")')
 
-class WechatNotifyRequest(BaseModel):
-    """微信支付异步通知请求"""
-    id: str
-    create_time: str
-    event_type: str
-    resource_type: str
-    resource: Dict[str, Any]
-    summary: str
+# 支付宝/微信的固定应答体，启动时编码好
+# Response对象本身不复用：FastAPI会往返回的Response上挂background，共享实例会串到别的请求
+_ALIPAY_OK = b"success"
+_ALIPAY_FAIL = b"fail"
+_WECHAT_OK = orjson.dumps({"code": "SUCCESS", "message": "成功"})
+_WECHAT_INVALID_JSON = orjson.dumps({"code": "FAIL", "message": "Invalid JSON"})
+
+# 支付宝交易状态分组
+_ALIPAY_SUCCESS_STATES = frozenset({'TRADE_SUCCESS', 'TRADE_FINISHED'})
+_ALIPAY_CLOSED_STATES = frozenset({'TRADE_CLOSED'})
 
 # 响应模型
 class CallbackResponse(BaseModel):
@@ -91,149 +78,210 @@ class CallbackResponse(BaseModel):
     message: str
     data: Optional[Dict[str, Any]] = None
 
+def _callback_response(message: str, data: Optional[Dict[str, Any]] = None) -> ORJSONResponse:
+    """回调接口的响应，直接序列化字典，不经过响应模型校验"""
+    return ORJSONResponse(content={
+        "success": True,
+        "message": message,
+        "data": data
+    })
+
+# Stripe事件处理
+async def _handle_stripe_payment_succeeded(event_object: Dict[str, Any], event_data: Dict[str, Any]):
+    """支付成功"""
+    order_id = event_object.get('metadata', {}).get('order_id')
+    if not order_id:
+        return
+    
+    await payment_callback_queue.put(
+        provider='stripe',
+        transaction_id=event_object.get('id'),
+        status='completed',
+        amount=event_object.get('amount_received', 0) / 100,  # 转换为元
+        currency=event_object.get('currency', 'usd').upper(),
+        raw_data=event_data
+    )
+    
+    logger.info(f"Stripe payment succeeded for order {order_id}")
+
+async def _handle_stripe_payment_failed(event_object: Dict[str, Any], event_data: Dict[str, Any]):
+    """支付失败"""
+    order_id = event_object.get('metadata', {}).get('order_id')
+    if not order_id:
+        return
+    
+    await payment_callback_queue.put(
+        provider='stripe',
+        transaction_id=event_object.get('id'),
+        status='failed',
+        amount=event_object.get('amount', 0) / 100,
+        currency=event_object.get('currency', 'usd').upper(),
+        raw_data=event_data
+    )
+    
+    logger.info(f"Stripe payment failed for order {order_id}")
+
+async def _handle_stripe_dispute_created(event_object: Dict[str, Any], event_data: Dict[str, Any]):
+    """争议创建"""
+    charge_id = event_object.get('charge')
+    logger.warning(f"Stripe dispute created for charge {charge_id}")
+    # 这里可以添加争议处理逻辑
+
+_STRIPE_HANDLERS = {
+    'payment_intent.succeeded': _handle_stripe_payment_succeeded,
+    'payment_intent.payment_failed': _handle_stripe_payment_failed,
+    'charge.dispute.created': _handle_stripe_dispute_created,
+}
+
+# PayPal事件处理
+async def _handle_paypal_capture_completed(resource: Dict[str, Any], event_data: Dict[str, Any]):
+    """支付完成"""
+    custom_id = resource.get('custom_id')  # 我们的订单ID
+    if not custom_id:
+        return
+    
+    amount = resource.get('amount', {})
+    await payment_callback_queue.put(
+        provider='paypal',
+        transaction_id=resource.get('id'),
+        status='completed',
+        amount=Decimal(amount.get('value', '0')),  # PayPal金额本身就是字符串
+        currency=amount.get('currency_code', 'USD'),
+        raw_data=event_data
+    )
+    
+    logger.info(f"PayPal payment completed for order {custom_id}")
+
+async def _handle_paypal_capture_denied(resource: Dict[str, Any], event_data: Dict[str, Any]):
+    """支付被拒绝"""
+    custom_id = resource.get('custom_id')
+    if not custom_id:
+        return
+    
+    amount = resource.get('amount', {})
+    await payment_callback_queue.put(
+        provider='paypal',
+        transaction_id=resource.get('id'),
+        status='failed',
+        amount=Decimal(amount.get('value', '0')),  # PayPal金额本身就是字符串
+        currency=amount.get('currency_code', 'USD'),
+        raw_data=event_data
+    )
+    
+    logger.info(f"PayPal payment denied for order {custom_id}")
+
+async def _handle_paypal_capture_refunded(resource: Dict[str, Any], event_data: Dict[str, Any]):
+    """退款完成"""
+    refund_id = resource.get('id')
+    logger.info(f"PayPal refund completed: {refund_id}")
+    # 这里可以添加退款处理逻辑
+
+_PAYPAL_HANDLERS = {
+    'PAYMENT.CAPTURE.COMPLETED': _handle_paypal_capture_completed,
+    'PAYMENT.CAPTURE.DENIED': _handle_paypal_capture_denied,
+    'PAYMENT.CAPTURE.REFUNDED': _handle_paypal_capture_refunded,
+}
+
 # Stripe Webhook
-@router.post("/stripe", response_model=CallbackResponse, summary="Stripe支付回调")
+@router.post("/stripe", responses={200: {"model": CallbackResponse}}, summary="Stripe支付回调")
 async def stripe_webhook(
     request: Request,
-    payment_service: PaymentService = Depends(get_payment_service),
-    order_service: OrderService = Depends(get_order_service),
     _: None = Depends(rate_limit_check)
 ):
     """处理Stripe支付回调"""
+    sig_header = next(
+        (value for name, value in request.headers.raw if name == _STRIPE_SIG_HEADER),
+        None
+    )
+    
+    if not sig_header:
+        logger.warning("Missing Stripe signature header")
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Missing signature header"
+        )
+    
+    # 验证Stripe签名
+    if _STRIPE_HMAC_TEMPLATE is None:
+        logger.error("Stripe webhook secret not configured")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Webhook secret not configured"
+        )
+    
+    # 边接收请求体边算HMAC，不用等body拼好再从头扫一遍；
+    # bytearray直接交给orjson和正则，不再复制成bytes
+    mac = _STRIPE_HMAC_TEMPLATE.copy()
+    payload = bytearray()
+    async for chunk in request.stream():
+        mac.update(chunk)
+        payload += chunk
+    expected_sig = mac.digest()
+    
+    # 从header中提取签名
+    sig_fields = _stripe_signature_fields(sig_header)
+    timestamp = sig_fields.get(b't')
+    signature = sig_fields.get(b'v1')
+    
     try:
-        # 获取原始请求体
-        payload = await request.body()
-        sig_header = request.headers.get('stripe-signature')
-        
-        if not sig_header:
-            logger.warning("Missing Stripe signature header")
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Missing signature header"
-            )
-        
-        # 验证Stripe签名
-        endpoint_secret = settings.STRIPE_WEBHOOK_SECRET
-        if not endpoint_secret:
-            logger.error("Stripe webhook secret not configured")
-            raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail="Webhook secret not configured"
-            )
-        
+        signature_bytes = bytes.fromhex(signature.decode('ascii')) if signature else b""
+    except ValueError as e:
+        logger.error(f"Stripe signature verification failed: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Signature verification failed"
+        )
+    
+    # 原始字节定长比较，耗时和内容无关，不会泄露签名信息
+    if not signature_bytes or not hmac.compare_digest(signature_bytes, expected_sig):
+        logger.warning(f"Invalid Stripe signature: {signature}")
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid signature"
+        )
+    
+    # 不处理的事件类型直接确认，省掉一次完整的JSON解析
+    if not _STRIPE_HANDLED_EVENT_RE.search(payload):
+        logger.info("Ignored unhandled Stripe webhook")
+        return _callback_response("Webhook ignored")
+    
+    # 解析事件数据
+    try:
+        event_data = orjson.loads(payload)
+    except orjson.JSONDecodeError as e:
+        logger.error(f"Invalid JSON payload: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid JSON payload"
+        )
+    
+    event_type = event_data.get('type')
+    event_object = event_data.get('data', {}).get('object', {})
+    
+    logger.info(f"Received Stripe webhook: {event_type}")
+    
+    # 按事件类型分发
+    # 回调写入失败时返回5xx，让Stripe稍后重试
+    handler = _STRIPE_HANDLERS.get(event_type)
+    if handler:
         try:
-            # 验证签名
-            expected_sig = hmac.new(
-                endpoint_secret.encode('utf-8'),
-                payload,
-                hashlib.sha256
-            ).hexdigest()
-            
-            # 从header中提取签名
-            sig_elements = sig_header.split(',')
-            timestamp = None
-            signature = None
-            
-            for element in sig_elements:
-                key, value = element.split('=')
-                if key == 't':
-                    timestamp = value
-                elif key == 'v1':
-                    signature = value
-            
-            if not signature or signature != expected_sig:
-                logger.warning(f"Invalid Stripe signature: {signature} != {expected_sig}")
-                raise HTTPException(
-                    status_code=status.HTTP_400_BAD_REQUEST,
-                    detail="Invalid signature"
-                )
-        
+            await handler(event_object, event_data)
         except Exception as e:
-            logger.error(f"Stripe signature verification failed: {str(e)}")
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Signature verification failed"
-            )
-        
-        # 解析事件数据
-        try:
-            event_data = json.loads(payload.decode('utf-8'))
-        except json.JSONDecodeError as e:
-            logger.error(f"Invalid JSON payload: {str(e)}")
+            logger.error(f"Stripe webhook processing failed: {str(e)}")
             raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Invalid JSON payload"
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail="Webhook processing failed"
             )
-        
-        event_type = event_data.get('type')
-        event_object = event_data.get('data', {}).get('object', {})
-        
-        logger.info(f"Received Stripe webhook: {event_type}")
-        
-        # 处理不同类型的事件
-        if event_type == 'payment_intent.succeeded':
-            # 支付成功
-            payment_intent_id = event_object.get('id')
-            metadata = event_object.get('metadata', {})
-            order_id = metadata.get('order_id')
-            
-            if order_id:
-                await payment_service.handle_payment_callback(
-                    provider='stripe',
-                    transaction_id=payment_intent_id,
-                    status='completed',
-                    amount=event_object.get('amount_received', 0) / 100,  # 转换为元
-                    currency=event_object.get('currency', 'usd').upper(),
-                    raw_data=event_data
-                )
-                
-                logger.info(f"Stripe payment succeeded for order {order_id}")
-        
-        elif event_type == 'payment_intent.payment_failed':
-            # 支付失败
-            payment_intent_id = event_object.get('id')
-            metadata = event_object.get('metadata', {})
-            order_id = metadata.get('order_id')
-            
-            if order_id:
-                await payment_service.handle_payment_callback(
-                    provider='stripe',
-                    transaction_id=payment_intent_id,
-                    status='failed',
-                    amount=event_object.get('amount', 0) / 100,
-                    currency=event_object.get('currency', 'usd').upper(),
-                    raw_data=event_data
-                )
-                
-                logger.info(f"Stripe payment failed for order {order_id}")
-        
-        elif event_type == 'charge.dispute.created':
-            # 争议创建
-            charge_id = event_object.get('charge')
-            logger.warning(f"Stripe dispute created for charge {charge_id}")
-            # 这里可以添加争议处理逻辑
-        
-        return CallbackResponse(
-            success=True,
-            message="Webhook processed successfully",
-            data={"event_type": event_type}
-        )
     
-    except HTTPException:
-        raise
-    except Exception as e:
-        logger.error(f"Stripe webhook processing failed: {str(e)}")
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Webhook processing failed"
-        )
+    return _callback_response(
+        "Webhook processed successfully",
+        {"event_type": event_type}
+    )
 
 # PayPal Webhook
-@router.post("/paypal", response_model=CallbackResponse, summary="PayPal支付回调")
+@router.post("/paypal", responses={200: {"model": CallbackResponse}}, summary="PayPal支付回调")
 async def paypal_webhook(
     request: Request,
-    payment_service: PaymentService = Depends(get_payment_service),
-    order_service: OrderService = Depends(get_order_service),
     _: None = Depends(rate_limit_check)
 ):
     """处理PayPal支付回调"""
@@ -246,8 +294,8 @@ async def paypal_webhook(
         
         # 解析事件数据
         try:
-            event_data = json.loads(payload.decode('utf-8'))
-        except json.JSONDecodeError as e:
+            event_data = orjson.loads(payload)
+        except orjson.JSONDecodeError as e:
             logger.error(f"Invalid JSON payload: {str(e)}")
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
@@ -259,53 +307,14 @@ async def paypal_webhook(
         
         logger.info(f"Received PayPal webhook: {event_type}")
         
-        # 处理不同类型的事件
-        if event_type == 'PAYMENT.CAPTURE.COMPLETED':
-            # 支付完成
-            capture_id = resource.get('id')
-            custom_id = resource.get('custom_id')  # 我们的订单ID
-            amount = resource.get('amount', {})
-            
-            if custom_id:
-                await payment_service.handle_payment_callback(
-                    provider='paypal',
-                    transaction_id=capture_id,
-                    status='completed',
-                    amount=float(amount.get('value', 0)),
-                    currency=amount.get('currency_code', 'USD'),
-                    raw_data=event_data
-                )
-                
-                logger.info(f"PayPal payment completed for order {custom_id}")
-        
-        elif event_type == 'PAYMENT.CAPTURE.DENIED':
-            # 支付被拒绝
-            capture_id = resource.get('id')
-            custom_id = resource.get('custom_id')
-            amount = resource.get('amount', {})
-            
-            if custom_id:
-                await payment_service.handle_payment_callback(
-                    provider='paypal',
-                    transaction_id=capture_id,
-                    status='failed',
-                    amount=float(amount.get('value', 0)),
-                    currency=amount.get('currency_code', 'USD'),
-                    raw_data=event_data
-                )
-                
-                logger.info(f"PayPal payment denied for order {custom_id}")
-        
-        elif event_type == 'PAYMENT.CAPTURE.REFUNDED':
-            # 退款完成
-            refund_id = resource.get('id')
-            logger.info(f"PayPal refund completed: {refund_id}")
-            # 这里可以添加退款处理逻辑
+        # 按事件类型分发
+        handler = _PAYPAL_HANDLERS.get(event_type)
+        if handler:
+            await handler(resource, event_data)
         
-        return CallbackResponse(
-            success=True,
-            message="Webhook processed successfully",
-            data={"event_type": event_type}
+        return _callback_response(
+            "Webhook processed successfully",
+            {"event_type": event_type}
         )
     
     except HTTPException:
@@ -318,18 +327,16 @@ async def paypal_webhook(
         )
 
 # 支付宝异步通知
-@router.post("/alipay", response_model=CallbackResponse, summary="支付宝异步通知")
+@router.post("/alipay", summary="支付宝异步通知")
 async def alipay_notify(
     request: Request,
-    payment_service: PaymentService = Depends(get_payment_service),
-    order_service: OrderService = Depends(get_order_service),
     _: None = Depends(rate_limit_check)
 ):
     """处理支付宝异步通知"""
     try:
-        # 获取表单数据
-        form_data = await request.form()
-        notify_data = dict(form_data)
+        # 支付宝通知是普通的urlencoded表单，直接解析请求体，不走multipart表单解析
+        raw_body = await request.body()
+        notify_data = dict(parse_qsl(raw_body.decode('utf-8'), keep_blank_values=True))
         
         logger.info(f"Received Alipay notify: {notify_data.get('out_trade_no')}")
         
@@ -346,29 +353,29 @@ async def alipay_notify(
         
         if not out_trade_no or not trade_no:
             logger.error("Missing required parameters in Alipay notify")
-            return Response(content="fail", media_type="text/plain")
+            return Response(content=_ALIPAY_FAIL, media_type="text/plain")
         
         # 处理不同的交易状态
-        if trade_status == 'TRADE_SUCCESS' or trade_status == 'TRADE_FINISHED':
+        if trade_status in _ALIPAY_SUCCESS_STATES:
             # 支付成功
-            await payment_service.handle_payment_callback(
+            await payment_callback_queue.put(
                 provider='alipay',
                 transaction_id=trade_no,
                 status='completed',
-                amount=float(total_amount) if total_amount else 0,
+                amount=Decimal(total_amount) if total_amount else Decimal(0),
                 currency='CNY',
                 raw_data=notify_data
             )
             
             logger.info(f"Alipay payment succeeded for order {out_trade_no}")
         
-        elif trade_status == 'TRADE_CLOSED':
+        elif trade_status in _ALIPAY_CLOSED_STATES:
             # 交易关闭
-            await payment_service.handle_payment_callback(
+            await payment_callback_queue.put(
                 provider='alipay',
                 transaction_id=trade_no,
                 status='failed',
-                amount=float(total_amount) if total_amount else 0,
+                amount=Decimal(total_amount) if total_amount else Decimal(0),
                 currency='CNY',
                 raw_data=notify_data
             )
@@ -376,18 +383,16 @@ async def alipay_notify(
             logger.info(f"Alipay payment closed for order {out_trade_no}")
         
         # 返回success给支付宝
-        return Response(content="success", media_type="text/plain")
+        return Response(content=_ALIPAY_OK, media_type="text/plain")
     
     except Exception as e:
         logger.error(f"Alipay notify processing failed: {str(e)}")
-        return Response(content="fail", media_type="text/plain")
+        return Response(content=_ALIPAY_FAIL, media_type="text/plain")
 
 # 微信支付异步通知
-@router.post("/wechat", response_model=CallbackResponse, summary="微信支付异步通知")
+@router.post("/wechat", summary="微信支付异步通知")
 async def wechat_notify(
     request: Request,
-    payment_service: PaymentService = Depends(get_payment_service),
-    order_service: OrderService = Depends(get_order_service),
     _: None = Depends(rate_limit_check)
 ):
     """处理微信支付异步通知"""
@@ -400,13 +405,10 @@ async def wechat_notify(
         
         # 解析事件数据
         try:
-            event_data = json.loads(payload.decode('utf-8'))
-        except json.JSONDecodeError as e:
+            event_data = orjson.loads(payload)
+        except orjson.JSONDecodeError as e:
             logger.error(f"Invalid JSON payload: {str(e)}")
-            return Response(
-                content=json.dumps({"code": "FAIL", "message": "Invalid JSON"}),
-                media_type="application/json"
-            )
+            return Response(content=_WECHAT_INVALID_JSON, media_type="application/json")
         
         event_type = event_data.get('event_type')
         resource = event_data.get('resource', {})
@@ -425,10 +427,10 @@ async def wechat_notify(
             # amount = decrypted_data.get('amount', {})
             
             # 这里暂时使用模拟数据
-            transaction_id = "wechat_" + str(datetime.now().timestamp())
+            transaction_id = f"wechat_{time.time_ns()}"
             out_trade_no = "test_order_123"
             
-            await payment_service.handle_payment_callback(
+            await payment_callback_queue.put(
                 provider='wechat',
                 transaction_id=transaction_id,
                 status='completed',
@@ -440,20 +442,19 @@ async def wechat_notify(
             logger.info(f"WeChat payment succeeded for order {out_trade_no}")
         
         # 返回成功响应给微信
-        return Response(
-            content=json.dumps({"code": "SUCCESS", "message": "成功"}),
-            media_type="application/json"
-        )
+        return Response(content=_WECHAT_OK, media_type="application/json")
     
     except Exception as e:
         logger.error(f"WeChat notify processing failed: {str(e)}")
+        # 微信要求失败时返回4xx/5xx，否则不会重试
         return Response(
-            content=json.dumps({"code": "FAIL", "message": str(e)}),
+            content=orjson.dumps({"code": "FAIL", "message": str(e)}),
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             media_type="application/json"
         )
 
 # 通用回调状态查询
-@router.get("/status/{payment_id}", response_model=CallbackResponse, summary="查询回调处理状态")
+@router.get("/status/{payment_id}", responses={200: {"model": CallbackResponse}}, summary="查询回调处理状态")
 async def get_callback_status(
     payment_id: int,
     payment_service: PaymentService = Depends(get_payment_service),
@@ -469,18 +470,17 @@ async def get_callback_status(
                 detail="支付记录不存在"
             )
         
-        return CallbackResponse(
-            success=True,
-            message="查询成功",
-            data={
+        return _callback_response(
+            "查询成功",
+            {
                 "payment_id": payment_record.id,
                 "status": payment_record.status,
                 "provider": payment_record.provider,
                 "transaction_id": payment_record.transaction_id,
-                "amount": float(payment_record.amount),
+                "amount": payment_record.amount,
                 "currency": payment_record.currency,
-                "created_at": payment_record.created_at.isoformat(),
-                "updated_at": payment_record.updated_at.isoformat() if payment_record.updated_at else None
+                "created_at": payment_record.created_at,
+                "updated_at": payment_record.updated_at
             }
         )
     
@@ -494,7 +494,7 @@ async def get_callback_status(
         )
 
 # 手动重试回调处理
-@router.post("/retry/{payment_id}", response_model=CallbackResponse, summary="重试回调处理")
+@router.post("/retry/{payment_id}", responses={200: {"model": CallbackResponse}}, summary="重试回调处理")
 async def retry_callback_processing(
     payment_id: int,
     payment_service: PaymentService = Depends(get_payment_service),
@@ -511,10 +511,9 @@ async def retry_callback_processing(
             )
         
         if payment_record.status == 'completed':
-            return CallbackResponse(
-                success=True,
-                message="支付已完成，无需重试",
-                data={"payment_id": payment_id, "status": "completed"}
+            return _callback_response(
+                "支付已完成，无需重试",
+                {"payment_id": payment_id, "status": "completed"}
             )
         
         # 重新处理回调
@@ -522,17 +521,15 @@ async def retry_callback_processing(
             provider=payment_record.provider,
             transaction_id=payment_record.transaction_id,
             status='completed',  # 假设重试是为了标记为成功
-            amount=float(payment_record.amount),
-            currency=payment_record.currency,
-            raw_data=payment_record.raw_data or {}
+            amount=payment_record.amount,
+            currency=payment_record.currency
         )
         
         logger.info(f"Payment callback retried for payment {payment_id}")
         
-        return CallbackResponse(
-            success=True,
-            message="回调处理重试成功",
-            data={"payment_id": payment_id, "status": "completed"}
+        return _callback_response(
+            "回调处理重试成功",
+            {"payment_id": payment_id, "status": "completed"}
         )
     
     except HTTPException:
@@ -3,26 +3,144 @@
 占卜相关API路由
 """
 
-from fastapi import APIRouter, Depends, HTTPException, status, Query
-from pydantic import BaseModel, Field
-from typing import Optional, List, Dict, Any
+import asyncio
+import logging
+import time
+import uuid
+from datetime import date, datetime, timedelta
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field, ConfigDict
+from sqlalchemy import select
+from typing import Optional, List, Dict, Any, Tuple, Callable, Awaitable, AsyncIterator, TypedDict
 
 from core.dependencies import (
     get_divination_service,
     get_current_user,
+    get_redis,
     get_pagination_params,
     rate_limit_check
 )
+from config.database import AsyncSessionLocal
+from config.redis_config import RedisManager, CacheKeys
 from models.user import User
+from models.divination import TarotCard
 from services.divination_service import DivinationService
 from utils.exceptions import (
     DivinationLimitExceededError,
     ValidationError,
     ResourceNotFoundError
 )
-from utils.helpers import format_datetime
+from core.responses import ORJSONResponse, orjson_dumps, make_etag, is_not_modified
 
-router = APIRouter()
+# 整个路由默认用orjson输出
+router = APIRouter(default_response_class=ORJSONResponse)
+logger = logging.getLogger(__name__)
+
+# 塔罗牌和牌阵属于静态目录数据，序列化好的JSON字节在进程内缓存
+# 筛选参数是任意字符串，缓存键数量设上限，满了就不再新增
+CATALOG_CACHE_TTL = 3600
+CATALOG_CACHE_MAX_KEYS = 256
+_catalog_cache: Dict[Tuple, Tuple[float, bytes, str]] = {}
+
+# 目录数据没有在线修改的接口，只随数据导入和部署变化；客户端和CDN缓存5分钟，过期后带ETag回源，没变就是304
+CATALOG_CACHE_CONTROL = "public, max-age=300"
+
+async def _get_cached_catalog(
+    key: Tuple,
+    load: Callable[[], Awaitable[Any]]
+) -> Optional[Tuple[bytes, str]]:
+    """获取目录数据的(JSON字节, ETag)，命中时不查库也不序列化；load返回None表示不存在，不缓存"""
+    cached = _catalog_cache.get(key)
+    if cached and cached[0] > time.monotonic():
+        return cached[1], cached[2]
+    
+    content = await load()
+    if content is None:
+        return None
+    
+    body = orjson_dumps(content)
+    etag = make_etag(body)
+    if key in _catalog_cache or len(_catalog_cache) < CATALOG_CACHE_MAX_KEYS:
+        _catalog_cache[key] = (time.monotonic() + CATALOG_CACHE_TTL, body, etag)
+    return body, etag
+
+def _catalog_response(request: Request, body: bytes, etag: str) -> Response:
+    """目录数据响应，ETag一致时直接返回304"""
+    headers = {"ETag": etag, "Cache-Control": CATALOG_CACHE_CONTROL}
+    if is_not_modified(request, etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+# 整副牌在一次部署内不会变，启动时按(大小阿卡纳, 花色)组合预先序列化好
+# 键里的None表示不按该字段过滤，(None, None)就是整副牌
+_prebuilt_cards: Dict[Tuple[Optional[str], Optional[str]], Tuple[bytes, str]] = {}
+FULL_DECK_SIZE = 78
+
+# 排除位图的上限，牌ID都小于这个值；也防止超大ID把位图撑爆
+MAX_CARD_ID = 256
+
+async def prebuild_card_catalog(redis: RedisManager):
+    """启动时取一次整副牌，生成各筛选组合的JSON字节和ETag"""
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(
+            select(TarotCard)
+            .where(TarotCard.is_active == True)
+            .order_by(TarotCard.id)
+        )
+        cards = result.scalars().all()
+    
+    groups: Dict[Tuple[Optional[str], Optional[str]], List[Dict[str, Any]]] = {(None, None): []}
+    for card in cards:
+        card_dict = _card_to_dict(card)
+        arcana_type, suit = card_dict["arcana_type"], card_dict["suit"]
+        for key in {(None, None), (arcana_type, None), (None, suit), (arcana_type, suit)}:
+            groups.setdefault(key, []).append(card_dict)
+    
+    _prebuilt_cards.clear()
+    for key, group in groups.items():
+        body = orjson_dumps(group)
+        _prebuilt_cards[key] = (body, make_etag(body))
+
+def _parse_exclude_mask(exclude_ids: str) -> int:
+    """
+    把逗号分隔的牌ID解析成位图
+    逐字节扫一遍，边读数字边累加，不切分字符串也不逐个调用int()
+    
+    Args:
+        exclude_ids: 逗号分隔的牌ID，允许空格和空项
+        
+    Returns:
+        排除位图
+        
+    Raises:
+        ValueError: 出现非法字符或ID超出范围
+    """
+    mask = 0
+    card_id = 0
+    has_digit = False
+    token_closed = False  # 数字后面跟了空格，同一项里不能再出现数字
+    
+    for b in exclude_ids.encode() + b",":
+        if 0x30 <= b <= 0x39:
+            if token_closed:
+                raise ValueError(exclude_ids)
+            card_id = card_id * 10 + (b - 0x30)
+            if card_id >= MAX_CARD_ID:
+                raise ValueError(exclude_ids)
+            has_digit = True
+        elif b == 0x2C:
+            if has_digit:
+                mask |= 1 << card_id
+            card_id = 0
+            has_digit = False
+            token_closed = False
+        elif b in b" \t":
+            token_closed = has_digit
+        else:
+            raise ValueError(exclude_ids)
+    
+    return mask
 
 # 请求模型
 class CreateDivinationRequest(BaseModel):
@@ -38,67 +156,72 @@ class GenerateInterpretationRequest(BaseModel):
     card_position: Optional[int] = Field(None, description="牌位置（单张牌解释）")
     interpretation_type: str = Field("overall", description="解释类型：single或overall")
 
+# 响应模型只读，数据库多出来的字段直接忽略；
+# 校验器和序列化器在导入时就建好（不延迟构建），第一个请求不用等
+RESPONSE_CONFIG = ConfigDict(frozen=True, extra="ignore", defer_build=False)
+
 # 响应模型
 class TarotCardResponse(BaseModel):
     """塔罗牌响应"""
+    model_config = RESPONSE_CONFIG
+    
     id: int
     name: str
     name_en: str
+    name_ru: Optional[str]
     suit: Optional[str]
     number: Optional[int]
     arcana_type: str
-    keywords: List[str]
-    description: str
-    upright_meaning: str
-    reversed_meaning: str
+    keywords: Any
+    meanings: Dict[str, Any]
+    reversed_meanings: Dict[str, Any]
     image_url: Optional[str]
-    symbolism: Optional[str]
-    element: Optional[str]
-    planet: Optional[str]
-    zodiac: Optional[str]
 
 class SpreadTemplateResponse(BaseModel):
     """牌阵模板响应"""
+    model_config = RESPONSE_CONFIG
+    
     id: int
     name: str
-    name_en: str
-    description: str
+    display_names: Dict[str, Any]
+    description: Dict[str, Any]
     card_count: int
-    positions: List[Dict[str, Any]]
-    difficulty_level: str
-    category: str
-    image_url: Optional[str]
-    instructions: Optional[str]
+    positions: Dict[str, Any]
+    is_premium: bool
     is_active: bool
+    sort_order: int
 
 class DivinationSessionResponse(BaseModel):
     """占卜会话响应"""
-    id: int
-    session_id: str
+    model_config = RESPONSE_CONFIG
+    
+    id: uuid.UUID
     user_id: int
-    spread_id: int
-    spread_name: str
+    session_type: str
+    spread_type: str
     question: Optional[str]
-    question_type: Optional[str]
-    cards: List[Dict[str, Any]]
+    cards_drawn: Any
     interpretation: Optional[str]
     status: str
-    created_at: str
-    completed_at: Optional[str]
-    metadata: Optional[Dict[str, Any]]
+    created_at: datetime
+    completed_at: Optional[datetime]
 
 class DailyTarotResponse(BaseModel):
     """每日塔罗响应"""
+    model_config = RESPONSE_CONFIG
+    
     id: int
     user_id: int
     card: TarotCardResponse
     is_reversed: bool
     interpretation: str
     date: str
-    created_at: str
+    created_at: datetime
 
 class DivinationStatsResponse(BaseModel):
     """占卜统计响应"""
+    model_config = RESPONSE_CONFIG
+    
     total_sessions: int
     completed_sessions: int
     monthly_sessions: int
@@ -106,92 +229,189 @@ class DivinationStatsResponse(BaseModel):
     most_drawn_card: Optional[str]
     accuracy_rating: Optional[float]
     streak_days: int
-    last_divination: Optional[str]
+    last_divination: Optional[datetime]
+
+# 固定结构的响应体：直接交给orjson序列化，不走jsonable_encoder
+class InterpretationResult(TypedDict):
+    """解释生成结果"""
+    message: str
+    task_id: str
+    status: str
+    interpretation: str
+    type: str
+
+class HistoryItem(TypedDict):
+    """占卜历史条目"""
+    id: uuid.UUID
+    session_type: str
+    spread_type: str
+    question: Optional[str]
+    status: str
+    created_at: datetime
+    completed_at: Optional[datetime]
+    card_count: int
+
+class HistoryResult(TypedDict):
+    """占卜历史分页结果"""
+    sessions: List[HistoryItem]
+    page: int
+    size: int
+
+# 出参序列化：数据来自数据库，不再经过pydantic校验，直接转成字典交给orjson
+# 响应模型只用于生成OpenAPI文档
+def _card_to_dict(card) -> Dict[str, Any]:
+    """塔罗牌转响应字典，大小阿卡纳对应表里的card_type"""
+    return {
+        "id": card.id,
+        "name": card.name_zh,
+        "name_en": card.name_en,
+        "name_ru": card.name_ru,
+        "suit": card.suit,
+        "number": card.number,
+        "arcana_type": card.card_type,
+        "keywords": card.keywords or [],
+        "meanings": card.meanings or {},
+        "reversed_meanings": card.reversed_meanings or {},
+        "image_url": card.image_url
+    }
+
+def _spread_to_dict(spread) -> Dict[str, Any]:
+    """牌阵模板转响应字典"""
+    return {
+        "id": spread.id,
+        "name": spread.name,
+        "display_names": spread.display_names or {},
+        "description": spread.description or {},
+        "card_count": spread.card_count,
+        "positions": spread.positions or {},
+        "is_premium": spread.is_premium,
+        "is_active": spread.is_active,
+        "sort_order": spread.sort_order
+    }
 
-@router.get("/cards", response_model=List[TarotCardResponse], summary="获取塔罗牌列表")
+def _session_to_dict(session) -> Dict[str, Any]:
+    """占卜会话转响应字典，牌阵直接取行上的spread_type，不用加载关联"""
+    return {
+        "id": session.id,
+        "user_id": session.user_id,
+        "session_type": session.session_type,
+        "spread_type": session.spread_type,
+        "question": session.question,
+        "cards_drawn": session.cards_drawn or [],
+        "interpretation": session.interpretation,
+        "status": session.status,
+        "created_at": session.created_at,
+        "completed_at": session.completed_at
+    }
+
+async def _stream_json_array(
+    first: bytes,
+    batches: AsyncIterator[List[Any]],
+    to_dict: Callable[[Any], Dict[str, Any]]
+) -> AsyncIterator[bytes]:
+    """先输出已经序列化好的第一批，再把后续分批读出的行逐批序列化，合起来是一个JSON数组"""
+    yield b"[" + first
+    separator = b"," if first else b""
+    async for rows in batches:
+        if not rows:
+            continue
+        yield separator + b",".join(orjson_dumps(to_dict(row)) for row in rows)
+        separator = b","
+    yield b"]"
+
+async def _json_array_response(
+    batches: AsyncIterator[List[Any]],
+    to_dict: Callable[[Any], Dict[str, Any]]
+) -> StreamingResponse:
+    """
+    分批读取的结果以JSON数组流式返回
+    第一批在返回响应前读取并序列化，查询或序列化出错时还没发响应头，按正常的错误状态码返回
+    """
+    rows = await anext(batches, [])
+    first = b",".join(orjson_dumps(to_dict(row)) for row in rows)
+    return StreamingResponse(
+        _stream_json_array(first, batches, to_dict),
+        media_type="application/json"
+    )
+
+@router.get(
+    "/cards",
+    responses={200: {"model": List[TarotCardResponse]}},
+    summary="获取塔罗牌列表"
+)
 async def get_tarot_cards(
+    request: Request,
     suit: Optional[str] = Query(None, description="花色"),
     arcana_type: Optional[str] = Query(None, description="大小阿卡纳类型"),
     limit: int = Query(78, ge=1, le=78, description="数量限制"),
     divination_service: DivinationService = Depends(get_divination_service)
 ):
     """获取塔罗牌列表"""
-    cards = await divination_service.get_all_tarot_cards(
-        suit=suit,
-        arcana_type=arcana_type,
-        limit=limit
-    )
+    # 不截断数量时直接用启动时序列化好的结果
+    if limit >= FULL_DECK_SIZE:
+        prebuilt = _prebuilt_cards.get((arcana_type, suit))
+        if prebuilt is not None:
+            return _catalog_response(request, *prebuilt)
     
-    return [
-        TarotCardResponse(
-            id=card.id,
-            name=card.name,
-            name_en=card.name_en,
-            suit=card.suit,
-            number=card.number,
-            arcana_type=card.arcana_type,
-            keywords=card.keywords or [],
-            description=card.description,
-            upright_meaning=card.upright_meaning,
-            reversed_meaning=card.reversed_meaning,
-            image_url=card.image_url,
-            symbolism=card.symbolism,
-            element=card.element,
-            planet=card.planet,
-            zodiac=card.zodiac
+    async def load():
+        cards = await divination_service.get_all_tarot_cards(
+            suit=suit,
+            arcana_type=arcana_type,
+            limit=limit
         )
-        for card in cards
-    ]
+        # 列表接口直接返回字典，不再逐行构造响应模型
+        return [_card_to_dict(card) for card in cards]
+    
+    body, etag = await _get_cached_catalog(("cards", suit, arcana_type, limit), load)
+    return _catalog_response(request, body, etag)
 
-@router.get("/cards/{card_id}", response_model=TarotCardResponse, summary="获取指定塔罗牌")
+@router.get(
+    "/cards/{card_id}",
+    responses={200: {"model": TarotCardResponse}},
+    summary="获取指定塔罗牌"
+)
 async def get_tarot_card(
+    request: Request,
     card_id: int,
     divination_service: DivinationService = Depends(get_divination_service)
 ):
     """获取指定塔罗牌详情"""
-    card = await divination_service.get_tarot_card_by_id(card_id)
+    async def load():
+        card = await divination_service.get_tarot_card_by_id(card_id)
+        return _card_to_dict(card) if card else None
     
-    if not card:
+    cached = await _get_cached_catalog(("card", card_id), load)
+    
+    if cached is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="塔罗牌不存在"
         )
     
-    return TarotCardResponse(
-        id=card.id,
-        name=card.name,
-        name_en=card.name_en,
-        suit=card.suit,
-        number=card.number,
-        arcana_type=card.arcana_type,
-        keywords=card.keywords or [],
-        description=card.description,
-        upright_meaning=card.upright_meaning,
-        reversed_meaning=card.reversed_meaning,
-        image_url=card.image_url,
-        symbolism=card.symbolism,
-        element=card.element,
-        planet=card.planet,
-        zodiac=card.zodiac
-    )
+    return _catalog_response(request, *cached)
 
-@router.get("/cards/random", response_model=TarotCardResponse, summary="获取随机塔罗牌")
+@router.get(
+    "/cards/random",
+    responses={200: {"model": TarotCardResponse}},
+    summary="获取随机塔罗牌"
+)
 async def get_random_tarot_card(
     exclude_ids: Optional[str] = Query(None, description="排除的牌ID，逗号分隔"),
     divination_service: DivinationService = Depends(get_divination_service)
 ):
     """获取随机塔罗牌"""
-    exclude_list = []
+    # 牌ID范围很小，排除集合用整数位图表示，服务层判断时一次位运算
+    exclude_mask = 0
     if exclude_ids:
         try:
-            exclude_list = [int(x.strip()) for x in exclude_ids.split(",") if x.strip()]
+            exclude_mask = _parse_exclude_mask(exclude_ids)
         except ValueError:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="无效的排除ID格式"
             )
     
-    card = await divination_service.get_random_tarot_cards(1, exclude_list)
+    card = await divination_service.get_random_tarot_cards(1, exclude_mask)
     
     if not card:
         raise HTTPException(
@@ -199,121 +419,99 @@ async def get_random_tarot_card(
             detail="没有可用的塔罗牌"
         )
     
-    card = card[0]
-    return TarotCardResponse(
-        id=card.id,
-        name=card.name,
-        name_en=card.name_en,
-        suit=card.suit,
-        number=card.number,
-        arcana_type=card.arcana_type,
-        keywords=card.keywords or [],
-        description=card.description,
-        upright_meaning=card.upright_meaning,
-        reversed_meaning=card.reversed_meaning,
-        image_url=card.image_url,
-        symbolism=card.symbolism,
-        element=card.element,
-        planet=card.planet,
-        zodiac=card.zodiac
-    )
+    # 数据刚从数据库取出，直接返回字典，不再经过响应模型校验
+    return _card_to_dict(card[0])
 
-@router.get("/spreads", response_model=List[SpreadTemplateResponse], summary="获取牌阵模板列表")
+@router.get(
+    "/spreads",
+    responses={200: {"model": List[SpreadTemplateResponse]}},
+    summary="获取牌阵模板列表"
+)
 async def get_spread_templates(
+    request: Request,
     category: Optional[str] = Query(None, description="分类"),
     difficulty: Optional[str] = Query(None, description="难度级别"),
     divination_service: DivinationService = Depends(get_divination_service)
 ):
     """获取牌阵模板列表"""
-    spreads = await divination_service.get_spread_templates(
-        category=category,
-        difficulty_level=difficulty
-    )
-    
-    return [
-        SpreadTemplateResponse(
-            id=spread.id,
-            name=spread.name,
-            name_en=spread.name_en,
-            description=spread.description,
-            card_count=spread.card_count,
-            positions=spread.positions or [],
-            difficulty_level=spread.difficulty_level,
-            category=spread.category,
-            image_url=spread.image_url,
-            instructions=spread.instructions,
-            is_active=spread.is_active
+    async def load():
+        spreads = await divination_service.get_spread_templates(
+            category=category,
+            difficulty_level=difficulty
         )
-        for spread in spreads
-    ]
+        return [_spread_to_dict(spread) for spread in spreads]
+    
+    body, etag = await _get_cached_catalog(("spreads", category, difficulty), load)
+    return _catalog_response(request, body, etag)
 
-@router.get("/spreads/{spread_id}", response_model=SpreadTemplateResponse, summary="获取指定牌阵模板")
+@router.get(
+    "/spreads/{spread_id}",
+    responses={200: {"model": SpreadTemplateResponse}},
+    summary="获取指定牌阵模板"
+)
 async def get_spread_template(
+    request: Request,
     spread_id: int,
     divination_service: DivinationService = Depends(get_divination_service)
 ):
     """获取指定牌阵模板详情"""
-    spread = await divination_service.get_spread_template_by_id(spread_id)
+    async def load():
+        spread = await divination_service.get_spread_template_by_id(spread_id)
+        return _spread_to_dict(spread) if spread else None
+    
+    cached = await _get_cached_catalog(("spread", spread_id), load)
     
-    if not spread:
+    if cached is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="牌阵模板不存在"
         )
     
-    return SpreadTemplateResponse(
-        id=spread.id,
-        name=spread.name,
-        name_en=spread.name_en,
-        description=spread.description,
-        card_count=spread.card_count,
-        positions=spread.positions or [],
-        difficulty_level=spread.difficulty_level,
-        category=spread.category,
-        image_url=spread.image_url,
-        instructions=spread.instructions,
-        is_active=spread.is_active
-    )
+    return _catalog_response(request, *cached)
 
-@router.get("/daily", response_model=DailyTarotResponse, summary="获取每日塔罗")
+# 每日塔罗一天之内不变，序列化好的响应体按(用户, 日期)缓存在Redis
+DAILY_TAROT_CACHE_TTL = 86400
+
+@router.get(
+    "/daily",
+    responses={200: {"model": DailyTarotResponse}},
+    summary="获取每日塔罗"
+)
 async def get_daily_tarot(
     current_user: User = Depends(get_current_user),
-    divination_service: DivinationService = Depends(get_divination_service)
+    divination_service: DivinationService = Depends(get_divination_service),
+    redis: RedisManager = Depends(get_redis)
 ):
     """获取用户的每日塔罗牌"""
+    cache_key = CacheKeys.daily_tarot_response(current_user.id, date.today().isoformat())
+    cached = await redis.get_raw(cache_key)
+    if cached:
+        return Response(content=cached, media_type="application/json")
+    
     daily_tarot = await divination_service.get_daily_tarot(current_user.id)
     
     if not daily_tarot:
         # 创建今日塔罗
         daily_tarot = await divination_service.create_daily_tarot(current_user.id)
     
-    return DailyTarotResponse(
-        id=daily_tarot.id,
-        user_id=daily_tarot.user_id,
-        card=TarotCardResponse(
-            id=daily_tarot.card.id,
-            name=daily_tarot.card.name,
-            name_en=daily_tarot.card.name_en,
-            suit=daily_tarot.card.suit,
-            number=daily_tarot.card.number,
-            arcana_type=daily_tarot.card.arcana_type,
-            keywords=daily_tarot.card.keywords or [],
-            description=daily_tarot.card.description,
-            upright_meaning=daily_tarot.card.upright_meaning,
-            reversed_meaning=daily_tarot.card.reversed_meaning,
-            image_url=daily_tarot.card.image_url,
-            symbolism=daily_tarot.card.symbolism,
-            element=daily_tarot.card.element,
-            planet=daily_tarot.card.planet,
-            zodiac=daily_tarot.card.zodiac
-        ),
-        is_reversed=daily_tarot.is_reversed,
-        interpretation=daily_tarot.interpretation,
-        date=daily_tarot.date.isoformat(),
-        created_at=format_datetime(daily_tarot.created_at)
-    )
+    body = orjson_dumps({
+        "id": daily_tarot.id,
+        "user_id": daily_tarot.user_id,
+        "card": _card_to_dict(daily_tarot.card),
+        "is_reversed": daily_tarot.is_reversed,
+        "interpretation": daily_tarot.interpretation,
+        "date": daily_tarot.date.isoformat(),
+        "created_at": daily_tarot.created_at
+    })
+    await redis.set(cache_key, body.decode(), expire=DAILY_TAROT_CACHE_TTL)
+    
+    return Response(content=body, media_type="application/json")
 
-@router.post("/sessions", response_model=DivinationSessionResponse, summary="创建占卜会话")
+@router.post(
+    "/sessions",
+    responses={200: {"model": DivinationSessionResponse}},
+    summary="创建占卜会话"
+)
 async def create_divination_session(
     request: CreateDivinationRequest,
     current_user: User = Depends(get_current_user),
@@ -330,21 +528,7 @@ async def create_divination_session(
             metadata=request.metadata
         )
         
-        return DivinationSessionResponse(
-            id=session.id,
-            session_id=session.session_id,
-            user_id=session.user_id,
-            spread_id=session.spread_id,
-            spread_name=session.spread.name,
-            question=session.question,
-            question_type=session.question_type,
-            cards=session.cards or [],
-            interpretation=session.interpretation,
-            status=session.status,
-            created_at=format_datetime(session.created_at),
-            completed_at=format_datetime(session.completed_at) if session.completed_at else None,
-            metadata=session.metadata
-        )
+        return _session_to_dict(session)
     
     except DivinationLimitExceededError as e:
         raise HTTPException(
@@ -357,7 +541,11 @@ async def create_divination_session(
             detail=str(e)
         )
 
-@router.get("/sessions", response_model=List[DivinationSessionResponse], summary="获取占卜会话列表")
+@router.get(
+    "/sessions",
+    responses={200: {"model": List[DivinationSessionResponse]}},
+    summary="获取占卜会话列表"
+)
 async def get_divination_sessions(
     status_filter: Optional[str] = Query(None, description="状态过滤"),
     limit: int = Query(20, ge=1, le=100, description="数量限制"),
@@ -366,40 +554,32 @@ async def get_divination_sessions(
     divination_service: DivinationService = Depends(get_divination_service)
 ):
     """获取用户的占卜会话列表"""
-    sessions = await divination_service.get_user_divination_sessions(
+    batches = divination_service.stream_user_divination_sessions(
         user_id=current_user.id,
         status=status_filter,
         limit=limit,
         offset=offset
     )
     
-    return [
-        DivinationSessionResponse(
-            id=session.id,
-            session_id=session.session_id,
-            user_id=session.user_id,
-            spread_id=session.spread_id,
-            spread_name=session.spread.name,
-            question=session.question,
-            question_type=session.question_type,
-            cards=session.cards or [],
-            interpretation=session.interpretation,
-            status=session.status,
-            created_at=format_datetime(session.created_at),
-            completed_at=format_datetime(session.completed_at) if session.completed_at else None,
-            metadata=session.metadata
-        )
-        for session in sessions
-    ]
+    # 边读边输出JSON数组，不在内存里攒整个列表
+    return await _json_array_response(batches, _session_to_dict)
 
-@router.get("/sessions/{session_id}", response_model=DivinationSessionResponse, summary="获取占卜会话详情")
+@router.get(
+    "/sessions/{session_id}",
+    responses={200: {"model": DivinationSessionResponse}},
+    summary="获取占卜会话详情"
+)
 async def get_divination_session(
     session_id: str,
     current_user: User = Depends(get_current_user),
     divination_service: DivinationService = Depends(get_divination_service)
 ):
     """获取指定占卜会话详情"""
-    session = await divination_service.get_divination_session_by_session_id(session_id)
+    # 普通用户只查自己的会话，管理员可以查看任意会话
+    if current_user.is_admin:
+        session = await divination_service.get_divination_session_by_session_id(session_id)
+    else:
+        session = await divination_service.get_session_if_owned(session_id, current_user.id)
     
     if not session:
         raise HTTPException(
@@ -407,75 +587,185 @@ async def get_divination_session(
             detail="占卜会话不存在"
         )
     
-    # 检查权限
-    if session.user_id != current_user.id and not current_user.is_admin:
+    return _session_to_dict(session)
+
+# 解释生成放到后台任务里跑，接口先返回task_id，客户端轮询结果
+# 任务状态存在Redis里，轮询落到哪个worker都能查到；每个会话同时只跑一个任务
+INTERPRETATION_WAIT_TIMEOUT = 30
+INTERPRETATION_RUN_TIMEOUT = 300
+INTERPRETATION_RESULT_TTL = 600
+
+# 运行中的任务要留个引用，不然可能被垃圾回收掉
+_running_interpretations: set = set()
+
+async def _generate_interpretation(
+    redis: RedisManager,
+    session_id: str,
+    interpretation_type: str,
+    card_position: Optional[int]
+) -> str:
+    """在独立的数据库会话里生成解释，结果由服务层写回占卜会话"""
+    async with AsyncSessionLocal() as db:
+        divination_service = DivinationService(db, redis)
+        if interpretation_type == "single":
+            return await divination_service.generate_single_card_interpretation(
+                session_id=session_id,
+                card_position=card_position
+            )
+        return await divination_service.generate_overall_interpretation(
+            session_id=session_id
+        )
+
+async def _run_interpretation(
+    redis: RedisManager,
+    task_id: str,
+    record: Dict[str, Any],
+    card_position: Optional[int]
+) -> Dict[str, Any]:
+    """生成解释并把任务状态写回Redis，最后释放会话上的任务占用"""
+    try:
+        interpretation = await asyncio.wait_for(
+            _generate_interpretation(redis, record["session_id"], record["type"], card_position),
+            INTERPRETATION_RUN_TIMEOUT
+        )
+        record = {**record, "status": "completed", "interpretation": interpretation}
+    except (ValidationError, ResourceNotFoundError) as e:
+        record = {**record, "status": "failed", "error": str(e)}
+    except Exception as e:
+        logger.error(f"生成占卜解释失败: {e}")
+        record = {**record, "status": "failed"}
+    
+    await redis.set(CacheKeys.interpretation_task(task_id), record, expire=INTERPRETATION_RESULT_TTL)
+    await redis.delete(CacheKeys.session_interpretation_task(record["session_id"]))
+    return record
+
+def _interpretation_result(task_id: str, record: Dict[str, Any]) -> ORJSONResponse:
+    """按任务状态生成响应：未完成返回202，完成返回解释，业务错误返回400"""
+    if record["status"] == "queued":
+        return ORJSONResponse(
+            status_code=status.HTTP_202_ACCEPTED,
+            content={"task_id": task_id, "status": "queued", "type": record["type"]}
+        )
+    
+    if record["status"] == "failed":
+        if record.get("error"):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=record["error"]
+            )
         raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="权限不足"
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="解释生成失败"
         )
     
-    return DivinationSessionResponse(
-        id=session.id,
-        session_id=session.session_id,
-        user_id=session.user_id,
-        spread_id=session.spread_id,
-        spread_name=session.spread.name,
-        question=session.question,
-        question_type=session.question_type,
-        cards=session.cards or [],
-        interpretation=session.interpretation,
-        status=session.status,
-        created_at=format_datetime(session.created_at),
-        completed_at=format_datetime(session.completed_at) if session.completed_at else None,
-        metadata=session.metadata
-    )
+    result: InterpretationResult = {
+        "message": "解释生成成功",
+        "task_id": task_id,
+        "status": "completed",
+        "interpretation": record["interpretation"],
+        "type": record["type"]
+    }
+    return ORJSONResponse(content=result)
 
-@router.post("/sessions/{session_id}/interpretation", summary="生成占卜解释")
+@router.post(
+    "/sessions/{session_id}/interpretation",
+    status_code=status.HTTP_202_ACCEPTED,
+    summary="生成占卜解释"
+)
 async def generate_interpretation(
     session_id: str,
     request: GenerateInterpretationRequest,
+    wait: bool = Query(False, description="是否等待生成完成（最多30秒）"),
     current_user: User = Depends(get_current_user),
+    redis: RedisManager = Depends(get_redis),
     divination_service: DivinationService = Depends(get_divination_service)
 ):
-    """为占卜会话生成解释"""
-    try:
-        # 验证会话归属
-        session = await divination_service.get_divination_session_by_session_id(session_id)
-        if not session or session.user_id != current_user.id:
+    """为占卜会话生成解释，默认异步执行并返回task_id；会话已有任务在跑时返回那个任务"""
+    # 验证会话归属
+    session = await divination_service.get_session_if_owned(session_id, current_user.id)
+    if not session:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="占卜会话不存在"
+        )
+    
+    if request.interpretation_type == "single" and request.card_position is None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="单张牌解释需要指定牌位置"
+        )
+    
+    # 先占住会话，占不到说明已有任务在跑
+    task_id = uuid.uuid4().hex
+    session_key = CacheKeys.session_interpretation_task(session_id)
+    claimed = await redis.set_nx(session_key, task_id, expire=INTERPRETATION_RUN_TIMEOUT)
+    if claimed is None:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="解释服务暂时不可用，请稍后重试"
+        )
+    
+    if not claimed:
+        running_id = await redis.get_raw(session_key)
+        record = await redis.get(CacheKeys.interpretation_task(running_id)) if running_id else None
+        if not record:
             raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="占卜会话不存在"
-            )
-        
-        if request.interpretation_type == "single":
-            if request.card_position is None:
-                raise HTTPException(
-                    status_code=status.HTTP_400_BAD_REQUEST,
-                    detail="单张牌解释需要指定牌位置"
-                )
-            
-            interpretation = await divination_service.generate_single_card_interpretation(
-                session_id=session_id,
-                card_position=request.card_position
+                status_code=status.HTTP_409_CONFLICT,
+                detail="该会话的解释正在生成中，请稍后重试"
             )
-        else:
-            interpretation = await divination_service.generate_overall_interpretation(
-                session_id=session_id
-            )
-        
-        return {
-            "message": "解释生成成功",
-            "interpretation": interpretation,
-            "type": request.interpretation_type
-        }
+        return _interpretation_result(running_id, record)
     
-    except (ValidationError, ResourceNotFoundError) as e:
+    record = {
+        "session_id": session_id,
+        "user_id": current_user.id,
+        "type": request.interpretation_type,
+        "status": "queued"
+    }
+    if not await redis.set(CacheKeys.interpretation_task(task_id), record, expire=INTERPRETATION_RUN_TIMEOUT):
+        await redis.delete(session_key)
         raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail=str(e)
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="解释服务暂时不可用，请稍后重试"
+        )
+    
+    task = asyncio.create_task(_run_interpretation(redis, task_id, record, request.card_position))
+    _running_interpretations.add(task)
+    task.add_done_callback(_running_interpretations.discard)
+    
+    if wait:
+        # shield保证等待超时时后台任务不被取消
+        try:
+            record = await asyncio.wait_for(asyncio.shield(task), INTERPRETATION_WAIT_TIMEOUT)
+        except asyncio.TimeoutError:
+            pass
+    
+    return _interpretation_result(task_id, record)
+
+@router.get(
+    "/sessions/{session_id}/interpretation/{task_id}",
+    summary="查询占卜解释生成结果"
+)
+async def get_interpretation_result(
+    session_id: str,
+    task_id: str,
+    current_user: User = Depends(get_current_user),
+    redis: RedisManager = Depends(get_redis)
+):
+    """查询后台解释任务的状态，完成后返回解释内容"""
+    record = await redis.get(CacheKeys.interpretation_task(task_id))
+    if not record or record["session_id"] != session_id or record["user_id"] != current_user.id:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="解释任务不存在"
         )
+    
+    return _interpretation_result(task_id, record)
 
-@router.get("/stats", response_model=DivinationStatsResponse, summary="获取占卜统计")
+@router.get(
+    "/stats",
+    responses={200: {"model": DivinationStatsResponse}},
+    summary="获取占卜统计"
+)
 async def get_divination_stats(
     current_user: User = Depends(get_current_user),
     divination_service: DivinationService = Depends(get_divination_service)
@@ -483,58 +773,47 @@ async def get_divination_stats(
     """获取用户占卜统计信息"""
     stats = await divination_service.get_user_divination_stats(current_user.id)
     
-    return DivinationStatsResponse(**stats)
+    return stats
 
 @router.get("/history", summary="获取占卜历史")
 async def get_divination_history(
-    start_date: Optional[str] = Query(None, description="开始日期 (YYYY-MM-DD)"),
-    end_date: Optional[str] = Query(None, description="结束日期 (YYYY-MM-DD)"),
-    spread_id: Optional[int] = Query(None, description="牌阵ID"),
+    start_date: Optional[date] = Query(None, description="开始日期 (YYYY-MM-DD)"),
+    end_date: Optional[date] = Query(None, description="结束日期 (YYYY-MM-DD)"),
+    spread_type: Optional[str] = Query(None, description="牌阵类型"),
     pagination: Dict[str, int] = Depends(get_pagination_params),
     current_user: User = Depends(get_current_user),
     divination_service: DivinationService = Depends(get_divination_service)
 ):
     """获取用户占卜历史"""
-    try:
-        from datetime import datetime
-        
-        start_dt = None
-        end_dt = None
-        
-        if start_date:
-            start_dt = datetime.fromisoformat(start_date)
-        if end_date:
-            end_dt = datetime.fromisoformat(end_date)
-        
-        sessions = await divination_service.get_user_divination_sessions(
-            user_id=current_user.id,
-            start_date=start_dt,
-            end_date=end_dt,
-            spread_id=spread_id,
-            limit=pagination["size"],
-            offset=pagination["offset"]
-        )
-        
-        return {
-            "sessions": [
-                {
-                    "id": session.id,
-                    "session_id": session.session_id,
-                    "spread_name": session.spread.name,
-                    "question": session.question,
-                    "status": session.status,
-                    "created_at": format_datetime(session.created_at),
-                    "completed_at": format_datetime(session.completed_at) if session.completed_at else None,
-                    "card_count": len(session.cards) if session.cards else 0
-                }
-                for session in sessions
-            ],
-            "page": pagination["page"],
-            "size": pagination["size"]
-        }
+    # 日期由FastAPI在参数解析时校验，格式错误直接返回422；结束日期当天也包含在内
+    start_dt = datetime.combine(start_date, datetime.min.time()) if start_date else None
+    end_dt = datetime.combine(end_date + timedelta(days=1), datetime.min.time()) if end_date else None
     
-    except ValueError as e:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail=f"日期格式错误: {str(e)}"
-        )
\ No newline at end of file
+    sessions = await divination_service.get_user_divination_sessions(
+        user_id=current_user.id,
+        start_date=start_dt,
+        end_date=end_dt,
+        spread_type=spread_type,
+        limit=pagination["size"],
+        offset=pagination["offset"]
+    )
+    
+    history: List[HistoryItem] = [
+        {
+            "id": session.id,
+            "session_type": session.session_type,
+            "spread_type": session.spread_type,
+            "question": session.question,
+            "status": session.status,
+            "created_at": session.created_at,
+            "completed_at": session.completed_at,
+            "card_count": len(session.cards_drawn) if session.cards_drawn else 0
+        }
+        for session in sessions
+    ]
+    result: HistoryResult = {
+        "sessions": history,
+        "page": pagination["page"],
+        "size": pagination["size"]
+    }
+    return ORJSONResponse(content=result)
@@ -3,17 +3,24 @@
 订单相关API路由
 """
 
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+import asyncio
+import uuid
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Request, Response
 from pydantic import BaseModel, Field
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Callable, Awaitable, Tuple, FrozenSet
 from decimal import Decimal
+from datetime import datetime
 
 from core.dependencies import (
     get_order_service,
     get_current_user,
+    get_redis,
     get_pagination_params,
     rate_limit_check
 )
+from config.database import AsyncSessionLocal
+from config.redis_config import RedisManager, CacheKeys
+from models.order import Order
 from models.user import User
 from services.order_service import OrderService
 from utils.exceptions import (
@@ -21,9 +28,10 @@ from utils.exceptions import (
     ResourceNotFoundError,
     InsufficientPermissionError
 )
-from utils.helpers import format_datetime
+from utils.helpers import encode_cursor, decode_cursor
+from core.responses import ORJSONResponse, orjson_dumps, make_etag, is_not_modified
 
-router = APIRouter()
+router = APIRouter(default_response_class=ORJSONResponse)
 
 # 请求模型
 class CreateOrderRequest(BaseModel):
@@ -39,6 +47,11 @@ class UpdateOrderRequest(BaseModel):
     notes: Optional[str] = Field(None, description="备注")
     metadata: Optional[Dict[str, Any]] = Field(None, description="元数据")
 
+# 等级功能位，多个布尔开关合成一个整数下发，以后加开关也不用改响应结构
+TIER_FLAG_PRIORITY_SUPPORT = 1
+TIER_FLAG_CUSTOM_SPREADS = 2
+TIER_FLAG_DETAILED_INTERPRETATION = 4
+
 # 响应模型
 class UserTierResponse(BaseModel):
     """用户等级响应"""
@@ -46,14 +59,12 @@ class UserTierResponse(BaseModel):
     name: str
     name_en: str
     description: str
-    price: float
+    price: Decimal
     currency: str
     duration_days: int
     features: List[str]
     daily_divination_limit: int
-    priority_support: bool
-    custom_spreads: bool
-    detailed_interpretation: bool
+    flags: int = Field(..., description="功能位：1=优先客服，2=自定义牌阵，4=详细解读")
     is_active: bool
     sort_order: int
 
@@ -64,15 +75,15 @@ class OrderResponse(BaseModel):
     user_id: int
     tier_id: int
     tier_name: str
-    amount: float
+    amount: Decimal
     currency: str
     status: str
     payment_method: str
     payment_status: str
-    created_at: str
-    updated_at: Optional[str]
-    expires_at: Optional[str]
-    completed_at: Optional[str]
+    created_at: datetime
+    updated_at: Optional[datetime]
+    expires_at: Optional[datetime]
+    completed_at: Optional[datetime]
     notes: Optional[str]
     metadata: Optional[Dict[str, Any]]
 
@@ -93,50 +104,237 @@ class PaymentRecordResponse(BaseModel):
     order_id: int
     transaction_id: str
     payment_provider: str
-    amount: float
+    amount: Decimal
     currency: str
     status: str
     payment_method: str
-    created_at: str
-    updated_at: Optional[str]
-    completed_at: Optional[str]
+    created_at: datetime
+    updated_at: Optional[datetime]
+    completed_at: Optional[datetime]
     failure_reason: Optional[str]
     metadata: Optional[Dict[str, Any]]
 
-@router.get("/tiers", response_model=List[UserTierResponse], summary="获取用户等级列表")
+class AdminOrderItem(BaseModel):
+    """管理员订单列表条目"""
+    id: int
+    order_number: str
+    user_id: int
+    user_name: Optional[str]
+    tier_name: str
+    amount: Decimal
+    currency: str
+    status: str
+    payment_method: str
+    payment_status: str
+    created_at: datetime
+    completed_at: Optional[datetime]
+
+class AdminOrderListResponse(BaseModel):
+    """管理员订单列表响应"""
+    orders: List[AdminOrderItem]
+    total: Optional[int]
+    page: int
+    size: int
+    pages: Optional[int]
+    has_more: bool
+
+class GlobalOrderStatsResponse(BaseModel):
+    """全局订单统计响应"""
+    order_stats: Dict[str, Any]
+    revenue_stats: Any
+
+# 出参序列化：数据来自数据库，直接转成字典交给orjson，跳过jsonable_encoder和响应模型校验
+# 响应模型只用于生成OpenAPI文档
+# 订单、等级和支付的金额输出成字符串，不经过float，避免精度丢失（和pydantic的JSON输出一致）；
+# 全局的orjson默认行为不变，其他接口的Decimal仍输出为数字
+def _money(value: Optional[Decimal]) -> Optional[str]:
+    """金额转字符串"""
+    return str(value) if value is not None else None
+
+def _tier_flags(tier) -> int:
+    """把等级的功能开关合成功能位"""
+    return (
+        (TIER_FLAG_PRIORITY_SUPPORT if tier.priority_support else 0)
+        | (TIER_FLAG_CUSTOM_SPREADS if tier.custom_spreads else 0)
+        | (TIER_FLAG_DETAILED_INTERPRETATION if tier.detailed_interpretation else 0)
+    )
+
+def _tier_to_dict(tier) -> Dict[str, Any]:
+    """用户等级转响应字典"""
+    return {
+        "id": tier.id,
+        "name": tier.name,
+        "name_en": tier.name_en,
+        "description": tier.description,
+        "price": _money(tier.price),
+        "currency": tier.currency,
+        "duration_days": tier.duration_days,
+        "features": tier.features or [],
+        "daily_divination_limit": tier.daily_divination_limit,
+        "flags": _tier_flags(tier),
+        "is_active": tier.is_active,
+        "sort_order": tier.sort_order
+    }
+
+def _order_to_dict(order) -> Dict[str, Any]:
+    """订单转响应字典，时间字段交给orjson格式化"""
+    return {
+        "id": order.id,
+        "order_number": order.order_number,
+        "user_id": order.user_id,
+        "tier_id": order.tier_id,
+        "tier_name": order.tier.name,
+        "amount": _money(order.amount),
+        "currency": order.currency,
+        "status": order.status,
+        "payment_method": order.payment_method,
+        "payment_status": order.payment_status,
+        "created_at": order.created_at,
+        "updated_at": order.updated_at,
+        "expires_at": order.expires_at,
+        "completed_at": order.completed_at,
+        "notes": order.notes,
+        "metadata": order.metadata
+    }
+
+def _payment_to_dict(payment) -> Dict[str, Any]:
+    """支付记录转响应字典"""
+    return {
+        "id": payment.id,
+        "order_id": payment.order_id,
+        "transaction_id": payment.transaction_id,
+        "payment_provider": payment.payment_provider,
+        "amount": _money(payment.amount),
+        "currency": payment.currency,
+        "status": payment.status,
+        "payment_method": payment.payment_method,
+        "created_at": payment.created_at,
+        "updated_at": payment.updated_at,
+        "completed_at": payment.completed_at,
+        "failure_reason": payment.failure_reason,
+        "metadata": payment.metadata
+    }
+
+# 列表接口允许通过fields挑选返回的字段，只接受白名单里的字段名
+ORDER_FIELDS = frozenset(OrderResponse.model_fields)
+ADMIN_ORDER_FIELDS = frozenset(AdminOrderItem.model_fields)
+
+def _parse_fields(fields: Optional[str], allowed: FrozenSet[str]) -> Optional[FrozenSet[str]]:
+    """解析逗号分隔的字段列表，未指定时返回None表示全部字段"""
+    if not fields:
+        return None
+    selected = frozenset(name.strip() for name in fields.split(",") if name.strip())
+    unknown = selected - allowed
+    if unknown:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"不支持的字段: {', '.join(sorted(unknown))}"
+        )
+    return selected or None
+
+def _select_fields(rows: List[Dict[str, Any]], fields: Optional[FrozenSet[str]]) -> List[Dict[str, Any]]:
+    """只保留请求的字段，少序列化的部分直接省掉CPU和带宽"""
+    if fields is None:
+        return rows
+    return [{key: value for key, value in row.items() if key in fields} for row in rows]
+
+def _parse_cursor(cursor: Optional[str]) -> Optional[Tuple[datetime, uuid.UUID]]:
+    """解析订单分页游标"""
+    if not cursor:
+        return None
+    try:
+        created_at, order_id = decode_cursor(cursor)
+        return created_at, uuid.UUID(order_id)
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="分页游标格式错误"
+        )
+
+def _next_cursor_headers(orders: List[Any], page_size: int) -> Dict[str, str]:
+    """本页取满时通过响应头返回下一页游标"""
+    if len(orders) < page_size:
+        return {}
+    last_order = orders[-1]
+    return {"X-Next-Cursor": encode_cursor(last_order.created_at, last_order.id)}
+
+async def get_owned_order(
+    order_id: int,
+    current_user: User = Depends(get_current_user),
+    order_service: OrderService = Depends(get_order_service)
+) -> Order:
+    """
+    获取当前用户有权访问的订单，不存在返回404，无权访问返回403
+    作为依赖使用时同一请求内只查询一次
+    """
+    order = await order_service.get_order_by_id(order_id)
+    if not order:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="订单不存在"
+        )
+    
+    if order.user_id != current_user.id and not current_user.is_admin:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="权限不足"
+        )
+    
+    return order
+
+# 等级数据很少变动，序列化好的响应体缓存在Redis，等级修改时由服务层清除
+TIER_CACHE_TTL = 3600
+TIER_CACHE_CONTROL = "public, max-age=300"
+
+def _tier_response(request: Request, body: bytes) -> Response:
+    """等级数据响应，ETag一致时直接返回304"""
+    etag = make_etag(body)
+    headers = {"ETag": etag, "Cache-Control": TIER_CACHE_CONTROL}
+    if is_not_modified(request, etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+@router.get(
+    "/tiers",
+    responses={200: {"model": List[UserTierResponse]}},
+    summary="获取用户等级列表"
+)
 async def get_user_tiers(
+    request: Request,
     is_active: bool = Query(True, description="是否只显示激活的等级"),
-    order_service: OrderService = Depends(get_order_service)
+    order_service: OrderService = Depends(get_order_service),
+    redis: RedisManager = Depends(get_redis)
 ):
     """获取用户等级列表"""
-    tiers = await order_service.get_user_tiers(is_active=is_active)
+    cache_key = CacheKeys.user_tiers_response(is_active)
+    cached = await redis.get_raw(cache_key)
+    if cached:
+        return _tier_response(request, cached.encode())
     
-    return [
-        UserTierResponse(
-            id=tier.id,
-            name=tier.name,
-            name_en=tier.name_en,
-            description=tier.description,
-            price=float(tier.price),
-            currency=tier.currency,
-            duration_days=tier.duration_days,
-            features=tier.features or [],
-            daily_divination_limit=tier.daily_divination_limit,
-            priority_support=tier.priority_support,
-            custom_spreads=tier.custom_spreads,
-            detailed_interpretation=tier.detailed_interpretation,
-            is_active=tier.is_active,
-            sort_order=tier.sort_order
-        )
-        for tier in tiers
-    ]
+    tiers = await order_service.get_user_tiers(active_only=is_active)
+    
+    body = orjson_dumps([_tier_to_dict(tier) for tier in tiers])
+    await redis.set(cache_key, body.decode(), expire=TIER_CACHE_TTL)
+    
+    return _tier_response(request, body)
 
-@router.get("/tiers/{tier_id}", response_model=UserTierResponse, summary="获取指定用户等级")
+@router.get(
+    "/tiers/{tier_id}",
+    responses={200: {"model": UserTierResponse}},
+    summary="获取指定用户等级"
+)
 async def get_user_tier(
+    request: Request,
     tier_id: int,
-    order_service: OrderService = Depends(get_order_service)
+    order_service: OrderService = Depends(get_order_service),
+    redis: RedisManager = Depends(get_redis)
 ):
     """获取指定用户等级详情"""
+    cache_key = CacheKeys.user_tier_response(tier_id)
+    cached = await redis.get_raw(cache_key)
+    if cached:
+        return _tier_response(request, cached.encode())
+    
     tier = await order_service.get_user_tier_by_id(tier_id)
     
     if not tier:
@@ -145,24 +343,16 @@ async def get_user_tier(
             detail="用户等级不存在"
         )
     
-    return UserTierResponse(
-        id=tier.id,
-        name=tier.name,
-        name_en=tier.name_en,
-        description=tier.description,
-        price=float(tier.price),
-        currency=tier.currency,
-        duration_days=tier.duration_days,
-        features=tier.features or [],
-        daily_divination_limit=tier.daily_divination_limit,
-        priority_support=tier.priority_support,
-        custom_spreads=tier.custom_spreads,
-        detailed_interpretation=tier.detailed_interpretation,
-        is_active=tier.is_active,
-        sort_order=tier.sort_order
-    )
+    body = orjson_dumps(_tier_to_dict(tier))
+    await redis.set(cache_key, body.decode(), expire=TIER_CACHE_TTL)
+    
+    return _tier_response(request, body)
 
-@router.post("/", response_model=OrderResponse, summary="创建订单")
+@router.post(
+    "/",
+    responses={200: {"model": OrderResponse}},
+    summary="创建订单"
+)
 async def create_order(
     request: CreateOrderRequest,
     current_user: User = Depends(get_current_user),
@@ -179,24 +369,7 @@ async def create_order(
             metadata=request.metadata
         )
         
-        return OrderResponse(
-            id=order.id,
-            order_number=order.order_number,
-            user_id=order.user_id,
-            tier_id=order.tier_id,
-            tier_name=order.tier.name,
-            amount=float(order.amount),
-            currency=order.currency,
-            status=order.status,
-            payment_method=order.payment_method,
-            payment_status=order.payment_status,
-            created_at=format_datetime(order.created_at),
-            updated_at=format_datetime(order.updated_at) if order.updated_at else None,
-            expires_at=format_datetime(order.expires_at) if order.expires_at else None,
-            completed_at=format_datetime(order.completed_at) if order.completed_at else None,
-            notes=order.notes,
-            metadata=order.metadata
-        )
+        return ORJSONResponse(content=_order_to_dict(order))
     
     except (ValidationError, ResourceNotFoundError) as e:
         raise HTTPException(
@@ -204,104 +377,71 @@ async def create_order(
             detail=str(e)
         )
 
-@router.get("/", response_model=List[OrderResponse], summary="获取订单列表")
+@router.get(
+    "/",
+    responses={200: {"model": List[OrderResponse]}},
+    summary="获取订单列表"
+)
 async def get_orders(
     status_filter: Optional[str] = Query(None, description="状态过滤"),
     payment_status: Optional[str] = Query(None, description="支付状态过滤"),
     limit: int = Query(20, ge=1, le=100, description="数量限制"),
     offset: int = Query(0, ge=0, description="偏移量"),
+    cursor: Optional[str] = Query(None, description="分页游标，传了就忽略偏移量"),
+    fields: Optional[str] = Query(None, description="只返回这些字段，逗号分隔"),
     current_user: User = Depends(get_current_user),
     order_service: OrderService = Depends(get_order_service)
 ):
     """获取用户订单列表"""
+    selected_fields = _parse_fields(fields, ORDER_FIELDS)
+    
     orders = await order_service.get_user_orders(
         user_id=current_user.id,
         status=status_filter,
         payment_status=payment_status,
         limit=limit,
-        offset=offset
+        offset=offset,
+        include=("tier",),
+        cursor=_parse_cursor(cursor)
     )
     
-    return [
-        OrderResponse(
-            id=order.id,
-            order_number=order.order_number,
-            user_id=order.user_id,
-            tier_id=order.tier_id,
-            tier_name=order.tier.name,
-            amount=float(order.amount),
-            currency=order.currency,
-            status=order.status,
-            payment_method=order.payment_method,
-            payment_status=order.payment_status,
-            created_at=format_datetime(order.created_at),
-            updated_at=format_datetime(order.updated_at) if order.updated_at else None,
-            expires_at=format_datetime(order.expires_at) if order.expires_at else None,
-            completed_at=format_datetime(order.completed_at) if order.completed_at else None,
-            notes=order.notes,
-            metadata=order.metadata
-        )
-        for order in orders
-    ]
+    return ORJSONResponse(
+        content=_select_fields([_order_to_dict(order) for order in orders], selected_fields),
+        headers=_next_cursor_headers(orders, limit)
+    )
 
-@router.get("/{order_id}", response_model=OrderResponse, summary="获取订单详情")
+@router.get(
+    "/{order_id}",
+    responses={200: {"model": OrderResponse}},
+    summary="获取订单详情"
+)
 async def get_order(
-    order_id: int,
-    current_user: User = Depends(get_current_user),
-    order_service: OrderService = Depends(get_order_service)
+    request: Request,
+    order: Order = Depends(get_owned_order)
 ):
     """获取指定订单详情"""
-    order = await order_service.get_order_by_id(order_id)
-    
-    if not order:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="订单不存在"
-        )
+    # 订单每次变化都会更新updated_at，用它生成ETag，未变化时不用序列化
+    etag = f'W/"{order.id}-{order.updated_at.timestamp()}"'
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if is_not_modified(request, etag):
+        return Response(status_code=304, headers=headers)
     
-    # 检查权限
-    if order.user_id != current_user.id and not current_user.is_admin:
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="权限不足"
-        )
-    
-    return OrderResponse(
-        id=order.id,
-        order_number=order.order_number,
-        user_id=order.user_id,
-        tier_id=order.tier_id,
-        tier_name=order.tier.name,
-        amount=float(order.amount),
-        currency=order.currency,
-        status=order.status,
-        payment_method=order.payment_method,
-        payment_status=order.payment_status,
-        created_at=format_datetime(order.created_at),
-        updated_at=format_datetime(order.updated_at) if order.updated_at else None,
-        expires_at=format_datetime(order.expires_at) if order.expires_at else None,
-        completed_at=format_datetime(order.completed_at) if order.completed_at else None,
-        notes=order.notes,
-        metadata=order.metadata
-    )
+    return ORJSONResponse(content=_order_to_dict(order), headers=headers)
 
-@router.put("/{order_id}", response_model=OrderResponse, summary="更新订单")
+@router.put(
+    "/{order_id}",
+    responses={200: {"model": OrderResponse}},
+    summary="更新订单"
+)
 async def update_order(
     order_id: int,
     request: UpdateOrderRequest,
+    order: Order = Depends(get_owned_order),
     current_user: User = Depends(get_current_user),
     order_service: OrderService = Depends(get_order_service)
 ):
-    """更新订单信息"""
+    """更新订单信息，用户只能更新自己的订单备注"""
     try:
-        # 检查订单存在性和权限
-        order = await order_service.get_order_by_id(order_id)
-        if not order:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="订单不存在"
-            )
-        
         # 只有管理员可以更新订单状态
         if request.status and not current_user.is_admin:
             raise HTTPException(
@@ -309,15 +449,8 @@ async def update_order(
                 detail="权限不足"
             )
         
-        # 用户只能更新自己的订单备注
-        if order.user_id != current_user.id and not current_user.is_admin:
-            raise HTTPException(
-                status_code=status.HTTP_403_FORBIDDEN,
-                detail="权限不足"
-            )
-        
-        # 过滤非空字段
-        update_data = {k: v for k, v in request.dict().items() if v is not None}
+        # 只取客户端实际提交且非空的字段
+        update_data = request.model_dump(exclude_unset=True, exclude_none=True)
         
         if not update_data:
             raise HTTPException(
@@ -327,27 +460,11 @@ async def update_order(
         
         updated_order = await order_service.update_order_status(
             order_id=order_id,
+            order=order,
             **update_data
         )
         
-        return OrderResponse(
-            id=updated_order.id,
-            order_number=updated_order.order_number,
-            user_id=updated_order.user_id,
-            tier_id=updated_order.tier_id,
-            tier_name=updated_order.tier.name,
-            amount=float(updated_order.amount),
-            currency=updated_order.currency,
-            status=updated_order.status,
-            payment_method=updated_order.payment_method,
-            payment_status=updated_order.payment_status,
-            created_at=format_datetime(updated_order.created_at),
-            updated_at=format_datetime(updated_order.updated_at) if updated_order.updated_at else None,
-            expires_at=format_datetime(updated_order.expires_at) if updated_order.expires_at else None,
-            completed_at=format_datetime(updated_order.completed_at) if updated_order.completed_at else None,
-            notes=updated_order.notes,
-            metadata=updated_order.metadata
-        )
+        return ORJSONResponse(content=_order_to_dict(updated_order))
     
     except (ValidationError, InsufficientPermissionError) as e:
         raise HTTPException(
@@ -359,26 +476,12 @@ async def update_order(
 async def cancel_order(
     order_id: int,
     reason: Optional[str] = Query(None, description="取消原因"),
-    current_user: User = Depends(get_current_user),
+    order: Order = Depends(get_owned_order),
     order_service: OrderService = Depends(get_order_service)
 ):
     """取消订单"""
     try:
-        # 检查订单存在性和权限
-        order = await order_service.get_order_by_id(order_id)
-        if not order:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="订单不存在"
-            )
-        
-        if order.user_id != current_user.id and not current_user.is_admin:
-            raise HTTPException(
-                status_code=status.HTTP_403_FORBIDDEN,
-                detail="权限不足"
-            )
-        
-        await order_service.cancel_order(order_id, reason)
+        await order_service.cancel_order(order_id, reason, order=order)
         
         return {"message": "订单已取消"}
     
@@ -388,66 +491,84 @@ async def cancel_order(
             detail=str(e)
         )
 
-@router.get("/{order_id}/payments", response_model=List[PaymentRecordResponse], summary="获取订单支付记录")
+@router.get(
+    "/{order_id}/payments",
+    responses={200: {"model": List[PaymentRecordResponse]}},
+    summary="获取订单支付记录"
+)
 async def get_order_payments(
     order_id: int,
-    current_user: User = Depends(get_current_user),
+    order: Order = Depends(get_owned_order),
     order_service: OrderService = Depends(get_order_service)
 ):
     """获取订单的支付记录"""
-    # 检查订单存在性和权限
-    order = await order_service.get_order_by_id(order_id)
-    if not order:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="订单不存在"
-        )
-    
-    if order.user_id != current_user.id and not current_user.is_admin:
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="权限不足"
-        )
-    
     payments = await order_service.get_payment_records_by_order(order_id)
     
-    return [
-        PaymentRecordResponse(
-            id=payment.id,
-            order_id=payment.order_id,
-            transaction_id=payment.transaction_id,
-            payment_provider=payment.payment_provider,
-            amount=float(payment.amount),
-            currency=payment.currency,
-            status=payment.status,
-            payment_method=payment.payment_method,
-            created_at=format_datetime(payment.created_at),
-            updated_at=format_datetime(payment.updated_at) if payment.updated_at else None,
-            completed_at=format_datetime(payment.completed_at) if payment.completed_at else None,
-            failure_reason=payment.failure_reason,
-            metadata=payment.metadata
-        )
-        for payment in payments
-    ]
+    return ORJSONResponse(content=[_payment_to_dict(payment) for payment in payments])
+
+# 统计接口会被后台页面轮询，聚合结果短时间缓存
+USER_STATS_CACHE_TTL = 60
+GLOBAL_STATS_CACHE_TTL = 300
+REVENUE_STATS_CACHE_TTL = 900
 
-@router.get("/stats/overview", response_model=OrderStatsResponse, summary="获取订单统计")
+async def _cached_body(
+    redis: RedisManager,
+    cache_key: str,
+    expire: int,
+    load: Callable[[], Awaitable[Any]]
+) -> bytes:
+    """从Redis取序列化好的响应体，未命中时调用load生成并写回"""
+    cached = await redis.get_raw(cache_key)
+    if cached:
+        return cached.encode()
+    
+    body = orjson_dumps(await load())
+    await redis.set(cache_key, body.decode(), expire=expire)
+    return body
+
+async def _run_in_own_session(
+    redis: RedisManager,
+    call: Callable[[OrderService], Awaitable[Any]]
+) -> Any:
+    """在独立的数据库会话里调用服务方法，同一个会话不能并发执行查询"""
+    async with AsyncSessionLocal() as db:
+        return await call(OrderService(db, redis))
+
+@router.get(
+    "/stats/overview",
+    responses={200: {"model": OrderStatsResponse}},
+    summary="获取订单统计"
+)
 async def get_order_stats(
     current_user: User = Depends(get_current_user),
-    order_service: OrderService = Depends(get_order_service)
+    order_service: OrderService = Depends(get_order_service),
+    redis: RedisManager = Depends(get_redis)
 ):
     """获取用户订单统计信息"""
-    stats = await order_service.get_order_stats(user_id=current_user.id)
+    body = await _cached_body(
+        redis,
+        CacheKeys.user_order_stats(current_user.id),
+        USER_STATS_CACHE_TTL,
+        lambda: order_service.get_user_order_stats(current_user.id)
+    )
     
-    return OrderStatsResponse(**stats)
+    return Response(content=body, media_type="application/json")
 
 # 管理员专用接口
-@router.get("/admin/list", summary="获取所有订单列表（管理员）")
+@router.get(
+    "/admin/list",
+    responses={200: {"model": AdminOrderListResponse}},
+    summary="获取所有订单列表（管理员）"
+)
 async def get_all_orders(
     user_id: Optional[int] = Query(None, description="用户ID"),
     status_filter: Optional[str] = Query(None, description="状态过滤"),
     payment_status: Optional[str] = Query(None, description="支付状态过滤"),
     start_date: Optional[str] = Query(None, description="开始日期"),
     end_date: Optional[str] = Query(None, description="结束日期"),
+    cursor: Optional[str] = Query(None, description="分页游标，传了就忽略页码"),
+    with_total: bool = Query(False, description="是否统计总数和总页数"),
+    fields: Optional[str] = Query(None, description="只返回这些字段，逗号分隔"),
     pagination: Dict[str, int] = Depends(get_pagination_params),
     current_user: User = Depends(get_current_user),
     order_service: OrderService = Depends(get_order_service)
@@ -460,9 +581,9 @@ async def get_all_orders(
             detail="权限不足"
         )
     
+    selected_fields = _parse_fields(fields, ADMIN_ORDER_FIELDS)
+    
     try:
-        from datetime import datetime
-        
         start_dt = None
         end_dt = None
         
@@ -471,42 +592,53 @@ async def get_all_orders(
         if end_date:
             end_dt = datetime.fromisoformat(end_date)
         
-        orders, total = await order_service.get_orders(
+        orders, total, has_more = await order_service.get_orders(
             user_id=user_id,
             status=status_filter,
             payment_status=payment_status,
             start_date=start_dt,
             end_date=end_dt,
             limit=pagination["size"],
-            offset=pagination["offset"]
+            offset=pagination["offset"],
+            include=("tier",),
+            cursor=_parse_cursor(cursor),
+            with_total=with_total
         )
         
-        # 计算总页数
-        pages = (total + pagination["size"] - 1) // pagination["size"]
+        # 用户名按本页出现的用户ID一次查出来，没请求这个字段就不查
+        user_names = {}
+        if selected_fields is None or "user_name" in selected_fields:
+            user_names = await order_service.get_user_display_names({order.user_id for order in orders})
+        
+        # 没有统计总数时总页数也不返回
+        pages = None
+        if total is not None:
+            pages = (total + pagination["size"] - 1) // pagination["size"]
         
-        return {
-            "orders": [
+        return ORJSONResponse(content={
+            "orders": _select_fields([
                 {
                     "id": order.id,
                     "order_number": order.order_number,
                     "user_id": order.user_id,
-                    "user_name": f"{order.user.first_name} {order.user.last_name}".strip() if order.user else None,
+                    "user_name": user_names.get(order.user_id),
                     "tier_name": order.tier.name,
-                    "amount": float(order.amount),
+                    "amount": _money(order.amount),
                     "currency": order.currency,
                     "status": order.status,
                     "payment_method": order.payment_method,
                     "payment_status": order.payment_status,
-                    "created_at": format_datetime(order.created_at),
-                    "completed_at": format_datetime(order.completed_at) if order.completed_at else None
+                    "created_at": order.created_at,
+                    "completed_at": order.completed_at
                 }
                 for order in orders
-            ],
+            ], selected_fields),
             "total": total,
             "page": pagination["page"],
             "size": pagination["size"],
-            "pages": pages
-        }
+            "pages": pages,
+            "has_more": has_more
+        }, headers=_next_cursor_headers(orders, pagination["size"]) if has_more else {})
     
     except ValueError as e:
         raise HTTPException(
@@ -514,10 +646,14 @@ async def get_all_orders(
             detail=f"日期格式错误: {str(e)}"
         )
 
-@router.get("/admin/stats", summary="获取全局订单统计（管理员）")
+@router.get(
+    "/admin/stats",
+    responses={200: {"model": GlobalOrderStatsResponse}},
+    summary="获取全局订单统计（管理员）"
+)
 async def get_global_order_stats(
     current_user: User = Depends(get_current_user),
-    order_service: OrderService = Depends(get_order_service)
+    redis: RedisManager = Depends(get_redis)
 ):
     """获取全局订单统计信息（管理员专用）"""
     # 检查管理员权限
@@ -527,13 +663,27 @@ async def get_global_order_stats(
             detail="权限不足"
         )
     
-    stats = await order_service.get_order_stats()
-    revenue_stats = await order_service.get_revenue_stats()
+    # 两部分分开缓存，收入统计变化慢，缓存时间更长；拼接时直接用缓存的字节
+    # 两个查询互不依赖，各用一个数据库会话并发执行
+    stats, revenue_stats = await asyncio.gather(
+        _cached_body(
+            redis,
+            CacheKeys.global_order_stats(),
+            GLOBAL_STATS_CACHE_TTL,
+            lambda: _run_in_own_session(redis, OrderService.get_order_stats)
+        ),
+        _cached_body(
+            redis,
+            CacheKeys.revenue_stats(),
+            REVENUE_STATS_CACHE_TTL,
+            lambda: _run_in_own_session(redis, OrderService.get_revenue_stats)
+        )
+    )
     
-    return {
-        "order_stats": stats,
-        "revenue_stats": revenue_stats
-    }
+    return Response(
+        content=b'{"order_stats":' + stats + b',"revenue_stats":' + revenue_stats + b"}",
+        media_type="application/json"
+    )
 
 @router.post("/admin/process-expired", summary="处理过期订单（管理员）")
 async def process_expired_orders(
@@ -9,6 +9,8 @@
 
 import asyncio
 import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
 from contextlib import asynccontextmanager
 from fastapi import FastAPI, Request, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
@@ -18,11 +20,13 @@ from fastapi.exceptions import RequestValidationError
 from starlette.exceptions import HTTPException as StarletteHTTPException
 from prometheus_client import make_asgi_app
 import uvicorn
+import anyio.to_thread
 
-from config.database import init_database, close_database
+from config.database import init_database, close_database, db_config
 from config.redis_config import create_redis_manager
 from utils.exceptions import BaseAPIException, get_error_response
 from api.v1 import api_router
+from api.v1.divination import prebuild_card_catalog
 from core.middleware import (
     LoggingMiddleware,
     RateLimitMiddleware,
@@ -30,6 +34,12 @@ from core.middleware import (
     MetricsMiddleware
 )
 from core.config import settings
+from core.responses import ORJSONResponse
+from core.config_cache import config_cache
+from core.dependencies import listen_current_user_invalidate
+from services.admin_service import audit_log_queue
+from services.user_service import last_login_batcher
+from services.payment_service import payment_callback_queue
 
 # 设置日志 - 我喜欢简单直接的日志格式
 logging.basicConfig(
@@ -50,6 +60,17 @@ async def lifespan(app: FastAPI):
     # 启动时的准备工作
     logger.info("🚀 塔罗API服务启动中...")
     
+    # 默认线程池按数据库连接池大小来定：to_thread/run_in_executor的同步任务
+    # 多半要等数据库连接，线程比连接多太多只会排队，调整DB_POOL_SIZE时这里跟着变
+    executor = ThreadPoolExecutor(
+        max_workers=db_config.POOL_SIZE + 4,
+        thread_name_prefix="admin-io"
+    )
+    asyncio.get_running_loop().set_default_executor(executor)
+    
+    # run_in_threadpool走的是anyio自己的限流器，同步依赖和密码哈希并发多时默认40个不够用
+    anyio.to_thread.current_default_thread_limiter().total_tokens = max(40, (os.cpu_count() or 1) * 8)
+    
     try:
         # 先搞定数据库
         await init_database()
@@ -62,6 +83,25 @@ async def lifespan(app: FastAPI):
         # 把Redis挂到app上，方便其他地方用
         app.state.redis = redis_manager
         
+        # 整副塔罗牌预先序列化，失败时/cards退回按需查询加缓存
+        try:
+            await prebuild_card_catalog(redis_manager)
+        except Exception as e:
+            logger.warning(f"⚠️ 塔罗牌预序列化失败: {e}")
+        
+        # 订阅配置失效广播，多worker时各自清缓存
+        config_listener = asyncio.create_task(config_cache.listen(redis_manager))
+        user_listener = asyncio.create_task(listen_current_user_invalidate(redis_manager))
+        
+        # 审计日志后台批量写入
+        audit_writer = asyncio.create_task(audit_log_queue.run())
+        
+        # 登录时间后台批量更新
+        login_writer = asyncio.create_task(last_login_batcher.run())
+        
+        # 支付回调后台批量处理
+        callback_writer = asyncio.create_task(payment_callback_queue.run(redis_manager))
+        
         logger.info("🎉 所有服务启动完成，准备接收请求")
         
     except Exception as e:
@@ -74,6 +114,20 @@ async def lifespan(app: FastAPI):
     logger.info("🛑 开始关闭服务...")
     
     try:
+        config_listener.cancel()
+        user_listener.cancel()
+        
+        # 先停掉写入任务，再把队列里剩下的日志、登录记录和支付回调处理完，Redis和数据库要在这之后再关
+        for writer in (audit_writer, login_writer, callback_writer):
+            writer.cancel()
+            try:
+                await writer
+            except asyncio.CancelledError:
+                pass
+        await audit_log_queue.flush()
+        await last_login_batcher.flush()
+        await payment_callback_queue.flush()
+        
         # 清理顺序很重要，先关Redis再关数据库
         await redis_manager.disconnect()
         logger.info("✅ Redis已断开")
@@ -81,6 +135,8 @@ async def lifespan(app: FastAPI):
         await close_database()
         logger.info("✅ 数据库已断开")
         
+        executor.shutdown(wait=False)
+        
         logger.info("👋 服务已完全关闭")
         
     except Exception as e:
@@ -94,6 +150,7 @@ app = FastAPI(
     # 开发时显示文档，生产环境关闭（安全考虑）
     docs_url="/docs" if settings.DEBUG else None,
     redoc_url="/redoc" if settings.DEBUG else None,
+    default_response_class=ORJSONResponse,  # orjson比标准库json快不少
     lifespan=lifespan
 )
 
@@ -28,6 +28,8 @@ class DatabaseConfig:
         self.MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
         self.POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", "30"))
         self.POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "3600"))
+        # 取连接前先探活，数据库重启或连接被中间件断开后不会把坏连接交给请求
+        self.POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() == "true"
 
 class Base(DeclarativeBase):
     """
@@ -54,6 +56,7 @@ engine = create_async_engine(
     max_overflow=db_config.MAX_OVERFLOW,
     pool_timeout=db_config.POOL_TIMEOUT,
     pool_recycle=db_config.POOL_RECYCLE,
+    pool_pre_ping=db_config.POOL_PRE_PING,
     echo=os.getenv("DB_ECHO", "false").lower() == "true",  # 开发时可以看SQL
     future=True
 )
@@ -35,12 +35,22 @@ class RedisConfig:
         self.DAILY_CARD_EXPIRE = int(os.getenv("DAILY_CARD_EXPIRE", "86400"))  # 24小时
         self.USER_PREFERENCE_EXPIRE = int(os.getenv("USER_PREFERENCE_EXPIRE", "604800"))  # 7天
 
+# 计数加一，第一次计数时设置过期时间；两条命令在服务端原子执行，客户端只需一次往返
+_INCR_WINDOW_SCRIPT = """
+local count = redis.call('INCR', KEYS[1])
+if count == 1 then
+    redis.call('EXPIRE', KEYS[1], ARGV[1])
+end
+return count
+"""
+
 class RedisManager:
     """Redis 连接管理器"""
     
     def __init__(self, config: Optional[RedisConfig] = None):
         self.config = config or RedisConfig()
         self.redis: Optional[aioredis.Redis] = None
+        self._incr_window_script = None
         
     async def connect(self):
         """连接到 Redis"""
@@ -89,6 +99,18 @@ class RedisManager:
             logger.error(f"Redis SET 操作失败 {key}: {e}")
             return False
     
+    async def set_nx(self, key: str, value: Any, expire: Optional[int] = None) -> Optional[bool]:
+        """键不存在时才设置，返回是否设置成功；Redis出错时返回None，和键已存在区分开"""
+        try:
+            if isinstance(value, (dict, list)):
+                value = json.dumps(value, ensure_ascii=False)
+            
+            result = await self.redis.set(key, value, ex=expire, nx=True)
+            return bool(result)
+        except Exception as e:
+            logger.error(f"Redis SET NX 操作失败 {key}: {e}")
+            return None
+    
     async def get(self, key: str) -> Optional[Any]:
         """获取值"""
         try:
@@ -105,6 +127,14 @@ class RedisManager:
             logger.error(f"Redis GET 操作失败 {key}: {e}")
             return None
     
+    async def get_raw(self, key: str) -> Optional[str]:
+        """获取原始字符串值，不做JSON解析，缓存序列化好的响应体时使用"""
+        try:
+            return await self.redis.get(key)
+        except Exception as e:
+            logger.error(f"Redis GET 操作失败 {key}: {e}")
+            return None
+    
     async def delete(self, key: str) -> bool:
         """删除键"""
         try:
@@ -141,6 +171,17 @@ class RedisManager:
             logger.error(f"Redis INCR 操作失败 {key}: {e}")
             return None
     
+    async def incr_window(self, key: str, seconds: int) -> Optional[int]:
+        """固定窗口计数：计数加一，窗口内第一次计数时设置过期时间"""
+        try:
+            # 脚本只注册一次，之后走EVALSHA，不用每次把脚本发过去
+            if self._incr_window_script is None:
+                self._incr_window_script = self.redis.register_script(_INCR_WINDOW_SCRIPT)
+            return await self._incr_window_script(keys=[key], args=[seconds])
+        except Exception as e:
+            logger.error(f"Redis 窗口计数失败 {key}: {e}")
+            return None
+    
     async def decr(self, key: str, amount: int = 1) -> Optional[int]:
         """递减计数器"""
         try:
@@ -202,6 +243,15 @@ class RedisManager:
         except Exception as e:
             logger.error(f"Redis HGETALL 操作失败 {name}: {e}")
             return {}
+    
+    async def publish(self, channel: str, message: str) -> int:
+        """发布消息到频道"""
+        try:
+            result = await self.redis.publish(channel, message)
+            return result
+        except Exception as e:
+            logger.error(f"Redis PUBLISH 操作失败 {channel}: {e}")
+            return 0
 
 # 全局 Redis 配置和管理器
 redis_config = RedisConfig()
@@ -230,6 +280,11 @@ class CacheKeys:
         """用户频率限制缓存键"""
         return f"rate_limit:user:{user_id}"
     
+    @staticmethod
+    def ip_rate_limit(ip: str) -> str:
+        """IP频率限制缓存键"""
+        return f"rate_limit:ip:{ip}"
+    
     @staticmethod
     def user_daily_requests(user_id: int, date: str) -> str:
         """用户每日请求计数缓存键"""
@@ -245,6 +300,66 @@ class CacheKeys:
         """每日塔罗牌缓存键"""
         return f"daily_card:user:{user_id}:{date}"
     
+    @staticmethod
+    def daily_tarot_response(user_id: int, date: str) -> str:
+        """每日塔罗响应体缓存键"""
+        return f"daily_tarot:user:{user_id}:{date}"
+    
+    @staticmethod
+    def user_tiers(active_only: bool) -> str:
+        """用户等级列表缓存键"""
+        return f"user_tiers:{'active' if active_only else 'all'}"
+    
+    @staticmethod
+    def user_tier(tier_id: int) -> str:
+        """用户等级缓存键"""
+        return f"user_tier:{tier_id}"
+    
+    @staticmethod
+    def user_tiers_response(active_only: bool) -> str:
+        """用户等级列表响应体缓存键"""
+        return f"user_tiers_response:{'active' if active_only else 'all'}"
+    
+    @staticmethod
+    def user_tier_response(tier_id: int) -> str:
+        """用户等级详情响应体缓存键"""
+        return f"user_tier_response:{tier_id}"
+    
+    @staticmethod
+    def user_order_stats(user_id: int) -> str:
+        """用户订单统计响应体缓存键"""
+        return f"order_stats:user:{user_id}"
+    
+    @staticmethod
+    def global_order_stats() -> str:
+        """全局订单统计缓存键"""
+        return "order_stats:global"
+    
+    @staticmethod
+    def revenue_stats() -> str:
+        """收入统计缓存键"""
+        return "revenue_stats:global"
+    
+    @staticmethod
+    def interpretation_task(task_id: str) -> str:
+        """占卜解释任务状态缓存键"""
+        return f"interpretation_task:{task_id}"
+    
+    @staticmethod
+    def session_interpretation_task(session_id: str) -> str:
+        """占卜会话进行中的解释任务缓存键"""
+        return f"interpretation_task:session:{session_id}"
+    
+    @staticmethod
+    def pending_payment_callbacks() -> str:
+        """待处理支付回调哈希键"""
+        return "payment_callbacks:pending"
+    
+    @staticmethod
+    def password_reset(user_id: int) -> str:
+        """密码重置令牌缓存键"""
+        return f"password_reset:user:{user_id}"
+    
     @staticmethod
     def user_preferences(user_id: int) -> str:
         """用户偏好设置缓存键"""
@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+"""
+后台批量写入队列
+请求路径上只入队，后台任务攒够一批或到时间后一次性处理
+
+作者: Lima
+"""
+
+import asyncio
+import logging
+from abc import ABC, abstractmethod
+from typing import Any, List
+
+logger = logging.getLogger(__name__)
+
+
+class BatchingQueue(ABC):
+    """
+    批量写入队列基类
+    子类实现_write处理一批数据，入队接口按各自的参数包一层put
+    """
+    
+    def __init__(self, batch_size: int, flush_interval: float):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue: asyncio.Queue = asyncio.Queue()
+    
+    def put(self, item: Any):
+        """入队，不阻塞"""
+        self._queue.put_nowait(item)
+    
+    @abstractmethod
+    async def _write(self, items: List[Any]):
+        """处理一批数据，由子类实现"""
+    
+    async def _safe_write(self, items: List[Any]):
+        """处理一批数据，异常只记日志，不让后台循环退出"""
+        try:
+            await self._write(items)
+        except Exception as e:
+            logger.error(f"{type(self).__name__} 批量处理失败 ({len(items)} 条): {e}")
+    
+    async def run(self):
+        """后台处理循环，应用启动时作为任务运行"""
+        loop = asyncio.get_running_loop()
+        
+        while True:
+            items = [await self._queue.get()]
+            
+            try:
+                # 在时间窗口内尽量多攒几条
+                deadline = loop.time() + self.flush_interval
+                while len(items) < self.batch_size:
+                    timeout = deadline - loop.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        items.append(await asyncio.wait_for(self._queue.get(), timeout))
+                    except asyncio.TimeoutError:
+                        break
+            except asyncio.CancelledError:
+                # 关闭时手上这批也要处理完
+                await self._safe_write(items)
+                raise
+            
+            await self._safe_write(items)
+    
+    async def flush(self):
+        """处理队列中剩余的数据，关闭服务时调用"""
+        items = []
+        while not self._queue.empty():
+            items.append(self._queue.get_nowait())
+            if len(items) >= self.batch_size:
+                await self._safe_write(items)
+                items = []
+        
+        if items:
+            await self._safe_write(items)
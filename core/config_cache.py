@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+"""
+系统配置进程内缓存
+配置读多写少，读的时候直接查字典，改的时候通过Redis广播让每个worker都清掉自己的副本
+
+作者: Lima
+"""
+
+import asyncio
+import logging
+from typing import Any, Dict, Optional, Tuple
+
+from config.redis_config import RedisManager
+
+logger = logging.getLogger(__name__)
+
+# 配置失效广播频道
+CONFIG_INVALIDATE_CHANNEL = "config.invalidate"
+
+# 广播"全部失效"时用的消息
+_ALL_KEYS = "*"
+
+
+class ConfigCache:
+    """
+    系统配置缓存
+    只是一个按配置键索引的字典，多worker之间靠Redis发布订阅同步失效
+    """
+    
+    def __init__(self):
+        self._data: Dict[str, Any] = {}
+    
+    def get(self, key: str) -> Tuple[bool, Any]:
+        """
+        读取缓存
+        
+        Returns:
+            (是否命中, 缓存值)
+        """
+        if key in self._data:
+            return True, self._data[key]
+        return False, None
+    
+    def set(self, key: str, value: Any):
+        """写入缓存"""
+        self._data[key] = value
+    
+    def invalidate(self, key: Optional[str] = None):
+        """清除指定配置，key为空时全部清除"""
+        if key is None or key == _ALL_KEYS:
+            self._data.clear()
+        else:
+            self._data.pop(key, None)
+    
+    async def publish_invalidate(self, redis: RedisManager, key: Optional[str] = None):
+        """清除本进程缓存并通知其他worker"""
+        self.invalidate(key)
+        await redis.publish(CONFIG_INVALIDATE_CHANNEL, key or _ALL_KEYS)
+    
+    async def listen(self, redis: RedisManager):
+        """
+        订阅失效广播，应用启动时作为后台任务运行
+        
+        Args:
+            redis: Redis管理器
+        """
+        pubsub = redis.redis.pubsub()
+        await pubsub.subscribe(CONFIG_INVALIDATE_CHANNEL)
+        
+        try:
+            async for message in pubsub.listen():
+                if message.get("type") != "message":
+                    continue
+                self.invalidate(message.get("data"))
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            logger.error(f"配置失效订阅出错: {e}")
+        finally:
+            await pubsub.unsubscribe(CONFIG_INVALIDATE_CHANNEL)
+            await pubsub.close()
+
+
+# 全局配置缓存实例
+config_cache = ConfigCache()
@@ -3,21 +3,32 @@
 依赖注入模块
 """
 
-from typing import AsyncGenerator, Optional
+import asyncio
+import hashlib
+import logging
+import time
+from collections import OrderedDict
+from types import MappingProxyType
+from typing import AsyncGenerator, Optional, Dict, Set, Tuple, Any, Annotated, Mapping
 from fastapi import Depends, HTTPException, status, Request
+from sqlalchemy import inspect as sa_inspect
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from config.database import get_db as _get_db
-from config.redis_config import RedisManager
+from config.redis_config import RedisManager, CacheKeys
+from models.user import User
 from services.user_service import UserService
 from services.cache_service import CacheService
 from services.order_service import OrderService
 from services.divination_service import DivinationService
 from services.admin_service import AdminService
 from services.payment_service import PaymentService
-from utils.exceptions import RateLimitExceededError, MaintenanceModeError
+from utils.exceptions import RateLimitExceeded, MaintenanceMode
+from utils.security import verify_token, password_version
 from core.config import settings
 
+logger = logging.getLogger(__name__)
+
 # 数据库依赖
 async def get_db() -> AsyncGenerator[AsyncSession, None]:
     """获取数据库会话"""
@@ -42,6 +53,8 @@ async def get_user_service(
     """获取用户服务"""
     return UserService(db, redis)
 
+UserServiceDep = Annotated[UserService, Depends(get_user_service)]
+
 # 订单服务依赖
 async def get_order_service(
     db: AsyncSession = Depends(get_db),
@@ -75,41 +88,44 @@ async def get_payment_service(
     return PaymentService(db, redis)
 
 # 速率限制检查
-async def check_rate_limit(
+async def rate_limit_check(
     request: Request,
-    cache_service: CacheService = Depends(get_cache_service)
+    redis: RedisManager = Depends(get_redis)
 ):
-    """检查速率限制"""
-    if not settings.RATE_LIMIT_ENABLED:
+    """
+    接口级速率限制，固定窗口计数
+    已登录用户按用户计数，否则按IP；计数和设置过期在一个Lua脚本里完成，每次检查只有一次Redis往返
+    """
+    if not settings.ENABLE_RATE_LIMIT:
         return
     
-    # 获取客户端IP
-    client_ip = request.client.host
-    if "x-forwarded-for" in request.headers:
-        client_ip = request.headers["x-forwarded-for"].split(",")[0].strip()
+    claims = getattr(request.state, "claims", None)
+    if claims:
+        key = CacheKeys.user_rate_limit(claims["sub"])
+    else:
+        # 和限流中间件一样只认连接地址，不信任客户端自带的X-Forwarded-For
+        client_ip = request.client.host if request.client else "unknown"
+        key = CacheKeys.ip_rate_limit(client_ip)
     
-    # 检查每分钟限制
-    allowed, remaining = await cache_service.check_rate_limit(
-        user_id=hash(client_ip),  # 使用IP哈希作为用户ID
-        action="api_request",
-        limit=settings.RATE_LIMIT_REQUESTS_PER_MINUTE,
-        window_seconds=60
-    )
+    count = await redis.incr_window(key, settings.RATE_LIMIT_WINDOW)
+    if count is None:
+        # Redis不可用时放行，进程内的限流中间件仍然兜底
+        return
     
-    if not allowed:
-        raise RateLimitExceededError(
-            detail=f"请求过于频繁，请在 {60} 秒后重试",
-            retry_after=60
+    if count > settings.RATE_LIMIT_REQUESTS:
+        raise RateLimitExceeded(
+            detail=f"请求过于频繁，请在 {settings.RATE_LIMIT_WINDOW} 秒后重试",
+            retry_after=settings.RATE_LIMIT_WINDOW
         )
     
     # 设置响应头
-    request.state.rate_limit_remaining = remaining
+    request.state.rate_limit_remaining = settings.RATE_LIMIT_REQUESTS - count
 
 # 维护模式检查
 async def check_maintenance_mode():
     """检查维护模式"""
     if settings.MAINTENANCE_MODE:
-        raise MaintenanceModeError(detail=settings.MAINTENANCE_MESSAGE)
+        raise MaintenanceMode(detail=settings.MAINTENANCE_MESSAGE)
 
 # 用户认证依赖（可选）
 async def get_optional_current_user(
@@ -127,9 +143,11 @@ async def get_optional_current_user(
     # 从Authorization头获取
     auth_header = request.headers.get("Authorization")
     if auth_header and auth_header.startswith("Bearer "):
-        token = auth_header[7:]
-        # 这里可以添加JWT令牌验证逻辑
-        # user_id = verify_token(token)
+        claims = verify_token(auth_header[7:])
+        if claims and str(claims.get("sub", "")).isdigit():
+            user_id = int(claims["sub"])
+            # 后面的依赖和接口要用到过期时间等信息，解出来的载荷挂到请求上
+            request.state.claims = claims
     
     # 从查询参数获取（仅用于开发/测试）
     if settings.DEBUG:
@@ -142,10 +160,71 @@ async def get_optional_current_user(
     
     return user_id
 
+# 已认证用户进程内缓存：令牌哈希 -> (过期时间, 用户字段快照)
+# 缓存的是不可变的列值快照，每次命中都新建一个User，请求之间不共享ORM对象；
+# 令牌里的pwv声明和快照中的密码版本对不上时不走缓存，回库后仍对不上说明密码已改，令牌作废
+CURRENT_USER_CACHE_TTL = 60
+CURRENT_USER_CACHE_SIZE = 200_000
+USER_INVALIDATE_CHANNEL = "user:invalidate"
+_current_user_cache: "OrderedDict[bytes, Tuple[float, Mapping[str, Any]]]" = OrderedDict()
+_current_user_keys: Dict[int, Set[bytes]] = {}
+
+def _user_snapshot(user: User) -> Mapping[str, Any]:
+    """把用户的列值拷成只读快照"""
+    return MappingProxyType({
+        attr.key: getattr(user, attr.key) for attr in sa_inspect(User).column_attrs
+    })
+
+def _drop_current_user_key(cache_key: bytes, user_id: int):
+    """从按用户的索引里移除一个缓存键"""
+    keys = _current_user_keys.get(user_id)
+    if keys is not None:
+        keys.discard(cache_key)
+        if not keys:
+            del _current_user_keys[user_id]
+
+def invalidate_current_user_cache(user_id: int):
+    """清掉本进程里该用户所有令牌的缓存"""
+    for cache_key in _current_user_keys.pop(user_id, ()):
+        _current_user_cache.pop(cache_key, None)
+
+async def publish_current_user_invalidate(redis: RedisManager, user_id: int):
+    """用户信息或密码变更后清除本进程缓存并通知其他worker"""
+    invalidate_current_user_cache(user_id)
+    await redis.publish(USER_INVALIDATE_CHANNEL, str(user_id))
+
+async def listen_current_user_invalidate(redis: RedisManager):
+    """
+    订阅用户缓存失效广播，应用启动时作为后台任务运行
+    
+    Args:
+        redis: Redis管理器
+    """
+    pubsub = redis.redis.pubsub()
+    await pubsub.subscribe(USER_INVALIDATE_CHANNEL)
+    
+    try:
+        async for message in pubsub.listen():
+            if message.get("type") != "message":
+                continue
+            try:
+                invalidate_current_user_cache(int(message.get("data")))
+            except (TypeError, ValueError):
+                continue
+    except asyncio.CancelledError:
+        pass
+    except Exception as e:
+        logger.error(f"用户缓存失效订阅出错: {e}")
+    finally:
+        await pubsub.unsubscribe(USER_INVALIDATE_CHANNEL)
+        await pubsub.close()
+
 # 必需的用户认证依赖
 async def get_current_user(
-    user_id: Optional[int] = Depends(get_optional_current_user)
-) -> int:
+    request: Request,
+    user_id: Optional[int] = Depends(get_optional_current_user),
+    user_service: UserService = Depends(get_user_service)
+) -> User:
     """获取当前用户（必需）"""
     if user_id is None:
         raise HTTPException(
@@ -153,51 +232,132 @@ async def get_current_user(
             detail="需要用户认证",
             headers={"WWW-Authenticate": "Bearer"}
         )
-    return user_id
-
-# 管理员认证依赖
-async def get_current_admin(
-    request: Request,
-    admin_service: AdminService = Depends(get_admin_service)
-) -> int:
-    """获取当前管理员"""
-    auth_header = request.headers.get("Authorization")
-    if not auth_header or not auth_header.startswith("Bearer "):
+    
+    # 只有验签通过的令牌才走缓存；老令牌没有pwv声明，不做密码版本比对
+    claims = getattr(request.state, "claims", None)
+    token_pwv = claims.get("pwv") if claims else None
+    cache_key = None
+    if claims:
+        token = request.headers["Authorization"][7:]
+        cache_key = hashlib.blake2b(token.encode(), digest_size=16).digest()
+        cached = _current_user_cache.get(cache_key)
+        if (
+            cached
+            and cached[0] > time.monotonic()
+            and cached[1]["user_id"] == user_id
+            and (token_pwv is None or token_pwv == password_version(cached[1]["password_hash"]))
+        ):
+            _current_user_cache.move_to_end(cache_key)
+            return User(**cached[1])
+    
+    user = await user_service.get_user_from_db(user_id)
+    if not user or not user.is_active:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="需要管理员认证",
+            detail="用户不存在或已停用",
             headers={"WWW-Authenticate": "Bearer"}
         )
     
-    token = auth_header[7:]
-    # 这里应该验证管理员JWT令牌
-    # admin_id = verify_admin_token(token)
-    # 临时返回固定值，实际应该从令牌中解析
-    admin_id = 1
-    
-    if not admin_id:
+    if token_pwv is not None and token_pwv != password_version(user.password_hash):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="无效的管理员令牌",
+            detail="密码已修改，请重新登录",
             headers={"WWW-Authenticate": "Bearer"}
         )
     
-    return admin_id
+    if cache_key is not None:
+        ttl = min(CURRENT_USER_CACHE_TTL, claims["exp"] - time.time())
+        _current_user_cache[cache_key] = (time.monotonic() + ttl, _user_snapshot(user))
+        _current_user_keys.setdefault(user.user_id, set()).add(cache_key)
+        if len(_current_user_cache) > CURRENT_USER_CACHE_SIZE:
+            evicted_key, (_, evicted) = _current_user_cache.popitem(last=False)
+            _drop_current_user_key(evicted_key, evicted["user_id"])
+    
+    return user
+
+# 管理员信息进程内缓存：user_id -> (过期时间, 管理员)
+ADMIN_PERMISSION_CACHE_TTL = 60
+_admin_permission_cache: Dict[int, Tuple[float, Any]] = {}
+
+def invalidate_admin_permission_cache(admin_id: Optional[int] = None):
+    """管理员信息变更后清除权限缓存，admin_id为空时全部清除"""
+    if admin_id is None:
+        _admin_permission_cache.clear()
+        return
+    
+    stale_keys = [
+        user_id for user_id, (_, admin) in _admin_permission_cache.items()
+        if admin.id == admin_id
+    ]
+    for user_id in stale_keys:
+        del _admin_permission_cache[user_id]
+
+# 管理员权限检查依赖
+async def check_admin_permission(
+    request: Request,
+    current_user: User = Depends(get_current_user),
+    admin_service: AdminService = Depends(get_admin_service)
+):
+    """
+    检查当前用户是否是可访问后台的管理员
+    管理员由验签后的用户解析得到，结果挂在request.state上供同一请求内复用，跨请求缓存60秒
+    """
+    admin = getattr(request.state, "admin", None)
+    if admin is not None:
+        return admin
+    
+    cached = _admin_permission_cache.get(current_user.user_id)
+    if cached and cached[0] > time.monotonic():
+        admin = cached[1]
+    else:
+        admin = await admin_service.get_admin_by_user_id(current_user.user_id)
+        if admin:
+            _admin_permission_cache[current_user.user_id] = (
+                time.monotonic() + ADMIN_PERMISSION_CACHE_TTL, admin
+            )
+    
+    if not admin:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="管理员不存在"
+        )
+    
+    if not admin.is_active:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="管理员账户已被禁用"
+        )
+    
+    request.state.admin = admin
+    return admin
+
+# 管理员认证依赖
+async def get_current_admin(admin=Depends(check_admin_permission)) -> int:
+    """获取当前管理员ID"""
+    return admin.id
+
+# 管理后台上下文依赖
+async def get_admin_context(
+    current_user: User = Depends(get_current_user),
+    admin_service: AdminService = Depends(get_admin_service),
+    _=Depends(check_admin_permission)
+) -> Tuple[User, AdminService]:
+    """
+    管理后台接口的公共依赖
+    用户认证、权限检查、管理员服务合并成一个依赖，接口签名只需要声明一次
+    """
+    return current_user, admin_service
+
+AdminContext = Annotated[Tuple[User, AdminService], Depends(get_admin_context)]
 
 # 权限检查依赖
 def require_permission(permission: str):
     """权限检查装饰器"""
     async def permission_checker(
         admin_id: int = Depends(get_current_admin),
+        admin=Depends(check_admin_permission),
         admin_service: AdminService = Depends(get_admin_service)
     ):
-        admin = await admin_service.get_admin_by_id(admin_id)
-        if not admin:
-            raise HTTPException(
-                status_code=status.HTTP_403_FORBIDDEN,
-                detail="管理员不存在"
-            )
-        
         # 检查权限
         if not admin_service.check_permission(admin, permission):
             raise HTTPException(
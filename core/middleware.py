@@ -5,9 +5,11 @@ FastAPI中间件
 作者: Lima
 """
 
+import math
 import time
 import logging
-from typing import Callable
+from collections import OrderedDict
+from typing import Callable, Tuple
 from fastapi import Request, Response
 from fastapi.responses import JSONResponse
 from starlette.middleware.base import BaseHTTPMiddleware
@@ -15,7 +17,6 @@ from starlette.types import ASGIApp
 from prometheus_client import Counter, Histogram, Gauge
 
 from core.config import settings
-from core.dependencies import get_cache_service
 
 # 日志配置
 logger = logging.getLogger(__name__)
@@ -126,15 +127,59 @@ class SecurityMiddleware(BaseHTTPMiddleware):
         return response
 
 
+class TokenBucketLimiter:
+    """
+    进程内令牌桶
+    每个key一个桶，按时间匀速补充令牌，桶的数量有上限，超出时淘汰最久没访问的
+    事件循环是单线程的，hit里没有await，不需要额外加锁
+    """
+    
+    def __init__(self, rate: float, capacity: int, max_keys: int = 100_000):
+        self.rate = rate
+        self.capacity = capacity
+        self.max_keys = max_keys
+        self._buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+    
+    def hit(self, key: str) -> Tuple[bool, float]:
+        """
+        消耗一个令牌
+        
+        Returns:
+            (是否放行, 放行时为剩余令牌数/拒绝时为需要等待的秒数)
+        """
+        now = time.monotonic()
+        bucket = self._buckets.get(key)
+        
+        if bucket is None:
+            tokens = float(self.capacity)
+            if len(self._buckets) >= self.max_keys:
+                self._buckets.popitem(last=False)
+        else:
+            tokens, last_refill = bucket
+            tokens = min(self.capacity, tokens + (now - last_refill) * self.rate)
+            self._buckets.move_to_end(key)
+        
+        if tokens < 1:
+            self._buckets[key] = (tokens, now)
+            return False, (1 - tokens) / self.rate
+        
+        self._buckets[key] = (tokens - 1, now)
+        return True, tokens - 1
+
+
 class RateLimitMiddleware(BaseHTTPMiddleware):
     """
     简单的限流中间件
-    防止单个IP过于频繁的请求
+    防止单个IP过于频繁的请求，令牌桶放在进程内，不用每个请求都去Redis读写计数
+    多worker部署时每个worker各自限流
     """
     
     def __init__(self, app: ASGIApp):
         super().__init__(app)
-        self.cache_service = None
+        self.limiter = TokenBucketLimiter(
+            rate=settings.RATE_LIMIT_REQUESTS / settings.RATE_LIMIT_WINDOW,
+            capacity=settings.RATE_LIMIT_REQUESTS
+        )
     
     async def dispatch(self, request: Request, call_next: Callable) -> Response:
         # 跳过不需要限流的端点
@@ -142,51 +187,35 @@ class RateLimitMiddleware(BaseHTTPMiddleware):
         if request.url.path in skip_paths or not settings.ENABLE_RATE_LIMIT:
             return await call_next(request)
         
-        try:
-            # 懒加载缓存服务
-            if not self.cache_service:
-                self.cache_service = await get_cache_service()
-            
-            client_ip = request.client.host if request.client else "unknown"
-            rate_key = f"rate_limit:{client_ip}"
+        # X-Forwarded-For客户端可以随便填，只认连接地址；
+        # 反向代理后面由uvicorn的--proxy-headers按受信代理改写client
+        client_ip = request.client.host if request.client else "unknown"
+        
+        allowed, value = self.limiter.hit(client_ip)
+        
+        if not allowed:
+            # 记录限流事件
+            RATE_LIMIT_HITS.labels(
+                endpoint=request.url.path,
+                user_type="anonymous"
+            ).inc()
             
-            # 检查当前请求数
-            current_count = await self.cache_service.get(rate_key) or 0
+            logger.warning(f"🚫 限流触发 - IP:{client_ip} 路径:{request.url.path}")
             
-            if int(current_count) >= settings.RATE_LIMIT_REQUESTS:
-                # 记录限流事件
-                RATE_LIMIT_HITS.labels(
-                    endpoint=request.url.path,
-                    user_type="anonymous"
-                ).inc()
-                
-                logger.warning(f"🚫 限流触发 - IP:{client_ip} 路径:{request.url.path}")
-                
-                return JSONResponse(
-                    status_code=429,
-                    content={
-                        "error": {
-                            "code": "TOO_MANY_REQUESTS",
-                            "message": "请求太频繁了，休息一下吧 😅"
-                        },
-                        "success": False
+            return JSONResponse(
+                status_code=429,
+                content={
+                    "error": {
+                        "code": "TOO_MANY_REQUESTS",
+                        "message": "请求太频繁了，休息一下吧 😅"
                     },
-                    headers={"Retry-After": str(settings.RATE_LIMIT_WINDOW)}
-                )
-            
-            # 增加计数
-            await self.cache_service.set(
-                rate_key,
-                int(current_count) + 1,
-                expire=settings.RATE_LIMIT_WINDOW
+                    "success": False
+                },
+                headers={"Retry-After": str(math.ceil(value))}
             )
-            
-            return await call_next(request)
-            
-        except Exception as e:
-            logger.error(f"限流中间件出错: {e}")
-            # 出错时放行，避免影响正常请求
-            return await call_next(request)
+        
+        request.state.rate_limit_remaining = int(value)
+        return await call_next(request)
 
 
 class MetricsMiddleware(BaseHTTPMiddleware):
@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+"""
+响应类
+基于orjson的JSON响应，列表接口直接返回字典，跳过pydantic的二次校验和序列化
+
+作者: Lima
+"""
+
+import hashlib
+from decimal import Decimal
+from typing import Any
+
+import orjson
+from fastapi import Request, Response
+from fastapi.responses import ORJSONResponse as _BaseORJSONResponse
+
+# datetime按UTC处理并精确到秒，numpy数组直接序列化，字典键允许非字符串
+ORJSON_OPTIONS = (
+    orjson.OPT_NAIVE_UTC
+    | orjson.OPT_OMIT_MICROSECONDS
+    | orjson.OPT_SERIALIZE_NUMPY
+    | orjson.OPT_NON_STR_KEYS
+)
+
+
+def _orjson_default(obj: Any) -> Any:
+    """orjson不认识的类型在这里兜底"""
+    if isinstance(obj, Decimal):
+        return float(obj)
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    raise TypeError(f"无法序列化的类型: {type(obj).__name__}")
+
+
+def orjson_dumps(content: Any) -> bytes:
+    """
+    按统一选项序列化为JSON字节，缓存预序列化结果时使用
+    
+    Args:
+        content: 要序列化的内容
+        
+    Returns:
+        JSON字节串
+    """
+    return orjson.dumps(content, default=_orjson_default, option=ORJSON_OPTIONS)
+
+
+class ORJSONResponse(_BaseORJSONResponse):
+    """
+    orjson响应
+    支持Decimal和集合，全局作为默认响应类使用
+    """
+
+    def render(self, content: Any) -> bytes:
+        return orjson_dumps(content)
+
+
+def make_etag(body: bytes) -> str:
+    """根据响应体生成弱ETag"""
+    return f'W/"{hashlib.blake2b(body, digest_size=8).hexdigest()}"'
+
+
+def is_not_modified(request: Request, etag: str) -> bool:
+    """客户端带来的If-None-Match是否和当前ETag一致"""
+    if_none_match = request.headers.get("if-none-match")
+    if not if_none_match:
+        return False
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    return etag in tags or "*" in tags
+
+
+def etag_response(request: Request, content: Any, max_age: int = 10) -> Response:
+    """
+    带ETag的JSON响应，客户端带着相同的If-None-Match来时直接返回304
+    
+    Args:
+        request: 当前请求
+        content: 响应内容，已序列化的字节直接使用
+        max_age: 客户端缓存秒数
+        
+    Returns:
+        200响应或空的304响应
+    """
+    body = content if isinstance(content, bytes) else orjson_dumps(content)
+    etag = make_etag(body)
+    headers = {
+        "ETag": etag,
+        "Cache-Control": f"private, max-age={max_age}"
+    }
+    
+    if is_not_modified(request, etag):
+        return Response(status_code=304, headers=headers)
+    
+    return Response(content=body, media_type="application/json", headers=headers)
@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+"""
+Alembic迁移环境
+复用应用的异步引擎和模型元数据，连接串同样来自DATABASE_URL
+"""
+
+import asyncio
+from logging.config import fileConfig
+
+from alembic import context
+
+from config.database import engine, db_config
+from models import Base
+
+config = context.config
+
+if config.config_file_name is not None:
+    fileConfig(config.config_file_name)
+
+target_metadata = Base.metadata
+
+def run_migrations_offline():
+    """离线模式：只生成SQL，不连接数据库"""
+    context.configure(
+        url=db_config.DATABASE_URL,
+        target_metadata=target_metadata,
+        literal_binds=True,
+        dialect_opts={"paramstyle": "named"}
+    )
+    
+    with context.begin_transaction():
+        context.run_migrations()
+
+def do_run_migrations(connection):
+    """在同步连接上执行迁移"""
+    context.configure(connection=connection, target_metadata=target_metadata)
+    
+    with context.begin_transaction():
+        context.run_migrations()
+
+async def run_migrations_online():
+    """在线模式：用应用的异步引擎执行迁移"""
+    async with engine.connect() as connection:
+        await connection.run_sync(do_run_migrations)
+    
+    await engine.dispose()
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    asyncio.run(run_migrations_online())
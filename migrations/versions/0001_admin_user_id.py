@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+"""
+管理员绑定用户账号：admins.user_id
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-16
+"""
+
+import logging
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0001"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+logger = logging.getLogger("alembic.runtime.migration")
+
+# 按邮箱回填：只绑定邮箱在用户表里恰好对应一个用户的管理员，有歧义的留给人工处理
+_BACKFILL_SQL = """
+UPDATE admins AS a
+SET user_id = u.user_id
+FROM users AS u
+WHERE a.user_id IS NULL
+  AND lower(u.email) = lower(a.email)
+  AND (SELECT count(*) FROM users AS u2 WHERE lower(u2.email) = lower(a.email)) = 1
+"""
+
+def upgrade():
+    # 用create_all新建的库已经有这一列，只补回填
+    columns = {column["name"] for column in sa.inspect(op.get_bind()).get_columns("admins")}
+    if "user_id" not in columns:
+        op.add_column(
+            "admins",
+            sa.Column("user_id", sa.BigInteger(), nullable=True, comment="绑定的用户ID")
+        )
+        op.create_unique_constraint("admins_user_id_key", "admins", ["user_id"])
+        op.create_foreign_key(
+            "admins_user_id_fkey", "admins", "users",
+            ["user_id"], ["user_id"], ondelete="SET NULL"
+        )
+    
+    op.execute(_BACKFILL_SQL)
+    
+    unbound = op.get_bind().execute(
+        sa.text("SELECT username FROM admins WHERE user_id IS NULL AND is_active")
+    ).scalars().all()
+    if unbound:
+        logger.warning(
+            "以下管理员没有按邮箱找到唯一对应的用户，需要手动设置admins.user_id: %s",
+            ", ".join(unbound)
+        )
+
+def downgrade():
+    op.drop_constraint("admins_user_id_fkey", "admins", type_="foreignkey")
+    op.drop_constraint("admins_user_id_key", "admins", type_="unique")
+    op.drop_column("admins", "user_id")
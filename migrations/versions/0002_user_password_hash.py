@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+"""
+用户密码登录：users.password_hash
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-16
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    # 用create_all新建的库已经有这一列
+    columns = {column["name"] for column in sa.inspect(op.get_bind()).get_columns("users")}
+    if "password_hash" not in columns:
+        op.add_column(
+            "users",
+            sa.Column(
+                "password_hash",
+                sa.String(255),
+                nullable=True,
+                comment="密码哈希，仅通过Telegram登录的用户为空"
+            )
+        )
+
+def downgrade():
+    op.drop_column("users", "password_hash")
@@ -26,6 +26,15 @@ class Admin(BaseModel):
         comment="管理员ID"
     )
     
+    # 绑定的用户账号，后台接口按验签后的用户找到对应管理员
+    user_id: Mapped[Optional[int]] = mapped_column(
+        BigInteger,
+        ForeignKey("users.user_id", ondelete="SET NULL"),
+        unique=True,
+        nullable=True,
+        comment="绑定的用户ID"
+    )
+    
     username: Mapped[str] = mapped_column(
         String(100),
         unique=True,
@@ -235,6 +244,7 @@ class UserFeedback(BaseUUIDModel):
             name="ck_user_feedback_rating_range"
         ),
         Index("idx_feedback_status", "status", "created_at"),
+        Index("idx_feedback_created_id", "created_at", "id"),
         Index("idx_feedback_type", "feedback_type"),
         Index("idx_feedback_user", "user_id"),
         Index("idx_feedback_priority", "priority"),
@@ -311,6 +321,7 @@ class AuditLog(BaseUUIDModel):
         Index("idx_audit_logs_action", "action"),
         Index("idx_audit_logs_resource", "resource_type", "resource_id"),
         Index("idx_audit_logs_created", "created_at"),
+        Index("idx_audit_logs_created_id", "created_at", "id"),
     )
     
     def __repr__(self):
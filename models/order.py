@@ -11,7 +11,7 @@ from sqlalchemy import (
     BigInteger, String, Boolean, DateTime, Integer, 
     Text, JSON, ForeignKey, DECIMAL, Index
 )
-from sqlalchemy.orm import Mapped, mapped_column, relationship
+from sqlalchemy.orm import Mapped, mapped_column, relationship, synonym
 from sqlalchemy.dialects.postgresql import UUID
 
 from .base import BaseModel, BaseUUIDModel
@@ -173,6 +173,8 @@ class Order(BaseUUIDModel):
     # 索引
     __table_args__ = (
         Index("idx_orders_user_status", "user_id", "status", "created_at"),
+        Index("idx_orders_user_created", "user_id", "created_at", "id"),
+        Index("idx_orders_created", "created_at", "id"),
         Index("idx_orders_status", "status"),
         Index("idx_orders_payment_id", "payment_id"),
         Index("idx_orders_expires", "expires_at"),
@@ -215,6 +217,7 @@ class Payment(BaseUUIDModel):
         nullable=True,
         comment="提供商交易ID"
     )
+    transaction_id = synonym("provider_transaction_id")
     
     status: Mapped[str] = mapped_column(
         String(20),
@@ -10,7 +10,7 @@ from sqlalchemy import (
     BigInteger, String, Boolean, DateTime, Date, Integer, 
     Text, JSON, ForeignKey, UniqueConstraint, Index
 )
-from sqlalchemy.orm import Mapped, mapped_column, relationship
+from sqlalchemy.orm import Mapped, mapped_column, relationship, synonym
 from sqlalchemy.dialects.postgresql import UUID
 
 from .base import BaseModel, BaseUUIDModel
@@ -26,6 +26,10 @@ class User(BaseModel):
         comment="Telegram用户ID"
     )
     
+    # 认证接口里按 id / telegram_id 访问，和主键是同一个值
+    id = synonym("user_id")
+    telegram_id = synonym("user_id")
+    
     # 基本信息
     username: Mapped[Optional[str]] = mapped_column(
         String(255),
@@ -71,6 +75,13 @@ class User(BaseModel):
         comment="头像URL"
     )
     
+    # 认证信息
+    password_hash: Mapped[Optional[str]] = mapped_column(
+        String(255),
+        nullable=True,
+        comment="密码哈希，仅通过Telegram登录的用户为空"
+    )
+    
     # 状态信息
     is_active: Mapped[bool] = mapped_column(
         Boolean,
@@ -122,6 +133,39 @@ class User(BaseModel):
         Index("idx_users_language", "language_code"),
     )
     
+    def to_public_dict(self) -> dict:
+        """认证接口返回给客户端的用户信息"""
+        return {
+            "id": self.user_id,
+            "telegram_id": self.user_id,
+            "username": self.username,
+            "first_name": self.first_name,
+            "last_name": self.last_name,
+            "email": self.email,
+            "phone": self.phone,
+            "language_code": self.language_code,
+            "is_premium": self.is_premium,
+            "is_active": self.is_active
+        }
+    
+    def to_profile_dict(self) -> dict:
+        """/me 接口返回的用户信息，在公开信息基础上带上注册和登录时间"""
+        # 整个写成一个字典字面量，键是常量，比先建字典再逐个赋值快
+        return {
+            "id": self.user_id,
+            "telegram_id": self.user_id,
+            "username": self.username,
+            "first_name": self.first_name,
+            "last_name": self.last_name,
+            "email": self.email,
+            "phone": self.phone,
+            "language_code": self.language_code,
+            "is_premium": self.is_premium,
+            "is_active": self.is_active,
+            "registration_date": self.registration_date,
+            "last_login": self.last_login
+        }
+    
     def __repr__(self):
         return f"<User(user_id={self.user_id}, username={self.username})>"
 
@@ -3,18 +3,25 @@
 管理员服务模块
 """
 
+import asyncio
+import csv
+import io
 import logging
+import uuid
 from datetime import datetime, timedelta
-from typing import List, Optional, Dict, Any, Tuple
+from typing import List, Optional, Dict, Any, Tuple, AsyncIterator
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, and_, or_, func, desc, text
+from sqlalchemy import select, and_, or_, func, desc, text, tuple_
 from sqlalchemy.orm import selectinload
 
 from models.admin import Admin, SystemConfig, UserFeedback, AuditLog, SystemStats
 from models.user import User, UserUsageStats
 from models.order import Order, Payment
 from models.divination import DivinationSession
+from config.database import AsyncSessionLocal
 from config.redis_config import RedisManager, CacheKeys
+from core.config_cache import config_cache
+from core.batching import BatchingQueue
 from utils.exceptions import (
     ValidationError,
     ResourceNotFoundError,
@@ -27,9 +34,74 @@ from utils.helpers import generate_short_id, get_current_timestamp
 
 logger = logging.getLogger(__name__)
 
+# 流式导出每批读取的行数
+EXPORT_BATCH_SIZE = 1000
+
+class AuditLogQueue(BatchingQueue):
+    """
+    审计日志批量写入队列
+    请求路径上只入队，后台任务攒够一批或到时间后一次性写库
+    """
+    
+    def __init__(self, batch_size: int = 500, flush_interval: float = 0.1):
+        super().__init__(batch_size, flush_interval)
+    
+    def put(self, **fields):
+        """日志入队，不阻塞"""
+        super().put(fields)
+    
+    async def _write(self, rows: List[Dict[str, Any]]):
+        """一次提交写入一批日志，整批失败时逐条重写，坏的那条不连累同批其他日志"""
+        try:
+            async with AsyncSessionLocal() as session:
+                session.add_all([AuditLog(**row) for row in rows])
+                await session.commit()
+            return
+        except Exception as e:
+            logger.warning(f"批量写入审计日志失败，改为逐条写入 ({len(rows)} 条): {e}")
+        
+        try:
+            async with AsyncSessionLocal() as session:
+                for row in rows:
+                    try:
+                        session.add(AuditLog(**row))
+                        await session.commit()
+                    except Exception as e:
+                        await session.rollback()
+                        logger.error(f"写入审计日志失败: {row.get('action')} {row.get('resource_id')} - {e}")
+        except Exception as e:
+            logger.error(f"逐条写入审计日志失败: {e}")
+
+# 全局审计日志队列
+audit_log_queue = AuditLogQueue()
+
+def _audit_log_row(
+    admin_id: int,
+    action: str,
+    resource_type: str = None,
+    resource_id: Any = None,
+    details: Dict[str, Any] = None,
+    old_values: Dict[str, Any] = None,
+    ip_address: str = None,
+    user_agent: str = None
+) -> Dict[str, Any]:
+    """审计日志字段映射到表结构：details记为new_values，resource_id按字符串存"""
+    return {
+        "admin_id": admin_id,
+        "action": action,
+        "resource_type": resource_type,
+        "resource_id": str(resource_id) if resource_id is not None else None,
+        "old_values": old_values,
+        "new_values": details or {},
+        "ip_address": ip_address,
+        "user_agent": user_agent
+    }
+
 class AdminService:
     """管理员服务"""
     
+    __slots__ = ("db", "redis")
+    
     def __init__(self, db: AsyncSession, redis: RedisManager):
         self.db = db
         self.redis = redis
@@ -69,7 +141,8 @@ class AdminService:
         admin = Admin(
             username=username,
             email=email,
-            password_hash=hash_password(password),
+            # bcrypt是CPU密集操作，放到线程里跑，避免卡住事件循环
+            password_hash=await asyncio.to_thread(hash_password, password),
             full_name=full_name,
             role=role,
             permissions=permissions or [],
@@ -113,6 +186,13 @@ class AdminService:
         
         return admin
     
+    async def get_admin_by_user_id(self, user_id: int) -> Optional[Admin]:
+        """根据绑定的用户ID获取管理员"""
+        result = await self.db.execute(
+            select(Admin).where(Admin.user_id == user_id)
+        )
+        return result.scalar_one_or_none()
+    
     async def get_admin_by_username(self, username: str) -> Optional[Admin]:
         """根据用户名获取管理员"""
         result = await self.db.execute(
@@ -136,7 +216,7 @@ class AdminService:
         if not admin.is_active:
             raise BusinessLogicError("管理员账户已被禁用")
         
-        if not verify_password(password, admin.password_hash):
+        if not await asyncio.to_thread(verify_password, password, admin.password_hash):
             # 记录登录失败
             await self.create_audit_log(
                 admin_id=admin.id,
@@ -184,7 +264,7 @@ class AdminService:
         if 'password' in updates:
             if not validate_password_strength(updates['password']):
                 raise ValidationError("密码强度不足")
-            updates['password_hash'] = hash_password(updates['password'])
+            updates['password_hash'] = await asyncio.to_thread(hash_password, updates['password'])
             del updates['password']
         
         if 'role' in updates:
@@ -213,18 +293,36 @@ class AdminService:
             action="update_admin",
             resource_type="admin",
             resource_id=admin_id,
-            details={"old_values": old_values, "new_values": updates}
+            details=updates,
+            old_values=old_values
         )
         
         logger.info(f"更新管理员: {admin.username} (ID: {admin_id})")
         return admin
     
+    @staticmethod
+    def _paginate(query, model, limit: int, offset: int = 0, cursor: Tuple[datetime, Any] = None):
+        """
+        按 (created_at, id) 倒序分页
+        传了游标走键集分页，翻到多深都只是一次索引查找；没有游标时退回OFFSET
+        """
+        if cursor:
+            created_at, record_id = cursor
+            query = query.where(
+                tuple_(model.created_at, model.id) < tuple_(created_at, record_id)
+            )
+        else:
+            query = query.offset(offset)
+        
+        return query.order_by(desc(model.created_at), desc(model.id)).limit(limit)
+    
     async def get_admins(
         self,
         role: str = None,
         is_active: bool = None,
         limit: int = 20,
-        offset: int = 0
+        offset: int = 0,
+        cursor: Tuple[datetime, int] = None
     ) -> List[Admin]:
         """获取管理员列表"""
         query = select(Admin)
@@ -234,7 +332,7 @@ class AdminService:
         if is_active is not None:
             query = query.where(Admin.is_active == is_active)
         
-        query = query.order_by(desc(Admin.created_at)).limit(limit).offset(offset)
+        query = self._paginate(query, Admin, limit, offset, cursor)
         
         result = await self.db.execute(query)
         return result.scalars().all()
@@ -269,12 +367,10 @@ class AdminService:
     # 系统配置管理
     async def get_system_config(self, key: str) -> Optional[SystemConfig]:
         """获取系统配置"""
-        cache_key = CacheKeys.system_config(key)
-        
-        # 尝试从缓存获取
-        cached_config = await self.redis.get(cache_key)
-        if cached_config:
-            return cached_config
+        # 先查进程内缓存，命中就是一次字典查找
+        hit, config = config_cache.get(key)
+        if hit:
+            return config
         
         # 从数据库查询
         result = await self.db.execute(
@@ -283,8 +379,7 @@ class AdminService:
         config = result.scalar_one_or_none()
         
         if config:
-            # 缓存结果
-            await self.redis.set(cache_key, config, expire=3600)
+            config_cache.set(key, config)
         
         return config
     
@@ -296,8 +391,11 @@ class AdminService:
         admin_id: int = None
     ) -> SystemConfig:
         """设置系统配置"""
-        # 获取现有配置
-        config = await self.get_system_config(key)
+        # 获取现有配置，要修改的对象必须挂在当前会话上，不能用缓存里的
+        result = await self.db.execute(
+            select(SystemConfig).where(SystemConfig.key == key)
+        )
+        config = result.scalar_one_or_none()
         
         if config:
             # 更新现有配置
@@ -324,9 +422,8 @@ class AdminService:
         await self.db.commit()
         await self.db.refresh(config)
         
-        # 清除缓存
-        cache_key = CacheKeys.system_config(key)
-        await self.redis.delete(cache_key)
+        # 清除缓存，并通知其他worker
+        await config_cache.publish_invalidate(self.redis, key)
         
         # 记录审计日志
         if admin_id:
@@ -369,6 +466,43 @@ class AdminService:
         result = await self.db.execute(query)
         return result.scalars().all()
     
+    async def get_user_feedback(
+        self,
+        feedback_type: str = None,
+        status: str = None,
+        user_id: int = None,
+        limit: int = 20,
+        offset: int = 0,
+        cursor: Tuple[datetime, uuid.UUID] = None
+    ) -> List[Tuple[UserFeedback, Optional[str]]]:
+        """
+        获取用户反馈列表及反馈用户姓名
+        姓名在SQL里拼好，一次联表查询，避免逐条加载用户
+        
+        Returns:
+            (反馈, 用户姓名) 列表
+        """
+        user_name = func.nullif(
+            func.concat_ws(" ", User.first_name, User.last_name), ""
+        ).label("user_name")
+        
+        query = (
+            select(UserFeedback, user_name)
+            .join(User, UserFeedback.user_id == User.user_id, isouter=True)
+        )
+        
+        if feedback_type:
+            query = query.where(UserFeedback.feedback_type == feedback_type)
+        if status:
+            query = query.where(UserFeedback.status == status)
+        if user_id:
+            query = query.where(UserFeedback.user_id == user_id)
+        
+        query = self._paginate(query, UserFeedback, limit, offset, cursor)
+        
+        result = await self.db.execute(query)
+        return result.all()
+    
     async def update_feedback_status(
         self,
         feedback_id: int,
@@ -423,24 +557,49 @@ class AdminService:
         resource_id: int = None,
         details: Dict[str, Any] = None,
         ip_address: str = None,
-        user_agent: str = None
+        user_agent: str = None,
+        old_values: Dict[str, Any] = None
     ) -> AuditLog:
         """创建审计日志"""
-        audit_log = AuditLog(
+        audit_log = AuditLog(**_audit_log_row(
             admin_id=admin_id,
             action=action,
             resource_type=resource_type,
             resource_id=resource_id,
-            details=details or {},
+            details=details,
+            old_values=old_values,
             ip_address=ip_address,
             user_agent=user_agent
-        )
+        ))
         
         self.db.add(audit_log)
         await self.db.commit()
         
         return audit_log
     
+    def enqueue_audit_log(
+        self,
+        admin_id: int,
+        action: str,
+        resource_type: str = None,
+        resource_id: int = None,
+        details: Dict[str, Any] = None,
+        ip_address: str = None,
+        user_agent: str = None,
+        old_values: Dict[str, Any] = None
+    ):
+        """审计日志入队，由后台任务批量写入，调用方无需等待"""
+        audit_log_queue.put(**_audit_log_row(
+            admin_id=admin_id,
+            action=action,
+            resource_type=resource_type,
+            resource_id=resource_id,
+            details=details,
+            old_values=old_values,
+            ip_address=ip_address,
+            user_agent=user_agent
+        ))
+    
     async def get_audit_logs(
         self,
         admin_id: int = None,
@@ -449,7 +608,8 @@ class AdminService:
         start_date: datetime = None,
         end_date: datetime = None,
         limit: int = 50,
-        offset: int = 0
+        offset: int = 0,
+        cursor: Tuple[datetime, uuid.UUID] = None
     ) -> List[AuditLog]:
         """获取审计日志"""
         query = select(AuditLog).options(selectinload(AuditLog.admin))
@@ -465,7 +625,7 @@ class AdminService:
         if end_date:
             query = query.where(AuditLog.created_at <= end_date)
         
-        query = query.order_by(desc(AuditLog.created_at)).limit(limit).offset(offset)
+        query = self._paginate(query, AuditLog, limit, offset, cursor)
         
         result = await self.db.execute(query)
         return result.scalars().all()
@@ -481,6 +641,23 @@ class AdminService:
         )
         return result.scalar_one_or_none()
     
+    async def _scalar(self, stmt) -> Any:
+        """
+        用独立会话执行单值查询
+        同一个AsyncSession不能并发执行语句，并发聚合时每条查询各占一个连接
+        """
+        async with AsyncSessionLocal() as session:
+            result = await session.execute(stmt)
+            return result.scalar()
+    
+    async def _fetch_system_stats(self, date: datetime) -> Optional[SystemStats]:
+        """用独立会话读取系统统计（只读，供并发查询使用）"""
+        async with AsyncSessionLocal() as session:
+            result = await session.execute(
+                select(SystemStats).where(SystemStats.date == date)
+            )
+            return result.scalar_one_or_none()
+    
     async def update_system_stats(self, date: datetime = None) -> SystemStats:
         """更新系统统计"""
         if date is None:
@@ -496,73 +673,61 @@ class AdminService:
         start_of_day = datetime.combine(date, datetime.min.time())
         end_of_day = datetime.combine(date, datetime.max.time())
         
-        # 总用户数
-        total_users_result = await self.db.execute(
-            select(func.count(User.id))
+        divination_in_day = and_(
+            DivinationSession.created_at >= start_of_day,
+            DivinationSession.created_at <= end_of_day
         )
-        stats.total_users = total_users_result.scalar()
-        
-        # 活跃用户数（当日有活动的用户）
-        active_users_result = await self.db.execute(
-            select(func.count(func.distinct(DivinationSession.user_id)))
-            .where(
-                and_(
-                    DivinationSession.created_at >= start_of_day,
-                    DivinationSession.created_at <= end_of_day
-                )
-            )
-        )
-        stats.active_users = active_users_result.scalar() or 0
-        
-        # 新注册用户数
-        new_users_result = await self.db.execute(
-            select(func.count(User.id))
-            .where(
-                and_(
-                    User.created_at >= start_of_day,
-                    User.created_at <= end_of_day
-                )
-            )
-        )
-        stats.new_users = new_users_result.scalar() or 0
         
-        # 总占卜次数
-        total_divinations_result = await self.db.execute(
-            select(func.count(DivinationSession.id))
-        )
-        stats.total_divinations = total_divinations_result.scalar() or 0
-        
-        # 当日占卜次数
-        daily_divinations_result = await self.db.execute(
-            select(func.count(DivinationSession.id))
-            .where(
-                and_(
-                    DivinationSession.created_at >= start_of_day,
-                    DivinationSession.created_at <= end_of_day
+        # 各项聚合互不依赖，并发执行，耗时取决于最慢的那条而不是总和
+        (
+            total_users,
+            active_users,
+            new_users,
+            total_divinations,
+            daily_divinations,
+            total_revenue,
+            daily_revenue
+        ) = await asyncio.gather(
+            # 总用户数
+            self._scalar(select(func.count(User.id))),
+            # 活跃用户数（当日有活动的用户）
+            self._scalar(
+                select(func.count(func.distinct(DivinationSession.user_id))).where(divination_in_day)
+            ),
+            # 新注册用户数
+            self._scalar(
+                select(func.count(User.id)).where(
+                    and_(
+                        User.created_at >= start_of_day,
+                        User.created_at <= end_of_day
+                    )
                 )
-            )
-        )
-        stats.daily_divinations = daily_divinations_result.scalar() or 0
-        
-        # 总收入
-        total_revenue_result = await self.db.execute(
-            select(func.sum(Order.amount))
-            .where(Order.status == "paid")
-        )
-        stats.total_revenue = float(total_revenue_result.scalar() or 0)
-        
-        # 当日收入
-        daily_revenue_result = await self.db.execute(
-            select(func.sum(Order.amount))
-            .where(
-                and_(
-                    Order.status == "paid",
-                    Order.paid_at >= start_of_day,
-                    Order.paid_at <= end_of_day
+            ),
+            # 总占卜次数
+            self._scalar(select(func.count(DivinationSession.id))),
+            # 当日占卜次数
+            self._scalar(select(func.count(DivinationSession.id)).where(divination_in_day)),
+            # 总收入
+            self._scalar(select(func.sum(Order.amount)).where(Order.status == "paid")),
+            # 当日收入
+            self._scalar(
+                select(func.sum(Order.amount)).where(
+                    and_(
+                        Order.status == "paid",
+                        Order.paid_at >= start_of_day,
+                        Order.paid_at <= end_of_day
+                    )
                 )
             )
         )
-        stats.daily_revenue = float(daily_revenue_result.scalar() or 0)
+        
+        stats.total_users = total_users or 0
+        stats.active_users = active_users or 0
+        stats.new_users = new_users or 0
+        stats.total_divinations = total_divinations or 0
+        stats.daily_divinations = daily_divinations or 0
+        stats.total_revenue = float(total_revenue or 0)
+        stats.daily_revenue = float(daily_revenue or 0)
         
         stats.updated_at = datetime.utcnow()
         
@@ -577,9 +742,11 @@ class AdminService:
         today = datetime.utcnow().date()
         yesterday = today - timedelta(days=1)
         
-        # 获取今日和昨日统计
-        today_stats = await self.get_system_stats(today)
-        yesterday_stats = await self.get_system_stats(yesterday)
+        # 获取今日和昨日统计，两条查询并发执行
+        today_stats, yesterday_stats = await asyncio.gather(
+            self._fetch_system_stats(today),
+            self._fetch_system_stats(yesterday)
+        )
         
         if not today_stats:
             today_stats = await self.update_system_stats(today)
@@ -667,6 +834,88 @@ class AdminService:
             "download_url": f"/admin/exports/orders_{get_current_timestamp()}.{format}"
         }
     
+    async def _stream_csv(self, query, header: List[str]) -> AsyncIterator[bytes]:
+        """
+        用服务端游标分批读取并逐批输出CSV，内存占用只和批大小有关
+        
+        Args:
+            query: 查询语句
+            header: CSV表头
+        """
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        
+        # 带BOM，Excel打开中文不乱码
+        writer.writerow(header)
+        yield ("\ufeff" + buffer.getvalue()).encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate(0)
+        
+        result = await self.db.stream(query.execution_options(yield_per=EXPORT_BATCH_SIZE))
+        async for rows in result.partitions():
+            writer.writerows(rows)
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate(0)
+    
+    def export_user_data_stream(
+        self,
+        start_date: datetime = None,
+        end_date: datetime = None
+    ) -> AsyncIterator[bytes]:
+        """流式导出用户数据（CSV）"""
+        query = select(
+            User.user_id,
+            User.username,
+            User.first_name,
+            User.last_name,
+            User.language_code,
+            User.is_active,
+            User.is_premium,
+            User.registration_date,
+            User.last_login
+        )
+        
+        if start_date:
+            query = query.where(User.created_at >= start_date)
+        if end_date:
+            query = query.where(User.created_at <= end_date)
+        
+        header = [
+            "user_id", "username", "first_name", "last_name", "language_code",
+            "is_active", "is_premium", "registration_date", "last_login"
+        ]
+        return self._stream_csv(query.order_by(User.user_id), header)
+    
+    def export_order_data_stream(
+        self,
+        start_date: datetime = None,
+        end_date: datetime = None
+    ) -> AsyncIterator[bytes]:
+        """流式导出订单数据（CSV）"""
+        query = select(
+            Order.id,
+            Order.user_id,
+            Order.order_type,
+            Order.amount,
+            Order.currency,
+            Order.status,
+            Order.payment_method,
+            Order.paid_at,
+            Order.created_at
+        )
+        
+        if start_date:
+            query = query.where(Order.created_at >= start_date)
+        if end_date:
+            query = query.where(Order.created_at <= end_date)
+        
+        header = [
+            "id", "user_id", "order_type", "amount", "currency",
+            "status", "payment_method", "paid_at", "created_at"
+        ]
+        return self._stream_csv(query.order_by(Order.created_at), header)
+    
     # 缓存管理
     async def clear_admin_cache(self, admin_id: int):
         """清除管理员缓存"""
@@ -675,6 +924,8 @@ class AdminService:
     
     async def clear_system_config_cache(self, key: str = None):
         """清除系统配置缓存"""
+        await config_cache.publish_invalidate(self.redis, key)
+        
         if key:
             cache_key = CacheKeys.system_config(key)
             await self.redis.delete(cache_key)
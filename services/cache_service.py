@@ -172,24 +172,15 @@ class CacheService:
         """
         key = CacheKeys.rate_limit(user_id, action)
         
-        # 获取当前计数
-        current_count = await self.redis.get(key)
-        if current_count is None:
-            current_count = 0
-        else:
-            current_count = int(current_count)
+        # 计数和设置过期一次往返完成
+        new_count = await self.redis.incr_window(key, window_seconds)
+        if new_count is None:
+            return True, limit
         
-        if current_count >= limit:
+        if new_count > limit:
             return False, 0
         
-        # 增加计数
-        new_count = await self.redis.incr(key)
-        if new_count == 1:
-            # 第一次设置，设置过期时间
-            await self.redis.expire(key, window_seconds)
-        
-        remaining = max(0, limit - new_count)
-        return True, remaining
+        return True, limit - new_count
     
     async def reset_rate_limit(self, user_id: int, action: str):
         """重置速率限制"""
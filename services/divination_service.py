@@ -5,10 +5,11 @@
 
 import logging
 import random
+import uuid
 from datetime import datetime, date, timedelta
-from typing import List, Optional, Dict, Any, Tuple
+from typing import List, Optional, Dict, Any, Tuple, AsyncIterator
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, and_, or_, func, desc
+from sqlalchemy import select, and_, or_, func, desc, text
 from sqlalchemy.orm import selectinload
 
 from models.divination import DivinationSession, DailyCard, TarotCard, SpreadTemplate
@@ -27,6 +28,49 @@ from utils.helpers import generate_short_id, get_current_timestamp
 
 logger = logging.getLogger(__name__)
 
+# 流式输出会话列表时每批读取的行数
+SESSION_STREAM_BATCH_SIZE = 50
+
+# 用户占卜统计：所有指标在一条查询里算完，一次往返
+# 连续天数用"日期减行号"分组找连续区间，只算截止到今天或昨天的那一段
+_USER_STATS_SQL = text("""
+WITH s AS (
+    SELECT spread_type, cards_drawn, user_rating, status, created_at
+    FROM divination_sessions
+    WHERE user_id = :user_id
+),
+agg AS (
+    SELECT
+        count(*) AS total_sessions,
+        count(*) FILTER (WHERE status = 'completed') AS completed_sessions,
+        count(*) FILTER (WHERE created_at >= now() - interval '30 days') AS monthly_sessions,
+        mode() WITHIN GROUP (ORDER BY spread_type) AS favorite_spread,
+        avg(user_rating)::float AS accuracy_rating,
+        max(created_at) AS last_divination
+    FROM s
+),
+card AS (
+    SELECT mode() WITHIN GROUP (ORDER BY c ->> 'card_name') AS most_drawn_card
+    FROM s
+    CROSS JOIN LATERAL json_array_elements(
+        CASE WHEN json_typeof(s.cards_drawn) = 'array' THEN s.cards_drawn ELSE '[]'::json END
+    ) AS c
+),
+days AS (
+    SELECT DISTINCT created_at::date AS d FROM s
+),
+runs AS (
+    SELECT max(d) AS last_day, count(*) AS days
+    FROM (SELECT d, d - (row_number() OVER (ORDER BY d))::int AS grp FROM days) AS islands
+    GROUP BY grp
+),
+streak AS (
+    SELECT COALESCE(max(days) FILTER (WHERE last_day >= current_date - 1), 0) AS streak_days
+    FROM runs
+)
+SELECT * FROM agg, card, streak
+""")
+
 class DivinationService:
     """占卜服务"""
     
@@ -79,8 +123,8 @@ class DivinationService:
         
         return card
     
-    async def get_random_tarot_cards(self, count: int = 1, exclude_ids: List[int] = None) -> List[TarotCard]:
-        """随机获取塔罗牌"""
+    async def get_random_tarot_cards(self, count: int = 1, exclude_mask: int = 0) -> List[TarotCard]:
+        """随机获取塔罗牌，exclude_mask是排除牌ID的位图，第n位为1表示排除ID为n的牌"""
         if count <= 0:
             raise ValidationError("抽取数量必须大于0")
         
@@ -88,8 +132,8 @@ class DivinationService:
         all_cards = await self.get_all_tarot_cards(active_only=True)
         
         # 排除指定的牌
-        if exclude_ids:
-            all_cards = [card for card in all_cards if card.id not in exclude_ids]
+        if exclude_mask:
+            all_cards = [card for card in all_cards if not (exclude_mask >> card.id) & 1]
         
         if len(all_cards) < count:
             raise DivinationError(f"可用塔罗牌数量不足，需要 {count} 张，可用 {len(all_cards)} 张")
@@ -299,11 +343,11 @@ class DivinationService:
         )
         
         self.db.add(session)
-        await self.db.commit()
-        await self.db.refresh(session)
         
-        # 更新用户使用统计
+        # 会话和使用统计在同一个事务里写，只提交一次；
+        # created_at等服务端默认值由INSERT ... RETURNING带回，不用再refresh查一次
         await self._update_user_usage_stats(user_id, is_free)
+        await self.db.commit()
         
         # 缓存结果
         cache_key = CacheKeys.divination_session(session.id)
@@ -337,31 +381,105 @@ class DivinationService:
     
     async def get_divination_session_by_session_id(self, session_id: str) -> Optional[DivinationSession]:
         """根据会话ID获取占卜会话"""
+        try:
+            session_uuid = uuid.UUID(session_id)
+        except ValueError:
+            return None
+        
+        result = await self.db.execute(
+            select(DivinationSession).where(DivinationSession.id == session_uuid)
+        )
+        return result.scalar_one_or_none()
+    
+    async def get_session_if_owned(self, session_id: str, user_id: int) -> Optional[DivinationSession]:
+        """
+        获取属于指定用户的占卜会话
+        归属条件直接放进WHERE，别人的会话不会被读出来
+        
+        Args:
+            session_id: 会话ID
+            user_id: 用户ID
+            
+        Returns:
+            占卜会话，不存在或不属于该用户时返回None
+        """
+        # 会话主键是UUID，格式不对的ID直接当作不存在，不发查询
+        try:
+            session_uuid = uuid.UUID(session_id)
+        except ValueError:
+            return None
+        
         result = await self.db.execute(
             select(DivinationSession)
-            .options(selectinload(DivinationSession.user), selectinload(DivinationSession.spread_template))
-            .where(DivinationSession.session_id == session_id)
+            .where(
+                DivinationSession.id == session_uuid,
+                DivinationSession.user_id == user_id
+            )
         )
         return result.scalar_one_or_none()
     
-    async def get_user_divination_sessions(
+    def _user_sessions_query(
         self,
         user_id: int,
         divination_type: str = None,
+        status: str = None,
         limit: int = 20,
-        offset: int = 0
-    ) -> List[DivinationSession]:
-        """获取用户占卜会话列表"""
+        offset: int = 0,
+        spread_type: str = None,
+        start_date: datetime = None,
+        end_date: datetime = None
+    ):
+        """用户占卜会话列表查询，end_date不包含在内"""
         query = select(DivinationSession).where(DivinationSession.user_id == user_id)
         
         if divination_type:
-            query = query.where(DivinationSession.divination_type == divination_type)
-        
-        query = query.order_by(desc(DivinationSession.created_at)).limit(limit).offset(offset)
+            query = query.where(DivinationSession.session_type == divination_type)
+        if status:
+            query = query.where(DivinationSession.status == status)
+        if spread_type:
+            query = query.where(DivinationSession.spread_type == spread_type)
+        if start_date:
+            query = query.where(DivinationSession.created_at >= start_date)
+        if end_date:
+            query = query.where(DivinationSession.created_at < end_date)
         
+        return query.order_by(desc(DivinationSession.created_at)).limit(limit).offset(offset)
+    
+    async def get_user_divination_sessions(
+        self,
+        user_id: int,
+        divination_type: str = None,
+        status: str = None,
+        limit: int = 20,
+        offset: int = 0,
+        spread_type: str = None,
+        start_date: datetime = None,
+        end_date: datetime = None
+    ) -> List[DivinationSession]:
+        """获取用户占卜会话列表"""
+        query = self._user_sessions_query(
+            user_id, divination_type, status, limit, offset,
+            spread_type=spread_type,
+            start_date=start_date,
+            end_date=end_date
+        )
         result = await self.db.execute(query)
         return result.scalars().all()
     
+    async def stream_user_divination_sessions(
+        self,
+        user_id: int,
+        divination_type: str = None,
+        status: str = None,
+        limit: int = 20,
+        offset: int = 0
+    ) -> AsyncIterator[List[DivinationSession]]:
+        """用服务端游标分批读取用户占卜会话，每次产出一批"""
+        query = self._user_sessions_query(user_id, divination_type, status, limit, offset)
+        result = await self.db.stream(query.execution_options(yield_per=SESSION_STREAM_BATCH_SIZE))
+        async for sessions in result.scalars().partitions():
+            yield sessions
+    
     async def get_user_divination_history(
         self,
         user_id: int,
@@ -449,7 +567,7 @@ class DivinationService:
         return await self.get_spread_template_by_name(spread_name)
     
     async def _update_user_usage_stats(self, user_id: int, is_free: bool):
-        """更新用户使用统计"""
+        """更新用户使用统计，不提交，由调用方和业务数据一起提交"""
         # 获取或创建用户统计记录
         result = await self.db.execute(
             select(UserUsageStats).where(UserUsageStats.user_id == user_id)
@@ -475,8 +593,6 @@ class DivinationService:
         
         stats.last_divination_at = datetime.utcnow()
         stats.updated_at = datetime.utcnow()
-        
-        await self.db.commit()
     
     # 解释生成
     def _get_card_interpretation(self, card: TarotCard, is_reversed: bool, position_name: str = None) -> str:
@@ -530,6 +646,11 @@ class DivinationService:
         return "\n\n".join(interpretation_parts)
     
     # 统计和分析
+    async def get_user_divination_stats(self, user_id: int) -> Dict[str, Any]:
+        """获取用户占卜统计"""
+        result = await self.db.execute(_USER_STATS_SQL, {"user_id": user_id})
+        return dict(result.mappings().one())
+    
     async def get_divination_stats(
         self,
         start_date: datetime = None,
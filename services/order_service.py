@@ -5,10 +5,10 @@
 
 import logging
 from datetime import datetime, timedelta
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Tuple, Set
 from decimal import Decimal
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, and_, or_, func, desc
+from sqlalchemy import select, and_, or_, func, desc, tuple_
 from sqlalchemy.orm import selectinload
 
 from models.order import Order, UserTier, Payment
@@ -25,6 +25,16 @@ from utils.helpers import generate_short_id, get_current_timestamp
 
 logger = logging.getLogger(__name__)
 
+# 订单列表可预加载的关联，列表接口要显示等级名称和用户名
+_ORDER_RELATIONS = {
+    "tier": Order.tier,
+    "user": Order.user
+}
+
+def _order_load_options(include: Tuple[str, ...]) -> list:
+    """把要预加载的关联名转成selectinload，每个关联一条IN查询，避免逐行懒加载"""
+    return [selectinload(_ORDER_RELATIONS[name]) for name in include]
+
 class OrderService:
     """订单服务"""
     
@@ -199,10 +209,11 @@ class OrderService:
         # 生成订单号
         order_number = f"ORD-{generate_short_id()}-{get_current_timestamp()}"
         
-        # 创建订单
+        # 创建订单，直接挂上已经查到的等级，返回后读取order.tier不用再查一次
         order = Order(
             user_id=user_id,
             tier_id=tier_id,
+            tier=tier,
             order_number=order_number,
             order_type=order_type,
             amount=amount,
@@ -257,24 +268,124 @@ class OrderService:
         )
         return result.scalar_one_or_none()
     
+    @staticmethod
+    def _paginate(query, limit: int, offset: int = 0, cursor: Tuple[datetime, Any] = None):
+        """
+        订单按 (created_at, id) 倒序分页
+        传了游标走键集分页，翻到多深都只是一次索引查找；没有游标时退回OFFSET
+        """
+        if cursor:
+            created_at, order_id = cursor
+            query = query.where(
+                tuple_(Order.created_at, Order.id) < tuple_(created_at, order_id)
+            )
+        else:
+            query = query.offset(offset)
+        
+        return query.order_by(desc(Order.created_at), desc(Order.id)).limit(limit)
+    
     async def get_user_orders(
         self,
         user_id: int,
         status: Optional[str] = None,
+        payment_status: Optional[str] = None,
         limit: int = 20,
-        offset: int = 0
+        offset: int = 0,
+        include: Tuple[str, ...] = ("tier",),
+        cursor: Tuple[datetime, Any] = None
     ) -> List[Order]:
         """获取用户订单列表"""
-        query = select(Order).where(Order.user_id == user_id)
+        query = (
+            select(Order)
+            .options(*_order_load_options(include))
+            .where(Order.user_id == user_id)
+        )
         
         if status:
             query = query.where(Order.status == status)
+        if payment_status:
+            query = query.where(Order.payments.any(Payment.status == payment_status))
         
-        query = query.order_by(desc(Order.created_at)).limit(limit).offset(offset)
+        query = self._paginate(query, limit, offset, cursor)
         
         result = await self.db.execute(query)
         return result.scalars().all()
     
+    async def get_orders(
+        self,
+        user_id: Optional[int] = None,
+        status: Optional[str] = None,
+        payment_status: Optional[str] = None,
+        start_date: datetime = None,
+        end_date: datetime = None,
+        limit: int = 20,
+        offset: int = 0,
+        include: Tuple[str, ...] = ("tier", "user"),
+        cursor: Tuple[datetime, Any] = None,
+        with_total: bool = False
+    ) -> Tuple[List[Order], Optional[int], bool]:
+        """
+        获取订单列表（管理员）
+        大表上COUNT(*)往往比取数据还慢，只在需要时才统计总数；
+        是否还有下一页通过多取一行判断
+        
+        Returns:
+            (订单列表, 符合条件的总数（未统计时为None）, 是否还有下一页)
+        """
+        conditions = []
+        if user_id:
+            conditions.append(Order.user_id == user_id)
+        if status:
+            conditions.append(Order.status == status)
+        if payment_status:
+            conditions.append(Order.payments.any(Payment.status == payment_status))
+        if start_date:
+            conditions.append(Order.created_at >= start_date)
+        if end_date:
+            conditions.append(Order.created_at <= end_date)
+        
+        total = None
+        if with_total:
+            total_result = await self.db.execute(
+                select(func.count(Order.id)).where(*conditions)
+            )
+            total = total_result.scalar()
+        
+        result = await self.db.execute(
+            self._paginate(
+                select(Order)
+                .options(*_order_load_options(include))
+                .where(*conditions),
+                limit + 1,
+                offset,
+                cursor
+            )
+        )
+        orders = result.scalars().all()
+        return orders[:limit], total, len(orders) > limit
+    
+    async def get_user_display_names(self, user_ids: Set[int]) -> Dict[int, str]:
+        """
+        批量获取用户显示名，一条IN查询只取三列，不加载完整的用户对象
+        
+        Args:
+            user_ids: 用户ID集合
+            
+        Returns:
+            用户ID到显示名的映射
+        """
+        if not user_ids:
+            return {}
+        
+        result = await self.db.execute(
+            select(User.user_id, User.first_name, User.last_name)
+            .where(User.user_id.in_(user_ids))
+        )
+        return {
+            user_id: ((first_name or "") + " " + (last_name or "")).strip()
+            for user_id, first_name, last_name in result
+        }
+    
     async def get_user_pending_order(self, user_id: int) -> Optional[Order]:
         """获取用户待支付订单"""
         result = await self.db.execute(
@@ -297,10 +408,12 @@ class OrderService:
         payment_provider: str = None,
         payment_id: str = None,
         paid_at: datetime = None,
-        metadata: Dict[str, Any] = None
+        metadata: Dict[str, Any] = None,
+        order: Optional[Order] = None
     ) -> Optional[Order]:
-        """更新订单状态"""
-        order = await self.get_order_by_id(order_id)
+        """更新订单状态，调用方已经查到订单时通过order传入，不再重复查询"""
+        if order is None:
+            order = await self.get_order_by_id(order_id)
         if not order:
             raise ResourceNotFoundError("订单不存在")
         
@@ -339,9 +452,15 @@ class OrderService:
         logger.info(f"更新订单状态: {order.order_number} -> {status}")
         return order
     
-    async def cancel_order(self, order_id: int, reason: str = None) -> Optional[Order]:
+    async def cancel_order(
+        self,
+        order_id: int,
+        reason: str = None,
+        order: Optional[Order] = None
+    ) -> Optional[Order]:
         """取消订单"""
-        order = await self.get_order_by_id(order_id)
+        if order is None:
+            order = await self.get_order_by_id(order_id)
         if not order:
             raise ResourceNotFoundError("订单不存在")
         
@@ -356,7 +475,8 @@ class OrderService:
         return await self.update_order_status(
             order_id=order_id,
             status="cancelled",
-            metadata=metadata
+            metadata=metadata,
+            order=order
         )
     
     async def expire_orders(self) -> int:
@@ -515,6 +635,79 @@ class OrderService:
             }
         }
     
+    async def get_user_order_stats(self, user_id: int) -> Dict[str, Any]:
+        """
+        获取单个用户的订单统计
+        各状态的数量和金额用条件聚合一次查出来
+        """
+        month_start = datetime.utcnow().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+        is_paid = Order.status == "paid"
+        
+        result = await self.db.execute(
+            select(
+                func.count(Order.id),
+                func.count(Order.id).filter(is_paid),
+                func.count(Order.id).filter(Order.status == "pending"),
+                func.count(Order.id).filter(Order.status == "cancelled"),
+                func.coalesce(func.sum(Order.amount).filter(is_paid), 0),
+                func.coalesce(
+                    func.sum(Order.amount).filter(is_paid, Order.paid_at >= month_start), 0
+                )
+            )
+            .where(Order.user_id == user_id)
+        )
+        total, completed, pending, cancelled, revenue, monthly_revenue = result.one()
+        
+        return {
+            "total_orders": total,
+            "completed_orders": completed,
+            "pending_orders": pending,
+            "cancelled_orders": cancelled,
+            "total_revenue": float(revenue),
+            "monthly_revenue": float(monthly_revenue),
+            "average_order_value": float(revenue) / completed if completed else 0.0,
+            "conversion_rate": completed / total if total else 0.0
+        }
+    
+    async def get_revenue_stats(self) -> Dict[str, Any]:
+        """
+        获取全局收入统计
+        今日、本月、近30天和累计收入用条件聚合一次查出，按货币分组
+        """
+        now = datetime.utcnow()
+        today_start = now.replace(hour=0, minute=0, second=0, microsecond=0)
+        month_start = today_start.replace(day=1)
+        last_30_days = now - timedelta(days=30)
+        
+        result = await self.db.execute(
+            select(
+                Order.currency,
+                func.count(Order.id),
+                func.coalesce(func.sum(Order.amount), 0),
+                func.coalesce(func.sum(Order.amount).filter(Order.paid_at >= today_start), 0),
+                func.coalesce(func.sum(Order.amount).filter(Order.paid_at >= month_start), 0),
+                func.coalesce(func.sum(Order.amount).filter(Order.paid_at >= last_30_days), 0)
+            )
+            .where(Order.status == "paid")
+            .group_by(Order.currency)
+        )
+        
+        by_currency = {}
+        for currency, paid_orders, total, today, month, recent in result.all():
+            by_currency[currency] = {
+                "paid_orders": paid_orders,
+                "total_revenue": float(total),
+                "today_revenue": float(today),
+                "monthly_revenue": float(month),
+                "last_30_days_revenue": float(recent),
+                "average_order_value": float(total) / paid_orders if paid_orders else 0.0
+            }
+        
+        return {
+            "by_currency": by_currency,
+            "generated_at": now.isoformat()
+        }
+    
     async def get_revenue_by_period(
         self,
         period: str = "daily",
@@ -559,13 +752,15 @@ class OrderService:
     
     # 缓存管理
     async def _clear_tier_cache(self, tier_id: int = None):
-        """清除等级缓存"""
+        """清除等级缓存，包括接口缓存的响应体"""
         if tier_id:
             await self.redis.delete(CacheKeys.user_tier(tier_id))
+            await self.redis.delete(CacheKeys.user_tier_response(tier_id))
         
         # 清除等级列表缓存
-        await self.redis.delete(CacheKeys.user_tiers(True))
-        await self.redis.delete(CacheKeys.user_tiers(False))
+        for active_only in (True, False):
+            await self.redis.delete(CacheKeys.user_tiers(active_only))
+            await self.redis.delete(CacheKeys.user_tiers_response(active_only))
     
     async def clear_order_cache(self, order_id: int):
         """清除订单缓存"""
@@ -3,8 +3,10 @@
 支付服务模块
 """
 
+import asyncio
+import json
 import logging
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 from typing import List, Optional, Dict, Any, Tuple
 from decimal import Decimal
 from sqlalchemy.ext.asyncio import AsyncSession
@@ -13,7 +15,9 @@ from sqlalchemy.orm import selectinload
 
 from models.order import Order, Payment, UserTier
 from models.user import User
+from config.database import AsyncSessionLocal
 from config.redis_config import RedisManager, CacheKeys
+from core.batching import BatchingQueue
 from utils.exceptions import (
     PaymentError,
     ValidationError,
@@ -27,6 +31,12 @@ from core.config import settings
 
 logger = logging.getLogger(__name__)
 
+# 各订单类型对应的会员天数
+MEMBERSHIP_DAYS = {
+    "monthly": 30,
+    "yearly": 365
+}
+
 class PaymentService:
     """支付服务"""
     
@@ -406,61 +416,94 @@ class PaymentService:
         
         return {"status": "ignored", "result_code": result_code}
     
-    async def _process_successful_payment(
+    async def handle_payment_callback(
         self,
         provider: str,
         transaction_id: str,
-        amount: Decimal,
-        currency: str,
-        provider_data: Dict[str, Any] = None
+        status: str,
+        amount: Any = None,
+        currency: str = None,
+        raw_data: Dict[str, Any] = None,
+        failure_reason: str = None
     ) -> Dict[str, Any]:
-        """处理成功支付"""
-        # 查找支付记录
+        """
+        处理支付平台回调，更新支付记录和订单，支付成功时激活会员
+        按(支付商, 交易号)加行锁读取支付记录，已经处理过的回调直接返回，
+        支付平台重放或多个进程同时处理同一笔交易都只生效一次
+        
+        Args:
+            provider: 支付提供商
+            transaction_id: 支付商交易号
+            status: 回调状态，completed或failed
+            amount: 回调金额
+            currency: 货币
+            raw_data: 回调原始数据
+            failure_reason: 失败原因
+            
+        Returns:
+            处理结果
+        """
         result = await self.db.execute(
             select(Payment)
             .options(selectinload(Payment.order))
             .where(
-                and_(
-                    Payment.provider == provider,
-                    Payment.transaction_id == transaction_id
-                )
+                Payment.provider == provider,
+                Payment.transaction_id == transaction_id
             )
+            .with_for_update()
         )
         payment = result.scalar_one_or_none()
         
         if not payment:
+            await self.db.rollback()
             logger.warning(f"未找到支付记录: {provider} - {transaction_id}")
             return {"status": "payment_not_found"}
         
-        if payment.status == "completed":
-            logger.info(f"支付已处理: {transaction_id}")
-            return {"status": "already_processed"}
+        # 成功是终态；同一状态的重复回调也不再处理
+        if payment.status == "completed" or payment.status == status:
+            await self.db.rollback()
+            logger.info(f"支付回调已处理: {provider} - {transaction_id} ({payment.status})")
+            return {"status": "already_processed", "payment_id": payment.id}
         
-        # 验证金额
-        if payment.amount != amount:
-            logger.error(f"支付金额不匹配: 期望 {payment.amount}, 实际 {amount}")
-            return {"status": "amount_mismatch"}
+        if raw_data:
+            payment.provider_data = {**(payment.provider_data or {}), **raw_data}
         
-        # 更新支付状态
+        if status == "failed":
+            payment.status = "failed"
+            payment.failure_reason = failure_reason
+            await self.db.commit()
+            
+            logger.info(f"支付失败: {transaction_id} - {failure_reason}")
+            return {"status": "failed", "payment_id": payment.id, "failure_reason": failure_reason}
+        
+        if status != "completed":
+            raise ValidationError(f"不支持的回调状态: {status}")
+        
+        # 金额按分比较，浮点金额先转成字符串再转Decimal
+        if amount is not None:
+            paid_amount = Decimal(str(amount)).quantize(Decimal("0.01"))
+            if paid_amount != payment.amount:
+                await self.db.rollback()
+                logger.error(f"支付金额不匹配: 期望 {payment.amount}, 实际 {paid_amount}")
+                return {"status": "amount_mismatch", "payment_id": payment.id}
+        
+        now = datetime.now(timezone.utc)
         payment.status = "completed"
-        payment.completed_at = datetime.utcnow()
-        if provider_data:
-            payment.provider_data.update(provider_data)
+        payment.completed_at = now
         
-        # 更新订单状态
         order = payment.order
         order.status = "paid"
         order.payment_provider = provider
         order.payment_id = transaction_id
-        order.paid_at = datetime.utcnow()
+        order.paid_at = now
         
+        # 会员激活和订单状态在同一个事务里提交
+        await self._activate_user_membership(order.user_id, order.tier_id, order.order_type)
         await self.db.commit()
         
-        # 处理订单完成后的业务逻辑
-        await self._handle_order_completion(order)
+        await self._send_payment_confirmation(order)
         
         logger.info(f"支付处理成功: {transaction_id} (订单: {order.order_number})")
-        
         return {
             "status": "success",
             "payment_id": payment.id,
@@ -468,6 +511,24 @@ class PaymentService:
             "order_number": order.order_number
         }
     
+    async def _process_successful_payment(
+        self,
+        provider: str,
+        transaction_id: str,
+        amount: Decimal,
+        currency: str,
+        provider_data: Dict[str, Any] = None
+    ) -> Dict[str, Any]:
+        """处理成功支付"""
+        return await self.handle_payment_callback(
+            provider=provider,
+            transaction_id=transaction_id,
+            status="completed",
+            amount=amount,
+            currency=currency,
+            raw_data=provider_data
+        )
+    
     async def _process_failed_payment(
         self,
         provider: str,
@@ -476,55 +537,32 @@ class PaymentService:
         provider_data: Dict[str, Any] = None
     ) -> Dict[str, Any]:
         """处理失败支付"""
-        # 查找支付记录
-        result = await self.db.execute(
-            select(Payment)
-            .where(
-                and_(
-                    Payment.provider == provider,
-                    Payment.transaction_id == transaction_id
-                )
-            )
+        return await self.handle_payment_callback(
+            provider=provider,
+            transaction_id=transaction_id,
+            status="failed",
+            raw_data=provider_data,
+            failure_reason=failure_reason
         )
-        payment = result.scalar_one_or_none()
-        
-        if not payment:
-            logger.warning(f"未找到支付记录: {provider} - {transaction_id}")
-            return {"status": "payment_not_found"}
-        
-        # 更新支付状态
-        payment.status = "failed"
-        payment.failure_reason = failure_reason
-        if provider_data:
-            payment.provider_data.update(provider_data)
-        
-        await self.db.commit()
-        
-        logger.info(f"支付失败: {transaction_id} - {failure_reason}")
-        
-        return {
-            "status": "failed",
-            "payment_id": payment.id,
-            "failure_reason": failure_reason
-        }
     
-    async def _handle_order_completion(self, order: Order):
-        """处理订单完成后的业务逻辑"""
-        # 这里可以添加订单完成后的处理逻辑
-        # 例如：激活用户会员、发送确认邮件等
+    async def _activate_user_membership(self, user_id: int, tier_id: int, order_type: str):
+        """
+        激活用户会员，到期时间从当前到期时间（已过期则从现在）顺延
+        只修改会话里的对象，由调用方提交
+        """
+        result = await self.db.execute(
+            select(User).where(User.user_id == user_id).with_for_update()
+        )
+        user = result.scalar_one_or_none()
+        if not user:
+            raise ResourceNotFoundError("用户不存在")
         
-        # 激活用户会员（示例）
-        if order.tier:
-            await self._activate_user_membership(order.user_id, order.tier_id, order.order_type)
+        now = datetime.now(timezone.utc)
+        start = user.premium_expires_at if user.premium_expires_at and user.premium_expires_at > now else now
+        user.is_premium = True
+        user.premium_expires_at = start + timedelta(days=MEMBERSHIP_DAYS.get(order_type, 30))
         
-        # 发送确认通知（示例）
-        await self._send_payment_confirmation(order)
-    
-    async def _activate_user_membership(self, user_id: int, tier_id: int, order_type: str):
-        """激活用户会员"""
-        # 这里应该实现会员激活逻辑
-        # 例如：更新用户等级、设置过期时间等
-        logger.info(f"激活用户会员: 用户 {user_id}, 等级 {tier_id}, 类型 {order_type}")
+        logger.info(f"激活用户会员: 用户 {user_id}, 等级 {tier_id}, 类型 {order_type}, 到期 {user.premium_expires_at}")
     
     async def _send_payment_confirmation(self, order: Order):
         """发送支付确认"""
@@ -759,4 +797,113 @@ class PaymentService:
                 "start_date": start_date.isoformat() if start_date else None,
                 "end_date": end_date.isoformat() if end_date else None
             }
-        }
\ No newline at end of file
+        }
+
+
+class PaymentCallbackQueue(BatchingQueue):
+    """
+    支付回调批量处理队列
+    webhook验签后先把回调写进Redis待处理哈希再入队，写成功才给支付平台返回2xx；
+    后台任务攒够一批或到时间后在同一个会话里处理，处理成功才从哈希删除，
+    进程重启或处理失败留下的回调由恢复任务重新入队。
+    支付平台重放的重复回调在批内合并，只处理最后一条
+    """
+    
+    def __init__(
+        self,
+        batch_size: int = 64,
+        flush_interval: float = 0.02,
+        recover_interval: float = 60
+    ):
+        super().__init__(batch_size, flush_interval)
+        self.recover_interval = recover_interval
+        self.redis: Optional[RedisManager] = None
+    
+    @staticmethod
+    def _pending_field(callback: Dict[str, Any]) -> str:
+        """待处理哈希里的字段名，同一笔交易同一状态只占一个字段"""
+        return f"{callback.get('provider')}:{callback.get('transaction_id')}:{callback.get('status')}"
+    
+    async def put(self, **callback):
+        """
+        回调落盘后入队
+        直接调用底层客户端，Redis写入失败时抛出异常，由webhook返回非2xx让支付平台重试
+        """
+        if self.redis is None:
+            raise PaymentError("支付回调队列未启动")
+        
+        if callback.get("amount") is not None:
+            callback["amount"] = str(callback["amount"])
+        
+        record = {**callback, "queued_at": get_current_timestamp()}
+        await self.redis.redis.hset(
+            CacheKeys.pending_payment_callbacks(),
+            self._pending_field(callback),
+            json.dumps(record, ensure_ascii=False, default=str)
+        )
+        super().put(callback)
+    
+    async def _write(self, callbacks: List[Dict[str, Any]]):
+        """共用一个会话处理一批回调，处理成功的从待处理哈希删除"""
+        # 同一笔交易同一状态的重复回调只保留最后一条
+        latest: Dict[str, Dict[str, Any]] = {}
+        for callback in callbacks:
+            latest[self._pending_field(callback)] = callback
+        
+        done = []
+        try:
+            async with AsyncSessionLocal() as session:
+                payment_service = PaymentService(session, self.redis)
+                for field, callback in latest.items():
+                    try:
+                        await payment_service.handle_payment_callback(**callback)
+                        done.append(field)
+                    except Exception as e:
+                        # 单条失败不影响同批其他回调，留在哈希里等恢复任务重试
+                        await session.rollback()
+                        logger.error(
+                            f"处理支付回调失败: "
+                            f"{callback.get('provider')} {callback.get('transaction_id')} - {e}"
+                        )
+        except Exception as e:
+            logger.error(f"批量处理支付回调失败 ({len(latest)} 条): {e}")
+        
+        if done:
+            await self.redis.hdel(CacheKeys.pending_payment_callbacks(), *done)
+    
+    async def _recover(self):
+        """把待处理哈希里积压超过恢复间隔的回调重新入队"""
+        pending = await self.redis.hgetall(CacheKeys.pending_payment_callbacks())
+        cutoff = get_current_timestamp() - self.recover_interval
+        
+        recovered = 0
+        for record in pending.values():
+            if not isinstance(record, dict) or record.pop("queued_at", 0) > cutoff:
+                continue
+            self._queue.put_nowait(record)
+            recovered += 1
+        
+        if recovered:
+            logger.warning(f"重新入队积压的支付回调: {recovered} 条")
+    
+    async def _recover_loop(self):
+        """定期恢复积压的回调；重复入队由handle_payment_callback的幂等处理兜底"""
+        while True:
+            try:
+                await self._recover()
+            except Exception as e:
+                logger.error(f"恢复支付回调失败: {e}")
+            await asyncio.sleep(self.recover_interval)
+    
+    async def run(self, redis: RedisManager):
+        """后台处理循环，应用启动时作为任务运行，同时定期恢复积压的回调"""
+        self.redis = redis
+        recoverer = asyncio.create_task(self._recover_loop())
+        
+        try:
+            await super().run()
+        finally:
+            recoverer.cancel()
+
+# 全局支付回调队列
+payment_callback_queue = PaymentCallbackQueue()
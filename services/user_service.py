@@ -3,22 +3,146 @@
 用户服务层
 """
 
+import asyncio
+import hashlib
+import logging
+import secrets
+import time
 import uuid
+from collections import OrderedDict
 from datetime import datetime, timedelta
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any, List, Tuple
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, update, delete, and_, or_, func
+from sqlalchemy import (
+    select, update, delete, and_, or_, func, values, column, BigInteger, DateTime
+)
 from sqlalchemy.orm import selectinload
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 
 from models.user import User, UserSession, UserPreference, UserUsageStats
 from models.admin import UserFeedback
 from config.redis_config import RedisManager, CacheKeys
-from utils.security import hash_password, verify_password
-from utils.exceptions import UserNotFoundError, InvalidCredentialsError
+from config.database import AsyncSessionLocal
+from core.batching import BatchingQueue
+from utils.security import (
+    hash_password,
+    verify_password,
+    password_needs_rehash,
+    generate_token,
+    password_version,
+    constant_time_compare
+)
+from utils.exceptions import (
+    UserNotFoundError,
+    InvalidCredentialsError,
+    ValidationError,
+    DuplicateResourceError
+)
+
+logger = logging.getLogger(__name__)
+
+# 密码重置令牌有效期（秒）
+PASSWORD_RESET_EXPIRE = 1800
+
+# 最近验证成功的密码，短时间内同一账号重复登录不用再跑一遍KDF
+# 键里带上存储的哈希，改密码后旧记录自然失效；失败结果不缓存
+VERIFIED_CACHE_SIZE = 10_000
+VERIFIED_CACHE_TTL = 60
+_verified_passwords: "OrderedDict[bytes, float]" = OrderedDict()
+
+# 正在进行中的校验，同一组凭据并发进来时共用一次KDF计算
+_inflight_verifies: Dict[bytes, asyncio.Task] = {}
+
+async def _verify_password_cached(identifier: str, password: str, hashed_password: str) -> bool:
+    """带短期缓存、并发请求合并的密码校验"""
+    key = hashlib.sha256(f"{identifier}:{password}:{hashed_password}".encode()).digest()
+    now = time.monotonic()
+    
+    expires_at = _verified_passwords.get(key)
+    if expires_at is not None:
+        if expires_at > now:
+            _verified_passwords.move_to_end(key)
+            return True
+        del _verified_passwords[key]
+    
+    task = _inflight_verifies.get(key)
+    if task is None:
+        task = asyncio.ensure_future(asyncio.to_thread(verify_password, password, hashed_password))
+        _inflight_verifies[key] = task
+        task.add_done_callback(lambda _: _inflight_verifies.pop(key, None))
+    
+    # shield住，某个请求被取消不影响其他在等同一结果的请求
+    if not await asyncio.shield(task):
+        return False
+    
+    _verified_passwords[key] = now + VERIFIED_CACHE_TTL
+    if len(_verified_passwords) > VERIFIED_CACHE_SIZE:
+        _verified_passwords.popitem(last=False)
+    return True
+
+# 后台任务要留个引用，不然可能被垃圾回收掉
+_background_tasks: set = set()
+
+async def _rehash_password(user_id: int, password: str):
+    """登录成功后把老的bcrypt哈希升级成argon2id，用独立会话，不占请求的事务"""
+    try:
+        password_hash = await asyncio.to_thread(hash_password, password)
+        async with AsyncSessionLocal() as session:
+            await session.execute(
+                update(User)
+                .where(User.user_id == user_id)
+                .values(password_hash=password_hash)
+            )
+            await session.commit()
+    except Exception as e:
+        logger.error(f"升级用户 {user_id} 的密码哈希失败: {e}")
+
+class LastLoginBatcher(BatchingQueue):
+    """
+    最后登录时间批量更新
+    登录接口只入队，后台任务攒够一批或到时间后用一条UPDATE ... FROM (VALUES ...)写库
+    """
+    
+    def __init__(self, batch_size: int = 100, flush_interval: float = 0.1):
+        super().__init__(batch_size, flush_interval)
+    
+    def put(self, user_id: int, login_at: Optional[datetime] = None):
+        """登录记录入队，不阻塞"""
+        super().put((user_id, login_at or datetime.utcnow()))
+    
+    async def _write(self, items: List[Tuple[int, datetime]]):
+        """一条语句更新一批用户的登录时间"""
+        # 同一用户在一批里登录多次，只保留最后一次
+        latest: Dict[int, datetime] = {}
+        for user_id, login_at in items:
+            if user_id not in latest or login_at > latest[user_id]:
+                latest[user_id] = login_at
+        
+        logins = values(
+            column("user_id", BigInteger),
+            column("login_at", DateTime(timezone=True)),
+            name="logins"
+        ).data(list(latest.items()))
+        
+        try:
+            async with AsyncSessionLocal() as session:
+                await session.execute(
+                    update(User)
+                    .where(User.user_id == logins.c.user_id)
+                    .values(last_login=logins.c.login_at)
+                )
+                await session.commit()
+        except Exception as e:
+            logger.error(f"批量更新登录时间失败 ({len(latest)} 个用户): {e}")
+
+# 全局登录时间批量写入器
+last_login_batcher = LastLoginBatcher()
 
 class UserService:
     """用户服务"""
     
+    __slots__ = ("db", "redis")
+    
     def __init__(self, db: AsyncSession, redis: RedisManager):
         self.db = db
         self.redis = redis
@@ -130,6 +254,221 @@ class UserService:
             
             return user
     
+    async def _get_user_by_identifier(
+        self,
+        identifier: str,
+        identifier_type: str
+    ) -> Optional[User]:
+        """按邮箱/手机号/用户名查找用户"""
+        columns = {
+            "email": User.email,
+            "phone": User.phone,
+            "username": User.username
+        }
+        column = columns.get(identifier_type)
+        if column is None:
+            raise ValidationError("不支持的标识符类型", field="identifier_type")
+        
+        stmt = select(User).where(column == identifier)
+        result = await self.db.execute(stmt)
+        return result.scalar_one_or_none()
+    
+    async def get_user_from_db(self, user_id: int) -> Optional[User]:
+        """直接从数据库取用户，缓存里的数据不带密码哈希"""
+        stmt = select(User).where(User.user_id == user_id)
+        result = await self.db.execute(stmt)
+        return result.scalar_one_or_none()
+    
+    def _issue_token(self, user: User) -> str:
+        """为用户签发访问令牌，pwv声明用于在密码变更后让旧令牌失效"""
+        return generate_token({
+            "sub": str(user.user_id),
+            "pwv": password_version(user.password_hash)
+        })
+    
+    async def register_user(
+        self,
+        telegram_id: int,
+        username: Optional[str] = None,
+        first_name: Optional[str] = None,
+        last_name: Optional[str] = None,
+        language_code: Optional[str] = None,
+        email: Optional[str] = None,
+        phone: Optional[str] = None,
+        password: Optional[str] = None
+    ) -> Tuple[User, str]:
+        """注册用户，返回用户和访问令牌"""
+        stmt = select(User.user_id).where(User.user_id == telegram_id)
+        result = await self.db.execute(stmt)
+        if result.scalar_one_or_none() is not None:
+            raise DuplicateResourceError("用户", "该Telegram账号已注册")
+        
+        # 哈希很吃CPU，放到线程池里算，不卡事件循环
+        password_hash = None
+        if password:
+            password_hash = await asyncio.to_thread(hash_password, password)
+        
+        user = User(
+            user_id=telegram_id,
+            username=username,
+            first_name=first_name,
+            last_name=last_name,
+            language_code=language_code or "zh",
+            email=email,
+            phone=phone,
+            password_hash=password_hash,
+            last_login=datetime.utcnow()
+        )
+        
+        self.db.add(user)
+        await self.db.commit()
+        await self.db.refresh(user)
+        
+        # 令牌只依赖用户ID，直接用刚写入的对象签发，不用再查一次库
+        return user, self._issue_token(user)
+    
+    async def authenticate_user(
+        self,
+        identifier: str,
+        password: str,
+        identifier_type: str = "email"
+    ) -> Tuple[User, str]:
+        """用户名密码认证，返回用户和访问令牌"""
+        user = await self._get_user_by_identifier(identifier, identifier_type)
+        # 用户不存在和密码错误返回同样的错误，不暴露账号是否存在
+        if not user:
+            raise InvalidCredentialsError()
+        
+        if not user.is_active or not user.password_hash:
+            raise InvalidCredentialsError()
+        
+        if not await _verify_password_cached(identifier, password, user.password_hash):
+            raise InvalidCredentialsError()
+        
+        # 老算法/老参数的哈希在后台重新算一遍，不拖慢这次登录
+        if password_needs_rehash(user.password_hash):
+            task = asyncio.create_task(_rehash_password(user.user_id, password))
+            _background_tasks.add(task)
+            task.add_done_callback(_background_tasks.discard)
+        
+        last_login_batcher.put(user.user_id)
+        
+        return user, self._issue_token(user)
+    
+    async def authenticate_telegram_user(self, telegram_id: int) -> Tuple[User, str]:
+        """Telegram用户认证，返回用户和访问令牌"""
+        user = await self.get_user_from_db(telegram_id)
+        if not user:
+            raise UserNotFoundError(telegram_id)
+        
+        if not user.is_active:
+            raise InvalidCredentialsError("账号已被停用")
+        
+        last_login_batcher.put(user.user_id)
+        
+        return user, self._issue_token(user)
+    
+    async def upsert_and_authenticate_telegram_user(
+        self,
+        telegram_id: int,
+        username: Optional[str] = None,
+        first_name: Optional[str] = None,
+        last_name: Optional[str] = None,
+        language_code: Optional[str] = None
+    ) -> Tuple[User, str]:
+        """Telegram登录，用户不存在就自动注册，一条INSERT ... ON CONFLICT搞定"""
+        now = datetime.utcnow()
+        stmt = (
+            pg_insert(User)
+            .values(
+                user_id=telegram_id,
+                username=username,
+                first_name=first_name,
+                last_name=last_name,
+                language_code=language_code or "zh",
+                last_login=now
+            )
+            .on_conflict_do_update(
+                index_elements=[User.user_id],
+                set_={"last_login": now}
+            )
+            .returning(User)
+        )
+        result = await self.db.execute(stmt)
+        user = result.scalar_one()
+        
+        if not user.is_active:
+            await self.db.rollback()
+            raise InvalidCredentialsError("账号已被停用")
+        
+        await self.db.commit()
+        
+        return user, self._issue_token(user)
+    
+    async def change_password(
+        self,
+        user_id: int,
+        old_password: str,
+        new_password: str
+    ) -> bool:
+        """修改密码"""
+        user = await self.get_user_from_db(user_id)
+        if not user:
+            raise UserNotFoundError(user_id)
+        
+        if not user.password_hash or not await asyncio.to_thread(
+            verify_password, old_password, user.password_hash
+        ):
+            raise InvalidCredentialsError("原密码错误")
+        
+        user.password_hash = await asyncio.to_thread(hash_password, new_password)
+        await self.db.commit()
+        
+        return True
+    
+    async def reset_password(
+        self,
+        identifier: str,
+        identifier_type: str = "email"
+    ) -> Optional[str]:
+        """生成密码重置令牌，账号不存在时返回None，由调用方统一响应，不暴露账号是否存在"""
+        user = await self._get_user_by_identifier(identifier, identifier_type)
+        if not user:
+            return None
+        
+        reset_token = secrets.token_urlsafe(32)
+        await self.redis.set(
+            CacheKeys.password_reset(user.user_id),
+            reset_token,
+            expire=PASSWORD_RESET_EXPIRE
+        )
+        
+        return reset_token
+    
+    async def confirm_password_reset(
+        self,
+        user_id: int,
+        reset_token: str,
+        new_password: str
+    ) -> bool:
+        """用重置令牌设置新密码"""
+        cache_key = CacheKeys.password_reset(user_id)
+        stored_token = await self.redis.get(cache_key)
+        if not stored_token or not constant_time_compare(str(stored_token), reset_token):
+            raise InvalidCredentialsError("重置令牌无效或已过期")
+        
+        user = await self.get_user_from_db(user_id)
+        if not user:
+            raise InvalidCredentialsError("重置令牌无效或已过期")
+        
+        user.password_hash = await asyncio.to_thread(hash_password, new_password)
+        await self.db.commit()
+        
+        # 令牌只能用一次
+        await self.redis.delete(cache_key)
+        
+        return True
+    
     async def get_user_session(
         self,
         user_id: int,
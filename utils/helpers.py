@@ -5,11 +5,13 @@
 
 import uuid
 import json
+import base64
 import hashlib
 from datetime import datetime, timedelta, timezone
-from typing import Optional, Dict, Any, List, Union
+from typing import Optional, Dict, Any, List, Union, Tuple
 from decimal import Decimal, ROUND_HALF_UP
 import re
+from functools import lru_cache
 
 def generate_uuid() -> str:
     """生成UUID
@@ -61,6 +63,27 @@ def parse_datetime(date_str: str, format_str: str = "%Y-%m-%d %H:%M:%S") -> Opti
     except ValueError:
         return None
 
+@lru_cache(maxsize=1024)
+def parse_date_range(
+    start_date: Optional[str],
+    end_date: Optional[str]
+) -> tuple[Optional[datetime], Optional[datetime]]:
+    """解析ISO格式的日期范围，常用范围（今天、最近7天）直接命中缓存
+    
+    Args:
+        start_date: 开始日期字符串
+        end_date: 结束日期字符串
+        
+    Returns:
+        tuple[Optional[datetime], Optional[datetime]]: (开始时间, 结束时间)
+        
+    Raises:
+        ValueError: 日期格式无效
+    """
+    start_dt = datetime.fromisoformat(start_date) if start_date else None
+    end_dt = datetime.fromisoformat(end_date) if end_date else None
+    return start_dt, end_dt
+
 def get_current_timestamp() -> int:
     """获取当前时间戳
     
@@ -360,6 +383,38 @@ def calculate_pagination(
         "prev_page": page - 1 if page > 1 else None
     }
 
+def encode_cursor(created_at: datetime, record_id: Any) -> str:
+    """生成键集分页游标
+    
+    Args:
+        created_at: 当前页最后一条记录的创建时间
+        record_id: 当前页最后一条记录的ID
+        
+    Returns:
+        str: base64编码的游标
+    """
+    raw = f"{created_at.isoformat()}|{record_id}"
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii")
+
+def decode_cursor(cursor: str) -> Tuple[datetime, str]:
+    """解析键集分页游标
+    
+    Args:
+        cursor: base64编码的游标
+        
+    Returns:
+        Tuple[datetime, str]: (创建时间, 记录ID字符串)
+        
+    Raises:
+        ValueError: 游标格式无效
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode("ascii")).decode("utf-8")
+        created_at, record_id = raw.split("|", 1)
+        return datetime.fromisoformat(created_at), record_id
+    except Exception as e:
+        raise ValueError(f"无效的游标: {cursor}") from e
+
 def format_file_size(size_bytes: int) -> str:
     """格式化文件大小
     
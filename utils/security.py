@@ -3,16 +3,29 @@
 安全工具模块
 """
 
+import base64
+import binascii
 import hashlib
+import hmac
 import secrets
-import jwt
+import time
+import orjson
 from datetime import datetime, timedelta
 from typing import Optional, Dict, Any
 from passlib.context import CryptContext
 from passlib.hash import bcrypt
 
 # 密码加密上下文
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# 新密码用argon2id，参数按Web登录场景调小；bcrypt只用来校验老数据，校验通过后会被标记为需要重新哈希
+pwd_context = CryptContext(
+    schemes=["argon2", "bcrypt"],
+    deprecated="auto",
+    argon2__type="ID",
+    argon2__time_cost=2,
+    argon2__memory_cost=2048,
+    argon2__parallelism=1,
+    argon2__digest_size=32
+)
 
 # JWT配置
 JWT_SECRET_KEY = secrets.token_urlsafe(32)  # 在生产环境中应该从环境变量读取
@@ -20,6 +33,18 @@ JWT_ALGORITHM = "HS256"
 JWT_ACCESS_TOKEN_EXPIRE_MINUTES = 30
 JWT_REFRESH_TOKEN_EXPIRE_DAYS = 7
 
+def _b64url(data: bytes) -> bytes:
+    """JWT用的无填充base64url编码"""
+    return base64.urlsafe_b64encode(data).rstrip(b"=")
+
+def _b64url_decode(data: bytes) -> bytes:
+    """补齐填充后做base64url解码"""
+    return base64.urlsafe_b64decode(data + b"=" * (-len(data) % 4))
+
+# HS256签名的固定部分只算一次：头部编码好，HMAC密钥预处理好，每次签名copy一份接着用
+_JWT_HEADER_B64 = _b64url(b'{"alg":"HS256","typ":"JWT"}')
+_JWT_HMAC = hmac.new(JWT_SECRET_KEY.encode(), digestmod=hashlib.sha256)
+
 def hash_password(password: str) -> str:
     """哈希密码
     
@@ -43,6 +68,28 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
     """
     return pwd_context.verify(plain_password, hashed_password)
 
+def password_needs_rehash(hashed_password: str) -> bool:
+    """检查密码哈希是否需要升级
+    
+    Args:
+        hashed_password: 哈希密码
+        
+    Returns:
+        bool: 算法或参数过时返回True
+    """
+    return pwd_context.needs_update(hashed_password)
+
+def password_version(hashed_password: Optional[str]) -> str:
+    """由密码哈希得到的短版本号，写进令牌的pwv声明
+    
+    Args:
+        hashed_password: 哈希密码，没有设置密码时为空
+        
+    Returns:
+        str: 密码变更后随之改变的版本号
+    """
+    return hashlib.blake2b((hashed_password or "").encode(), digest_size=8).hexdigest()
+
 def generate_token(
     data: Dict[str, Any],
     expires_delta: Optional[timedelta] = None,
@@ -60,22 +107,23 @@ def generate_token(
     """
     to_encode = data.copy()
     
-    if expires_delta:
-        expire = datetime.utcnow() + expires_delta
-    else:
+    if expires_delta is None:
         if token_type == "refresh":
-            expire = datetime.utcnow() + timedelta(days=JWT_REFRESH_TOKEN_EXPIRE_DAYS)
+            expires_delta = timedelta(days=JWT_REFRESH_TOKEN_EXPIRE_DAYS)
         else:
-            expire = datetime.utcnow() + timedelta(minutes=JWT_ACCESS_TOKEN_EXPIRE_MINUTES)
+            expires_delta = timedelta(minutes=JWT_ACCESS_TOKEN_EXPIRE_MINUTES)
     
+    now = int(time.time())
     to_encode.update({
-        "exp": expire,
-        "iat": datetime.utcnow(),
+        "exp": now + int(expires_delta.total_seconds()),
+        "iat": now,
         "type": token_type
     })
     
-    encoded_jwt = jwt.encode(to_encode, JWT_SECRET_KEY, algorithm=JWT_ALGORITHM)
-    return encoded_jwt
+    signing_input = _JWT_HEADER_B64 + b"." + _b64url(orjson.dumps(to_encode))
+    signer = _JWT_HMAC.copy()
+    signer.update(signing_input)
+    return (signing_input + b"." + _b64url(signer.digest())).decode()
 
 def verify_token(token: str, token_type: str = "access") -> Optional[Dict[str, Any]]:
     """验证JWT令牌
@@ -87,18 +135,34 @@ def verify_token(token: str, token_type: str = "access") -> Optional[Dict[str, A
     Returns:
         Optional[Dict[str, Any]]: 解码后的数据，验证失败返回None
     """
+    parts = token.encode().split(b".")
+    if len(parts) != 3:
+        return None
+    header_b64, payload_b64, signature_b64 = parts
+    
+    # 只接受本服务签发的HS256头部，先验签再解析载荷
+    if header_b64 != _JWT_HEADER_B64:
+        return None
+    
+    signer = _JWT_HMAC.copy()
+    signer.update(header_b64 + b"." + payload_b64)
     try:
-        payload = jwt.decode(token, JWT_SECRET_KEY, algorithms=[JWT_ALGORITHM])
-        
-        # 检查令牌类型
-        if payload.get("type") != token_type:
+        if not hmac.compare_digest(signer.digest(), _b64url_decode(signature_b64)):
             return None
-            
-        return payload
-    except jwt.ExpiredSignatureError:
+        payload = orjson.loads(_b64url_decode(payload_b64))
+    except (binascii.Error, ValueError):
+        return None
+    
+    # 检查令牌类型
+    if not isinstance(payload, dict) or payload.get("type") != token_type:
         return None
-    except jwt.JWTError:
+    
+    # 检查是否过期
+    exp = payload.get("exp")
+    if not isinstance(exp, (int, float)) or exp <= time.time():
         return None
+    
+    return payload
 
 def generate_api_key(length: int = 32) -> str:
     """生成API密钥
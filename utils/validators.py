@@ -7,7 +7,14 @@ import re
 import uuid
 from typing import Optional, List, Dict, Any
 from datetime import datetime
-from email_validator import validate_email as _validate_email, EmailNotValidError
+
+# 常用正则预编译，校验时直接用，不用每次调用都查re的缓存
+_EMAIL_RE = re.compile(r"\A[^@\s]+@[^@\s]+\.[^@\s]+\Z")
+_NON_DIGIT_RE = re.compile(r"\D")
+_PHONE_PATTERNS = {
+    "CN": re.compile(r"\A1[3-9]\d{9}\Z"),  # 中国手机号
+    "US": re.compile(r"\A[2-9]\d{2}[2-9]\d{2}\d{4}\Z"),  # 美国手机号
+}
 
 def validate_email(email: str) -> bool:
     """验证邮箱地址
@@ -18,11 +25,8 @@ def validate_email(email: str) -> bool:
     Returns:
         bool: 是否有效
     """
-    try:
-        _validate_email(email)
-        return True
-    except EmailNotValidError:
-        return False
+    # 只做格式检查，不查域名解析，避免在请求路径上发DNS
+    return len(email) <= 254 and _EMAIL_RE.match(email) is not None
 
 def validate_phone(phone: str, country_code: str = "CN") -> bool:
     """验证手机号码
@@ -35,19 +39,14 @@ def validate_phone(phone: str, country_code: str = "CN") -> bool:
         bool: 是否有效
     """
     # 移除所有非数字字符
-    clean_phone = re.sub(r'\D', '', phone)
-    
-    if country_code == "CN":
-        # 中国手机号验证
-        pattern = r'^1[3-9]\d{9}$'
-        return bool(re.match(pattern, clean_phone))
-    elif country_code == "US":
-        # 美国手机号验证
-        pattern = r'^[2-9]\d{2}[2-9]\d{2}\d{4}$'
-        return bool(re.match(pattern, clean_phone))
-    else:
-        # 通用验证：7-15位数字
-        return 7 <= len(clean_phone) <= 15
+    clean_phone = _NON_DIGIT_RE.sub('', phone)
+    
+    pattern = _PHONE_PATTERNS.get(country_code)
+    if pattern is not None:
+        return pattern.match(clean_phone) is not None
+    
+    # 通用验证：7-15位数字
+    return 7 <= len(clean_phone) <= 15
 
 def validate_username(username: str) -> Dict[str, Any]:
     """验证用户名